@@ -1,5 +1,16 @@
+from pydantic import BaseModel, Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+
+class BotConfig(BaseModel):
+    """One extra hosted bot (see Settings.BOTS)."""
+    name: str = Field(pattern=r"^[A-Za-z0-9_-]{1,64}$")
+    token: str
+    secret: str | None = None
+    # Sends and edits per second; TELEGRAM_RATE when unset
+    rate: float | None = None
+
+
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=".env", case_sensitive=True)
 
@@ -7,4 +18,115 @@ class Settings(BaseSettings):
     DATABASE_URL: str
     NGROK_URL: str
 
+    # Multi-bot hosting: BOT_TOKEN's bot is served at /webhook, and each of BOTS (a JSON
+    # list of {"name", "token", "secret"?, "rate"?}) at /webhook/<name>. All bots share
+    # this process's DB pool and Bot API connections and the same data; each has its own
+    # webhook secret and send rate limit. Webhooks without the bot's secret get a 403.
+    BOT_NAME: str = "default"
+    WEBHOOK_SECRET: str | None = None
+    BOTS: list[BotConfig] = []
+
+    # Optional read replica: plain reads go here unless it is down or lags more than
+    # DATABASE_READ_MAX_LAG_S; a session sticks to the primary once it writes.
+    DATABASE_READ_URL: str | None = None
+    DATABASE_READ_MAX_LAG_S: float = 5.0
+
+    # FX: rates are stored as the value of 1 unit of a currency in the pivot currency.
+    # FX_RATES_FILE is an optional CSV of `date,currency,rate` rows loaded on startup.
+    FX_PIVOT_CURRENCY: str = "USD"
+    FX_RATES_FILE: str | None = None
+
+    # Group commit: expense writes for the same chat arriving within this window
+    # are applied in one transaction. 0 disables coalescing.
+    EXPENSE_COALESCE_MS: int = 0
+
+    # Chat-partitioned dispatch: number of worker processes that each own a shard
+    # of chats. 0 handles updates in the web process. Use with a single uvicorn worker.
+    # Updates for a shard with DISPATCH_QUEUE_SIZE not yet handled, or whose worker is
+    # down, are refused with 503 for Telegram to retry. 0 leaves the queues unbounded.
+    # A write command failing on a transient database error is retried in the worker
+    # up to DISPATCH_RETRIES times with backoff.
+    DISPATCH_WORKERS: int = 0
+    DISPATCH_QUEUE_SIZE: int = 1000
+    DISPATCH_RETRIES: int = 3
+
+    # Outbound: plain confirmations to a chat within this window are merged into one
+    # message and later ones edited into it. 0 sends every reply as its own message.
+    REPLY_COALESCE_MS: int = 0
+
+    # Bot API connections: at most TELEGRAM_MAX_CONNECTIONS kept open. TELEGRAM_HTTP2
+    # multiplexes them over HTTP/2; it needs the h2 package (httpx[http2]), which is not
+    # a dependency, so it is off by default. Transient failures are retried up to
+    # TELEGRAM_RETRIES times with backoff; a send is only retried if it never reached Telegram.
+    TELEGRAM_MAX_CONNECTIONS: int = 100
+    TELEGRAM_HTTP2: bool = False
+    TELEGRAM_RETRIES: int = 3
+    # Per bot: sends and edits per second (Telegram allows about 30). 0 disables.
+    TELEGRAM_RATE: float = 30.0
+
+    # Live pinned dashboards are edited at most once per chat per this many seconds.
+    # Whichever process writes to a chat edits its dashboard; each process re-reads
+    # whether a chat has one at least every DASHBOARD_RECHECK_S seconds, sooner when
+    # the invalidation bus relays a change, so /dashboard on and off reach them all.
+    DASHBOARD_EDIT_INTERVAL_S: float = 5.0
+    DASHBOARD_RECHECK_S: float = 60.0
+
+    # Recurring expenses: how often the scheduler looks for due ones. 0 disables it
+    # in this process; several processes may run it against the same database. With
+    # DISPATCH_WORKERS each shard worker runs it for its own chats.
+    RECURRING_POLL_S: float = 30.0
+
+    # Archival: expenses older than ARCHIVE_AFTER_DAYS move to the archive tables, checked
+    # every ARCHIVE_POLL_S seconds. Archived expenses still count everywhere but can no
+    # longer be edited or removed. 0 days disables it.
+    ARCHIVE_AFTER_DAYS: int = 0
+    ARCHIVE_POLL_S: float = 3600.0
+
+    # Balance ledger: every LEDGER_VERIFY_S seconds each chat's balances are checked
+    # against its append-only ledger, and checkpointed once LEDGER_CHECKPOINT_EVERY
+    # entries built up since the last checkpoint. 0 disables verification. Chats with
+    # balances from before the ledger are opened by the verifier on its first pass, or
+    # all at once by scripts/open_ledger.py.
+    LEDGER_VERIFY_S: float = 3600.0
+    LEDGER_CHECKPOINT_EVERY: int = 1000
+
+    # Balance digests go out daily at DIGEST_HOUR_UTC, weekly ones on DIGEST_WEEKDAY
+    # (0 = Monday). Sends run DIGEST_CONCURRENCY at a time, at most DIGEST_RATE per second.
+    DIGESTS_ENABLED: bool = True
+    DIGEST_HOUR_UTC: int = 9
+    DIGEST_WEEKDAY: int = 0
+    DIGEST_CONCURRENCY: int = 8
+    DIGEST_RATE: float = 25.0
+
+    # Profile names seen on incoming messages are written behind, in one bulk UPDATE
+    # of the users whose names changed, every PROFILE_FLUSH_S seconds
+    PROFILE_FLUSH_S: float = 5.0
+
+    # Traffic capture: when set, incoming updates are appended to gzip segments in
+    # CAPTURE_DIR for scripts/replay_updates.py, anonymized unless CAPTURE_ANONYMIZE is off
+    CAPTURE_DIR: str | None = None
+    CAPTURE_ANONYMIZE: bool = True
+
+    # Cache invalidation across processes (uvicorn workers, shards, replicas of the app)
+    # over Postgres LISTEN/NOTIFY. While a process's listener is down its caches expire
+    # every INVALIDATION_TTL_S seconds instead. 0 disables; unused on other databases.
+    INVALIDATION_TTL_S: float = 30.0
+
+    # Admission control on /webhook: reads wait up to ADMISSION_DEFER_S for room and are
+    # then shed once ADMISSION_MAX_IN_FLIGHT updates are being handled or the DB pool is
+    # exhausted; help and chatter are shed earlier. Writes are always handled. 0 disables.
+    ADMISSION_MAX_IN_FLIGHT: int = 64
+    ADMISSION_DEFER_S: float = 2.0
+
+    # Admin endpoints (/admin/...) require this token in X-Admin-Token; unset disables them
+    ADMIN_TOKEN: str | None = None
+
+    # Event-loop monitoring: a loop stalled longer than LOOP_SLOW_MS logs the blocking
+    # stack. /healthz/ready reports not ready above READY_MAX_LOOP_LAG_MS of lag (p99),
+    # READY_MAX_POOL_USAGE of the DB pool or READY_MAX_OUTBOUND queued Bot API calls.
+    LOOP_SLOW_MS: float = 100.0
+    READY_MAX_LOOP_LAG_MS: float = 250.0
+    READY_MAX_POOL_USAGE: float = 1.0
+    READY_MAX_OUTBOUND: int = 200
+
 settings = Settings() # type: ignore
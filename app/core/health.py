@@ -0,0 +1,89 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class LoopMonitor:
+    """
+    Measures event-loop lag and catches callbacks that block the loop.
+
+    A task sleeps `interval` seconds at a time and records how late it wakes up;
+    the last `window` samples give the lag percentiles reported by /healthz/ready.
+    A watchdog thread checks that the task keeps ticking: once the loop has been
+    stuck for `slow` seconds it logs the loop thread's current stack, which is the
+    code doing the blocking, and the task logs the total stall when it resumes.
+    """
+    def __init__(self, interval: float = 0.05, slow: float = 0.1, window: int = 1200):
+        self.interval = interval
+        self.slow = slow
+        self.stalls = 0
+        self._samples: deque[float] = deque(maxlen=window)
+        self._beat = time.monotonic()
+        self._reported = 0.0
+        self._loop_thread: int | None = None
+        self._task: asyncio.Task | None = None
+        self._watchdog: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._task = asyncio.create_task(self._run())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def aclose(self) -> None:
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    @property
+    def lag(self) -> float:
+        """Most recent lag sample in seconds."""
+        return self._samples[-1] if self._samples else 0.0
+
+    def stats(self) -> dict[str, float | int]:
+        samples = sorted(self._samples)
+        if not samples:
+            return {"lag_ms": 0.0, "p50_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0, "stalls": self.stalls}
+        return {
+            "lag_ms": round(self.lag * 1000, 1),
+            "p50_ms": round(samples[len(samples) // 2] * 1000, 1),
+            "p99_ms": round(samples[int(len(samples) * 0.99)] * 1000, 1),
+            "max_ms": round(samples[-1] * 1000, 1),
+            "stalls": self.stalls,
+        }
+
+    async def _run(self) -> None:
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - started - self.interval)
+            self._samples.append(lag)
+            self._beat = now
+            if lag >= self.slow:
+                self.stalls += 1
+                logger.warning("Event loop blocked for %.0f ms", lag * 1000)
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.slow / 2):
+            beat = self._beat
+            stuck = time.monotonic() - beat - self.interval
+            # One stack per stall: the first time it crosses the threshold
+            if stuck < self.slow or self._reported == beat:
+                continue
+            self._reported = beat
+
+            frame = sys._current_frames().get(self._loop_thread or 0)
+            if frame is None:
+                continue
+            stack = "".join(traceback.format_stack(frame))
+            logger.warning("Event loop stuck for %.0f ms in:\n%s", stuck * 1000, stack)
@@ -0,0 +1,140 @@
+import asyncio
+import os
+import sys
+import threading
+from collections import Counter
+from types import FrameType
+
+
+class SamplingProfiler:
+    """
+    On-demand sampling profiler for the event loop thread.
+
+    While a session runs, a thread samples the loop thread's stack every `interval`
+    seconds together with the asyncio task that was running. The dispatcher tags a
+    task with the update's chat and command (tag()), so samples taken anywhere in
+    that task, from request parsing to the reply, are attributed to the command.
+    Output is collapsed stacks (`command;frame;frame count` lines) for
+    flamegraph.pl or speedscope.
+
+    Off, there is no thread and tag() is skipped behind an `active` check, so it
+    costs nothing to keep in production.
+    """
+    def __init__(self):
+        self.active = False
+        self._filter: tuple[int | None, str | None] = (None, None)
+        self._remaining: int | None = None
+        self._done: asyncio.Event | None = None
+        self._tags: dict[asyncio.Task, str] = {}
+        self._samples: Counter[tuple[asyncio.Task | None, str]] = Counter()
+        self._lock = asyncio.Lock()
+
+    async def profile(
+        self,
+        seconds: float,
+        updates: int | None = None,
+        tg_chat_id: int | None = None,
+        command: str | None = None,
+        interval: float = 0.005,
+    ) -> str:
+        """
+        Sample for `seconds`, or until `updates` updates matching the chat / command
+        filter have been handled (`seconds` is then the cap). Returns collapsed stacks.
+        """
+        if self._lock.locked():
+            raise RuntimeError("A profiling session is already running")
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            self._filter = (tg_chat_id, command)
+            self._remaining = updates
+            self._done = asyncio.Event()
+            self._tags, self._samples = {}, Counter()
+
+            stop = threading.Event()
+            sampler = threading.Thread(
+                target=self._sample, args=(loop, threading.get_ident(), interval, stop),
+                name="sampling-profiler", daemon=True,
+            )
+            self.active = True
+            sampler.start()
+            try:
+                await asyncio.wait_for(self._done.wait(), seconds)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                self.active = False
+                stop.set()
+                await loop.run_in_executor(None, sampler.join)
+            return self._collapse()
+
+    def tag(self, tg_chat_id: int, command: str | None) -> None:
+        """Attribute the current task to `command`; call only while `active`."""
+        task = asyncio.current_task()
+        if task is None:
+            return
+        want_chat, want_command = self._filter
+        if (want_chat is not None and tg_chat_id != want_chat) or (want_command and command != want_command):
+            return
+        self._tags[task] = command or "(no command)"
+        if self._remaining is not None:
+            task.add_done_callback(self._update_done)
+
+    def _update_done(self, _task: asyncio.Task) -> None:
+        if self._remaining is None or self._done is None:
+            return
+        self._remaining -= 1
+        if self._remaining <= 0:
+            self._done.set()
+
+    def _sample(self, loop: asyncio.AbstractEventLoop, thread_id: int, interval: float, stop: threading.Event) -> None:
+        while not stop.wait(interval):
+            frame = sys._current_frames().get(thread_id)
+            if frame is None:
+                continue
+            task = asyncio.current_task(loop)
+            if task is None and frame.f_code.co_name == "select":
+                continue  # idle loop
+            self._samples[(task, _collapse_stack(frame))] += 1
+
+    def _collapse(self) -> str:
+        filtered = self._filter != (None, None) or self._remaining is not None
+        stacks: Counter[str] = Counter()
+        for (task, stack), count in self._samples.items():
+            label = self._tags.get(task) if task else None
+            if label is None:
+                if filtered:
+                    continue
+                label = "(untagged)" if task else "(event loop)"
+            stacks[f"{label};{stack}"] += count
+        self._tags, self._samples = {}, Counter()
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def _collapse_stack(frame: FrameType | None) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+_cwd = os.getcwd()
+_paths: dict[str, str] = {}
+
+
+def _short_path(path: str) -> str:
+    short = _paths.get(path)
+    if short is None:
+        if path.startswith(_cwd):
+            short = os.path.relpath(path, _cwd)
+        else:
+            # site-packages/<pkg>/...: keep the package-relative part
+            marker = path.rfind("site-packages" + os.sep)
+            short = path[marker + 14:] if marker >= 0 else os.path.basename(path)
+        _paths[path] = short.replace(";", ":")
+        short = _paths[path]
+    return short
+
+
+profiler = SamplingProfiler()
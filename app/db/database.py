@@ -1,15 +1,68 @@
+import asyncio
+import logging
 from typing import AsyncGenerator
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy import Delete, Insert, Select, Update, event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import Session, SessionTransactionOrigin
 from app.core.config import settings
 from app.features.expenses.models import Base
 
+logger = logging.getLogger(__name__)
+
 engine = create_async_engine(
-    settings.DATABASE_URL, 
+    settings.DATABASE_URL,
     echo=False
 )
 
+# Optional read replica with its own pool; see RoutingSession
+read_engine: AsyncEngine | None = (
+    create_async_engine(settings.DATABASE_READ_URL, echo=False)
+    if settings.DATABASE_READ_URL else None
+)
+
+
+class ReplicaHealth:
+    """Whether reads may go to the replica; flipped by ReplicaMonitor and connection errors."""
+    def __init__(self):
+        self.healthy = read_engine is not None
+
+replica_health = ReplicaHealth()
+
+
+class RoutingSession(Session):
+    """
+    Sends plain reads to the replica and everything else to the primary.
+
+    A session sticks to the primary once it writes or opens an explicit
+    transaction (service write paths call `begin()`), so a request always
+    reads its own writes. Without a healthy replica everything uses the primary.
+    """
+    def get_bind(self, mapper=None, clause=None, **kw) -> Engine:
+        if read_engine is None:
+            return engine.sync_engine
+
+        if not self.info.get("primary"):
+            tx = self.get_transaction()
+            explicit = tx is not None and tx.origin is not SessionTransactionOrigin.AUTOBEGIN
+            if self._flushing or explicit or not _is_plain_read(clause):
+                self.info["primary"] = True
+
+        if self.info.get("primary") or not replica_health.healthy:
+            return engine.sync_engine
+        return read_engine.sync_engine
+
+
+def _is_plain_read(clause) -> bool:
+    if isinstance(clause, (Insert, Update, Delete)):
+        return False
+    if isinstance(clause, Select) and clause._for_update_arg is not None:
+        return False
+    return True
+
+
 SessionLocal = async_sessionmaker(
-    engine,
+    sync_session_class=RoutingSession,
     expire_on_commit=False,
 )
 
@@ -17,11 +70,89 @@ async def get_session() -> AsyncGenerator[AsyncSession, None]:
     async with SessionLocal() as session:
         yield session
 
+def pool_stats() -> dict[str, float | int]:
+    """Primary pool usage: connections checked out against what the pool may open."""
+    pool = engine.pool
+    if not hasattr(pool, "checkedout"):
+        # e.g. StaticPool / NullPool: nothing to saturate
+        return {"checked_out": 0, "capacity": 0, "usage": 0.0}
+    checked_out = pool.checkedout()
+    overflow = max(pool._max_overflow, 0)  # -1 means unlimited overflow
+    capacity = pool.size() + overflow
+    return {
+        "checked_out": checked_out,
+        "capacity": capacity,
+        "usage": round(checked_out / capacity, 2) if capacity else 0.0,
+    }
+
 async def init_db() -> None:
     async with engine.begin() as conn:
+        await _create_extensions(conn)
         await conn.run_sync(Base.metadata.create_all)
 
 async def init_reset_db_dev() -> None:
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.drop_all)
-        await conn.run_sync(Base.metadata.create_all)
\ No newline at end of file
+        await _create_extensions(conn)
+        await conn.run_sync(Base.metadata.create_all)
+
+async def _create_extensions(conn) -> None:
+    if conn.dialect.name == "postgresql":
+        # Trigram search index on expenses (see Expense.__table_args__)
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS btree_gin"))
+
+
+# ----------------------------------------------------------------------
+# REPLICA MONITORING
+# ----------------------------------------------------------------------
+
+if read_engine is not None:
+    @event.listens_for(read_engine.sync_engine, "handle_error")
+    def _on_replica_error(ctx) -> None:
+        if ctx.is_disconnect and replica_health.healthy:
+            logger.warning("Read replica disconnected, routing reads to primary")
+            replica_health.healthy = False
+
+
+class ReplicaMonitor:
+    """Polls replica reachability and replay lag; reads fall back to the primary while unhealthy."""
+    def __init__(self, interval: float = 5.0, max_lag: float = settings.DATABASE_READ_MAX_LAG_S):
+        self.interval = interval
+        self.max_lag = max_lag
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if read_engine is not None:
+            self._task = asyncio.create_task(self._run())
+
+    async def aclose(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _run(self) -> None:
+        while True:
+            healthy = await self.check()
+            if healthy != replica_health.healthy:
+                logger.warning("Read replica %s", "healthy again" if healthy else "unhealthy, routing reads to primary")
+            replica_health.healthy = healthy
+            await asyncio.sleep(self.interval)
+
+    async def check(self) -> bool:
+        assert read_engine is not None
+        try:
+            async with read_engine.connect() as conn:
+                if read_engine.dialect.name != "postgresql":
+                    await conn.execute(text("SELECT 1"))
+                    return True
+                # Caught up means no lag even if the primary has been idle for a while;
+                # NULL on a primary or a replica that has replayed nothing yet
+                lag = await conn.scalar(text(
+                    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+                ))
+                return lag is None or float(lag) <= self.max_lag
+        except Exception:
+            logger.debug("Read replica check failed", exc_info=True)
+            return False
@@ -0,0 +1,66 @@
+import asyncio
+import logging
+from datetime import timedelta
+from typing import Callable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.features.expenses.models import utcnow
+from app.features.expenses.repo import ExpensesRepository
+
+logger = logging.getLogger(__name__)
+
+
+class ExpenseArchiver:
+    """
+    Moves expenses older than `after` to the archive tables every `interval` seconds.
+
+    The hot `expenses` / `expense_splits` tables then only hold recent history, which
+    is what edits, removals and most reads touch; the few reads that need all of a
+    chat's history (summary, reconciliation, older pages of /expense_view and
+    search) continue into the archive. Each batch of `batch` expenses moves in its
+    own transaction, so a tick never holds locks on more than one batch. Balances are
+    not touched. Several processes may run an archiver against the same database.
+    """
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        interval: float,
+        after: timedelta,
+        batch: int = 500,
+    ):
+        self.session_factory = session_factory
+        self.interval = interval
+        self.after = after
+        self.batch = batch
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def aclose(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.tick()
+            except Exception:
+                logger.exception("Expense archival failed")
+            await asyncio.sleep(self.interval)
+
+    async def tick(self) -> int:
+        """Archive everything currently past the cutoff; returns how many expenses moved."""
+        before = utcnow() - self.after
+        total = 0
+        while True:
+            async with self.session_factory() as session:
+                moved = await ExpensesRepository(session).archive_expenses(before, self.batch)
+                await session.commit()
+            total += moved
+            if moved < self.batch:
+                if total:
+                    logger.info("Archived %d expenses created before %s", total, before.date())
+                return total
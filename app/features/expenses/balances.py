@@ -0,0 +1,109 @@
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from typing import Iterable
+
+from app.features.expenses.fx import FxRateCache
+from app.features.expenses.money import convert_minor, from_minor, to_minor
+
+# All amounts here are integer minor units; only FX rates are Decimal.
+
+# (user_id, currency, day, total) rows, pre-aggregated so FX conversion runs once per group
+CurrencyDayTotal = tuple[int, str, date, int]
+
+
+def split_equally(amount: int, n: int) -> list[int]:
+    """Split `amount` into n parts; leftover units go to the first parts."""
+    if n <= 0:
+        return []
+    base, extra = divmod(amount, n)
+    return [base + (1 if i < extra else 0) for i in range(n)]
+
+
+def allocate(total: int, weights: list[int]) -> list[int]:
+    """
+    Split `total` proportionally to `weights` into parts summing to `total`.
+    Leftover units go to the largest remainders, earlier parts first on ties.
+    """
+    weight_sum = sum(weights)
+    if not weights or weight_sum == 0:
+        return [0] * len(weights)
+
+    parts, remainders = [], []
+    for w in weights:
+        q, r = divmod(total * w, weight_sum)
+        parts.append(q)
+        remainders.append(r)
+
+    leftover = total - sum(parts)
+    by_remainder = sorted(range(len(parts)), key=lambda i: (-remainders[i], i))
+    for i in by_remainder[:leftover]:
+        parts[i] += 1
+    return parts
+
+
+def split_debits(
+    amount: int,
+    shares: list[tuple[int, int]],
+    fx_rate: Decimal,
+    currency: str,
+    base: str,
+) -> list[int]:
+    """
+    Each share of an expense converted to the chat's base currency.
+    The parts sum exactly to the converted amount, so the payer's credit balances them.
+    """
+    return allocate(convert_minor(amount, fx_rate, currency, base), [s for _, s in shares])
+
+
+def split_deltas(payer_id: int, debits: Iterable[tuple[int, int]]) -> dict[int, int]:
+    """
+    Balance deltas for one expense from its (user_id, base_amount) splits: the payer is
+    credited their sum and each user debited their part, so the deltas sum to zero.
+    Negating the result reverses the expense exactly.
+    """
+    deltas: dict[int, int] = defaultdict(int)
+    for user_id, base_amount in debits:
+        deltas[payer_id] += base_amount
+        deltas[user_id] -= base_amount
+    return {user_id: d for user_id, d in deltas.items() if d}
+
+
+def net_balances(
+    credits: Iterable[CurrencyDayTotal],
+    debits: Iterable[CurrencyDayTotal],
+    base: str,
+    rates: FxRateCache,
+) -> dict[int, int]:
+    """
+    Net balance per user in `base` minor units from pre-aggregated (user, currency, day, total) rows.
+    Rates must already be resolved for every (currency, day) in the rows.
+    Positive means the user is owed money.
+    """
+    net: dict[int, Decimal] = defaultdict(Decimal)
+    for sign, rows in ((1, credits), (-1, debits)):
+        for user_id, currency, day, total in rows:
+            net[user_id] += sign * rates.convert(from_minor(total, currency), currency, base, day)
+    return {user_id: to_minor(v, base) for user_id, v in net.items()}
+
+
+def settle(balances: dict[int, int]) -> list[tuple[int, int, int]]:
+    """Greedy settlement: largest debtor pays largest creditor until all are square."""
+    debtors = sorted(((-v, u) for u, v in balances.items() if v < 0), reverse=True)
+    creditors = sorted(((v, u) for u, v in balances.items() if v > 0), reverse=True)
+
+    transfers: list[tuple[int, int, int]] = []
+    i = j = 0
+    while i < len(debtors) and j < len(creditors):
+        owe, debtor = debtors[i]
+        due, creditor = creditors[j]
+        amount = min(owe, due)
+        transfers.append((debtor, creditor, amount))
+
+        debtors[i] = (owe - amount, debtor)
+        creditors[j] = (due - amount, creditor)
+        if debtors[i][0] == 0:
+            i += 1
+        if creditors[j][0] == 0:
+            j += 1
+    return transfers
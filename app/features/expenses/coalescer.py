@@ -0,0 +1,100 @@
+import asyncio
+import logging
+from typing import Callable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.errors import DomainError
+from app.features.expenses.dto import ExpenseDTO, ExpenseWrite
+from app.features.expenses.repo import ExpensesRepository
+from app.features.expenses.service import ExpensesService
+
+logger = logging.getLogger(__name__)
+
+Pending = tuple[ExpenseWrite, "asyncio.Future[ExpenseDTO]"]
+
+
+class ExpenseWriteCoalescer:
+    """
+    Group commit for expense writes.
+
+    Writes for the same chat arriving within `window` seconds are applied together
+    by ExpensesService.add_expenses: one transaction, one balance UPDATE. Each caller
+    still gets its own result or DomainError back.
+    """
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        window: float,
+        max_batch: int = 100,
+    ):
+        self.session_factory = session_factory
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: dict[int, list[Pending]] = {}
+        self._timers: dict[int, asyncio.Task] = {}
+        self._flushing: set[asyncio.Task] = set()
+
+    async def submit(self, write: ExpenseWrite) -> ExpenseDTO:
+        fut: asyncio.Future[ExpenseDTO] = asyncio.get_running_loop().create_future()
+        chat_id = write.tg_chat_id
+
+        batch = self._pending.setdefault(chat_id, [])
+        batch.append((write, fut))
+
+        if len(batch) >= self.max_batch:
+            timer = self._timers.pop(chat_id, None)
+            if timer:
+                timer.cancel()
+            task = asyncio.create_task(self._flush(chat_id))
+            self._flushing.add(task)
+            task.add_done_callback(self._flushing.discard)
+        elif chat_id not in self._timers:
+            self._timers[chat_id] = asyncio.create_task(self._flush_later(chat_id))
+
+        return await fut
+
+    async def aclose(self) -> None:
+        """Flush everything still pending (e.g. on shutdown)."""
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        await asyncio.gather(
+            *self._flushing,
+            *(self._flush(chat_id) for chat_id in list(self._pending)),
+        )
+
+    async def _flush_later(self, chat_id: int) -> None:
+        await asyncio.sleep(self.window)
+        task = self._timers.pop(chat_id)
+        # From here on this is an in-flight flush, awaited (not cancelled) by aclose()
+        self._flushing.add(task)
+        task.add_done_callback(self._flushing.discard)
+        await self._flush(chat_id)
+
+    async def _flush(self, chat_id: int) -> None:
+        batch = self._pending.pop(chat_id, [])
+        if not batch:
+            return
+
+        try:
+            async with self.session_factory() as session:
+                svc = ExpensesService(ExpensesRepository(session))
+                results = await svc.add_expenses(chat_id, [write for write, _ in batch])
+        except Exception as e:
+            # Whole batch failed (e.g. chat not found, DB down): every caller sees it
+            if not isinstance(e, DomainError):
+                logger.exception("Expense batch for chat %s failed", chat_id)
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+
+        logger.debug("Applied %d expense writes for chat %s in one transaction", len(batch), chat_id)
+        for (_, fut), result in zip(batch, results):
+            if fut.done():
+                continue
+            if isinstance(result, DomainError):
+                fut.set_exception(result)
+            else:
+                fut.set_result(result)
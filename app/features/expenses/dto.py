@@ -3,9 +3,114 @@ from datetime import datetime
 from decimal import Decimal
 
 
+@dataclass(frozen=True)
+class ExpenseWrite:
+    """A pending /expense_add, as submitted by the handler."""
+    tg_chat_id: int
+    tg_user_id: int
+    amount: Decimal
+    desc: str
+    currency: str | None = None
+    # Split equally among these members (user ids) instead of everyone
+    split_user_ids: tuple[int, ...] | None = None
+
+
 @dataclass(frozen=True)
 class ExpenseDTO:
+    id: int
     paid_by: str
     amount: Decimal
     desc: str
     created_at: datetime
+    currency: str
+
+
+@dataclass(frozen=True)
+class BalanceDTO:
+    name: str
+    balance: Decimal
+
+
+@dataclass(frozen=True)
+class BalancesAsOfDTO:
+    currency: str
+    at: datetime
+    balances: list[BalanceDTO]
+
+
+@dataclass(frozen=True)
+class ChatBalanceDTO:
+    title: str | None
+    currency: str
+    balance: Decimal
+
+
+@dataclass(frozen=True)
+class UserBalancesDTO:
+    """One user's non-zero balances across chats, with totals per currency."""
+    balances: list[ChatBalanceDTO]
+    totals: dict[str, Decimal]
+
+
+@dataclass(frozen=True)
+class SettlementDTO:
+    from_name: str
+    to_name: str
+    amount: Decimal
+
+
+@dataclass(frozen=True)
+class ChatSummaryDTO:
+    currency: str
+    total_spent: Decimal
+    balances: list[BalanceDTO]
+    settlements: list[SettlementDTO]
+
+
+@dataclass(frozen=True)
+class MemberBalanceDTO:
+    """Seed for live views that then add ChatUpdated deltas: balance is in minor units."""
+    user_id: int
+    name: str
+    balance: int
+
+
+@dataclass(frozen=True)
+class DashboardSnapshotDTO:
+    # The pinned message, None once the dashboard is turned off
+    message_id: int | None
+    currency: str
+    balances: list[MemberBalanceDTO]
+    recent: list[ExpenseDTO]
+
+
+@dataclass(frozen=True)
+class SearchPageDTO:
+    query: str
+    page: int
+    results: list[ExpenseDTO]
+    has_more: bool
+
+
+@dataclass(frozen=True)
+class RecurringDTO:
+    id: int
+    paid_by: str
+    amount: Decimal
+    currency: str
+    desc: str
+    every: int
+    unit: str
+    next_run_at: datetime
+
+
+@dataclass(frozen=True)
+class DigestDTO:
+    chat_id: int
+    tg_chat_id: int
+    kind: str
+    currency: str
+    balances: list[BalanceDTO]
+    settlements: list[SettlementDTO]
+    # Hosted bot serving the chat (Chat.bot); None for the default one
+    bot: str | None = None
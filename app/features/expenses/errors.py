@@ -1,3 +1,4 @@
+from datetime import date, datetime
 from app.core.errors import DomainError
 
 class NotMember(DomainError):
@@ -15,3 +16,48 @@ class ChatNotFound(DomainError):
 class ServerError(DomainError):
     def __init__(self):
         super().__init__("Error processing request. Please try again.", code="server_error")
+
+class RateNotFound(DomainError):
+    def __init__(self, currency: str, on: date):
+        super().__init__(
+            f"No exchange rate for {currency} on or before {on.isoformat()}. Use /rate to add one.",
+            code="rate_not_found"
+        )
+
+class RateForBaseCurrency(DomainError):
+    def __init__(self, base: str):
+        super().__init__(
+            f"{base} is this chat's base currency. Set rates for other currencies, in {base}.",
+            code="rate_for_base_currency"
+        )
+
+class BaseCurrencyLocked(DomainError):
+    def __init__(self):
+        super().__init__(
+            "The base currency can't be changed once expenses have been recorded.",
+            code="base_currency_locked"
+        )
+
+class ExpenseNotFound(DomainError):
+    def __init__(self, expense_id: int):
+        super().__init__(f"Expense #{expense_id} not found.", code="expense_not_found")
+
+class RecurringNotFound(DomainError):
+    def __init__(self, recurring_id: int):
+        super().__init__(f"Recurring expense #{recurring_id} not found.", code="recurring_not_found")
+
+class BalanceHistoryUnavailable(DomainError):
+    def __init__(self, since: datetime):
+        super().__init__(
+            f"Balance history starts on {since.date().isoformat()}.",
+            code="balance_history_unavailable"
+        )
+
+class InvalidAmount(DomainError):
+    def __init__(self, currency: str):
+        super().__init__(f"Amount is out of range for {currency}.", code="invalid_amount")
+
+class BatchRejected(DomainError):
+    def __init__(self, errors: list[tuple[int, str]]):
+        lines = "\n".join(f"Line {n}: {message}" for n, message in errors)
+        super().__init__(f"Nothing was added. Fix these lines and send the batch again:\n{lines}", code="batch_rejected")
@@ -0,0 +1,96 @@
+import logging
+from dataclasses import dataclass, field
+from typing import Callable
+
+from app.features.expenses.dto import ExpenseDTO
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ChatUpdated:
+    """
+    Published after a commit that changed a chat's expenses, balances or settings.
+    `deltas` are per-user balance changes in base-currency minor units, `expenses` were added
+    and `removed` are ids of expenses that no longer count (removed or replaced by an
+    edit). When `stale` is set the change can't be expressed this way and listeners
+    should reload instead. `remote` events were committed by another process and
+    relayed by the invalidation bus; they are always stale and their deltas only
+    name the users affected (values are 0).
+    """
+    tg_chat_id: int
+    deltas: dict[int, int] = field(default_factory=dict)
+    expenses: list[ExpenseDTO] = field(default_factory=list)
+    removed: list[int] = field(default_factory=list)
+    stale: bool = False
+    remote: bool = False
+
+
+@dataclass(frozen=True)
+class RatesUpdated:
+    """
+    Published after a commit that changed FX rates. Rates are shared by every chat,
+    so no chat is named; `remote` as for ChatUpdated.
+    """
+    remote: bool = False
+
+
+Listener = Callable[[ChatUpdated], None]
+RatesListener = Callable[[RatesUpdated], None]
+
+
+class ChatEvents:
+    """
+    In-process fan-out of committed chat changes to caches and live views, and of
+    FX rate changes to the rate cache. reset() tells every cache to drop everything,
+    for when changes may have been missed.
+    """
+    def __init__(self):
+        self._listeners: list[Listener] = []
+        self._rate_listeners: list[RatesListener] = []
+        self._resets: list[Callable[[], None]] = []
+
+    def subscribe(self, listener: Listener, reset: Callable[[], None] | None = None) -> None:
+        self._listeners.append(listener)
+        if reset:
+            self._resets.append(reset)
+
+    def unsubscribe(self, listener: Listener, reset: Callable[[], None] | None = None) -> None:
+        self._listeners.remove(listener)
+        if reset:
+            self._resets.remove(reset)
+
+    def subscribe_rates(self, listener: RatesListener, reset: Callable[[], None] | None = None) -> None:
+        self._rate_listeners.append(listener)
+        if reset:
+            self._resets.append(reset)
+
+    def unsubscribe_rates(self, listener: RatesListener, reset: Callable[[], None] | None = None) -> None:
+        self._rate_listeners.remove(listener)
+        if reset:
+            self._resets.remove(reset)
+
+    def reset(self) -> None:
+        for reset in list(self._resets):
+            try:
+                reset()
+            except Exception:
+                logger.exception("Cache reset failed")
+
+    def publish(self, event: ChatUpdated) -> None:
+        # Listeners must not block: they update memory and schedule their own I/O
+        for listener in list(self._listeners):
+            try:
+                listener(event)
+            except Exception:
+                logger.exception("Chat event listener failed for chat %s", event.tg_chat_id)
+
+    def publish_rates(self, event: RatesUpdated) -> None:
+        for listener in list(self._rate_listeners):
+            try:
+                listener(event)
+            except Exception:
+                logger.exception("Rates listener failed")
+
+
+chat_events = ChatEvents()
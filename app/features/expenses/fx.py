@@ -0,0 +1,118 @@
+import csv
+from bisect import bisect_right
+from datetime import date
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Iterable
+
+from app.core.config import settings
+from app.features.expenses.errors import RateNotFound
+from app.features.expenses.events import RatesUpdated, chat_events
+
+# Precision of the conversion rate recorded on each expense
+RATE_EXP = Decimal("0.00000001")
+
+RateKey = tuple[str, date]
+Series = dict[str, list[tuple[date, Decimal]]]
+
+
+class FxRateCache:
+    """
+    In-memory cache of pivot rates keyed by (currency, date).
+
+    Callers resolve every key they need in one go (`missing` + `fill`), so a
+    summary over thousands of expenses costs at most one rate query. Only rates
+    found are cached: a missing one is looked up again next time, so a rate added
+    later is picked up. A chat's own rates (ChatFxRate) are cached per chat and
+    base currency, as loaded, and take precedence in conversion_rate(). Any
+    process's RatesUpdated clears the cache.
+    """
+    def __init__(self, pivot: str):
+        self.pivot = pivot
+        self._rates: dict[RateKey, Decimal] = {}
+        self._chats: dict[tuple[int, str], Series] = {}
+
+    def missing(self, keys: Iterable[RateKey]) -> set[RateKey]:
+        return {
+            k for k in keys
+            if k[0] != self.pivot and k not in self._rates
+        }
+
+    def fill(self, keys: Iterable[RateKey], series: Series) -> None:
+        """Resolve `keys` against per-currency series sorted by date (latest on or before)."""
+        for currency, on in keys:
+            rate = _on_or_before(series.get(currency, []), on)
+            if rate is not None:
+                self._rates[(currency, on)] = rate
+
+    def has_chat(self, chat_id: int, base: str) -> bool:
+        return (chat_id, base) in self._chats
+
+    def fill_chat(self, chat_id: int, base: str, series: Series) -> None:
+        self._chats[(chat_id, base)] = series
+
+    def rate(self, currency: str, on: date) -> Decimal:
+        if currency == self.pivot:
+            return Decimal(1)
+
+        rate = self._rates.get((currency, on))
+        if rate is None:
+            raise RateNotFound(currency, on)
+        return rate
+
+    def convert(self, amount: Decimal, currency: str, to: str, on: date) -> Decimal:
+        """Convert without rounding; callers round once per total."""
+        if currency == to:
+            return amount
+        return amount * self.rate(currency, on) / self.rate(to, on)
+
+    def conversion_rate(self, currency: str, to: str, on: date, chat_id: int | None = None) -> Decimal:
+        """
+        Rate from `currency` to `to`, at the precision stored on Expense.fx_rate: the
+        chat's own rate if it has one (see fill_chat), else through the pivot.
+        """
+        if currency == to:
+            return Decimal(1)
+        if chat_id is not None:
+            rate = _on_or_before(self._chats.get((chat_id, to), {}).get(currency, []), on)
+            if rate is not None:
+                return rate.quantize(RATE_EXP, rounding=ROUND_HALF_UP)
+        return (self.rate(currency, on) / self.rate(to, on)).quantize(RATE_EXP, rounding=ROUND_HALF_UP)
+
+    def on_rates_updated(self, _event: RatesUpdated) -> None:
+        # Cached lookups may resolve to an older rate
+        self.clear()
+
+    def clear(self) -> None:
+        self._rates.clear()
+        self._chats.clear()
+
+
+def _on_or_before(points: list[tuple[date, Decimal]], on: date) -> Decimal | None:
+    idx = bisect_right(points, on, key=lambda p: p[0])
+    return points[idx - 1][1] if idx else None
+
+
+fx_rates = FxRateCache(settings.FX_PIVOT_CURRENCY)
+chat_events.subscribe_rates(fx_rates.on_rates_updated, fx_rates.clear)
+
+
+def parse_currency(code: str) -> str:
+    code = code.strip().upper()
+    if len(code) != 3 or not code.isalpha():
+        raise ValueError("Invalid currency code")
+    return code
+
+
+def read_rates_file(path: str) -> list[tuple[date, str, Decimal]]:
+    """Read `date,currency,rate` rows; a header line and blank lines are skipped."""
+    rows: list[tuple[date, str, Decimal]] = []
+    with open(path, newline="") as f:
+        for line in csv.reader(f):
+            if not line or line[0].strip().lower() == "date":
+                continue
+            rows.append((
+                date.fromisoformat(line[0].strip()),
+                parse_currency(line[1]),
+                Decimal(line[2].strip()),
+            ))
+    return rows
@@ -0,0 +1,147 @@
+import asyncio
+import json
+import logging
+import secrets
+from typing import Any
+
+import asyncpg
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.features.expenses.events import ChatUpdated, RatesUpdated, chat_events
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "centpai_invalidate"
+# NOTIFY payloads must stay under 8000 bytes
+MAX_PAYLOAD = 7900
+
+
+class InvalidationBus:
+    """
+    Cross-process cache invalidation over Postgres LISTEN/NOTIFY.
+
+    Every ChatUpdated published in this process (after its commit) is sent as a
+    NOTIFY of (entity, chat, version) plus the users whose balances moved. The
+    other processes re-publish it locally as a `remote`, stale event, so each cache
+    evicts that chat exactly as it would for a local change. RatesUpdated is relayed
+    the same way, so every process's FX cache drops rates changed anywhere.
+    `version` counts notifications per sending process; a gap means some were
+    missed and every cache is reset.
+
+    Each process keeps one dedicated listener connection outside the pool. While it
+    is down, caches are reset every `ttl` seconds until it reconnects, and once more
+    on reconnecting, so they are never more than `ttl` stale.
+    """
+    def __init__(self, engine: AsyncEngine, ttl: float = 30.0):
+        self.engine = engine
+        self.ttl = ttl
+        self.origin = secrets.token_hex(6)
+        self.connected = False
+        self.received = 0
+        self._version = 0
+        self._versions: dict[str, int] = {}
+        self._outbox: asyncio.Queue[str] = asyncio.Queue()
+        self._tasks: list[asyncio.Task] = []
+
+    def start(self) -> None:
+        chat_events.subscribe(self.on_chat_updated)
+        chat_events.subscribe_rates(self.on_rates_updated)
+        self._tasks = [asyncio.create_task(self._listen()), asyncio.create_task(self._send())]
+
+    async def aclose(self) -> None:
+        chat_events.unsubscribe(self.on_chat_updated)
+        chat_events.unsubscribe_rates(self.on_rates_updated)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def on_chat_updated(self, event: ChatUpdated) -> None:
+        if event.remote:
+            return
+        self._version += 1
+        message: dict[str, Any] = {"e": "chat", "c": event.tg_chat_id, "o": self.origin, "v": self._version}
+        payload = json.dumps(message | {"u": list(event.deltas)}, separators=(",", ":"))
+        if len(payload) > MAX_PAYLOAD:
+            # Too many users to list: receivers reset everything instead
+            payload = json.dumps(message | {"all": True}, separators=(",", ":"))
+        self._outbox.put_nowait(payload)
+
+    def on_rates_updated(self, event: RatesUpdated) -> None:
+        if event.remote:
+            return
+        self._version += 1
+        message = {"e": "fx", "o": self.origin, "v": self._version}
+        self._outbox.put_nowait(json.dumps(message, separators=(",", ":")))
+
+    async def _send(self) -> None:
+        while True:
+            batch = [await self._outbox.get()]
+            while not self._outbox.empty():
+                batch.append(self._outbox.get_nowait())
+            # Sent from the pool, so notifications go out even while our listener is down
+            while True:
+                try:
+                    async with self.engine.connect() as conn:
+                        await conn.execute(
+                            text("SELECT pg_notify(:channel, p) FROM unnest(CAST(:payloads AS text[])) AS p"),
+                            {"channel": CHANNEL, "payloads": batch},
+                        )
+                        await conn.commit()
+                    break
+                except Exception:
+                    logger.warning("Could not publish %d invalidations, retrying", len(batch), exc_info=True)
+                    await asyncio.sleep(1.0)
+
+    async def _listen(self) -> None:
+        dsn = self.engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+        while True:
+            conn: asyncpg.Connection | None = None
+            try:
+                conn = await asyncpg.connect(dsn)
+                lost = asyncio.Event()
+                conn.add_termination_listener(lambda _: lost.set())
+                await conn.add_listener(CHANNEL, self._on_notify)
+                self.connected = True
+                # Whatever was published while we weren't listening is gone
+                chat_events.reset()
+                logger.info("Cache invalidation listener connected")
+                while not lost.is_set():
+                    try:
+                        await asyncio.wait_for(lost.wait(), self.ttl)
+                    except asyncio.TimeoutError:
+                        # An idle LISTEN connection can die silently; a round trip notices
+                        await conn.execute("SELECT 1")
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("Cache invalidation listener down, caches expire every %ss", self.ttl, exc_info=True)
+            finally:
+                self.connected = False
+                if conn is not None:
+                    conn.terminate()
+            chat_events.reset()
+            await asyncio.sleep(self.ttl)
+
+    def _on_notify(self, _conn: Any, _pid: int, _channel: str, payload: str) -> None:
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            logger.warning("Ignoring malformed invalidation %r", payload)
+            return
+        origin, version = message.get("o"), message.get("v")
+        if origin == self.origin:
+            return
+        self.received += 1
+
+        last = self._versions.get(origin)
+        self._versions[origin] = version
+        if message.get("all") or (last is not None and version != last + 1):
+            chat_events.reset()
+            return
+        if message.get("e") == "chat":
+            chat_events.publish(ChatUpdated(
+                message["c"], deltas=dict.fromkeys(message.get("u", []), 0), stale=True, remote=True
+            ))
+        elif message.get("e") == "fx":
+            chat_events.publish_rates(RatesUpdated(remote=True))
@@ -0,0 +1,100 @@
+import asyncio
+import logging
+from typing import Callable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.features.expenses.repo import ExpensesRepository
+from app.features.expenses.service import ExpensesService
+
+logger = logging.getLogger(__name__)
+
+
+class LedgerVerifier:
+    """
+    Checks every `interval` seconds that each chat's balances match its ledger.
+
+    Chats are walked by keyset in pages of `batch`, verifying `concurrency` at a
+    time, each in its own short transaction. A check replays only the entries since
+    the chat's latest checkpoint, and takes a new checkpoint once `checkpoint_every`
+    entries have accumulated, so both verification and as-of reads stay bounded
+    however long the history grows. Drift is logged and counted, never repaired;
+    except that a chat never opened (see scripts/open_ledger.py) whose expenses or
+    payments predate its first entry is opened at its stored balances instead.
+    """
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        interval: float,
+        checkpoint_every: int = 1000,
+        batch: int = 200,
+        concurrency: int = 4,
+    ):
+        self.session_factory = session_factory
+        self.interval = interval
+        self.checkpoint_every = checkpoint_every
+        self.batch = batch
+        self.drifted: set[int] = set()
+        self._slots = asyncio.Semaphore(concurrency)
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def aclose(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.tick()
+            except Exception:
+                logger.exception("Ledger verification failed")
+            await asyncio.sleep(self.interval)
+
+    async def tick(self) -> int:
+        """Verify every chat once; returns how many have drifted."""
+        cursor, checked = 0, 0
+        drifted: set[int] = set()
+        while True:
+            async with self.session_factory() as session:
+                chat_ids = await ExpensesRepository(session).list_chat_ids(cursor, self.batch)
+            results = await asyncio.gather(*(self._verify(chat_id) for chat_id in chat_ids))
+            drifted.update(chat_id for chat_id, ok in zip(chat_ids, results) if not ok)
+            checked += len(chat_ids)
+            if len(chat_ids) < self.batch:
+                break
+            cursor = chat_ids[-1]
+
+        self.drifted = drifted
+        logger.info("Verified the ledger of %d chats, %d drifted", checked, len(drifted))
+        return len(drifted)
+
+    async def _verify(self, chat_id: int) -> bool:
+        async with self._slots:
+            try:
+                async with self.session_factory() as session:
+                    drift = await ExpensesService(ExpensesRepository(session)).verify_ledger(
+                        chat_id, self.checkpoint_every
+                    )
+            except Exception:
+                logger.warning("Could not verify the ledger of chat %s", chat_id, exc_info=True)
+                return True
+            if drift and await self._open(chat_id):
+                return True
+            for user_id, d in sorted(drift.items()):
+                logger.error("Chat %s: balance of user %s is off the ledger by %+d minor units", chat_id, user_id, d)
+            return not drift
+
+    async def _open(self, chat_id: int) -> bool:
+        try:
+            async with self.session_factory() as session:
+                opened = await ExpensesService(ExpensesRepository(session)).open_ledger(chat_id, only_pre_ledger=True)
+        except Exception:
+            logger.warning("Could not open the ledger of chat %s", chat_id, exc_info=True)
+            return False
+        if opened:
+            logger.info("Opened the ledger of chat %s at its stored balances, it has history from before the ledger", chat_id)
+        return opened
@@ -0,0 +1,48 @@
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.orm.interfaces import LoaderOption
+
+from app.features.expenses.models import ArchivedExpense, Balance, ChatMember, Expense, Payment, RecurringExpense
+
+# Named fetch shapes for repository queries. Relationships default to lazy="raise",
+# so anything a caller touches must be listed in the profile its query uses.
+# joinedload adds no statement; each selectinload adds exactly one.
+LOADER_PROFILES: dict[str, tuple[LoaderOption, ...]] = {
+    # /expense_view, dashboard: payer name only (1 statement)
+    "expense_list": (
+        joinedload(Expense.payer),
+    ),
+    # Per-expense split breakdown (2 statements)
+    "expense_detail": (
+        joinedload(Expense.payer),
+        selectinload(Expense.splits),
+    ),
+    # The same shapes for expenses read through from the archive
+    "archived_expense_list": (
+        joinedload(ArchivedExpense.payer),
+    ),
+    "archived_expense_detail": (
+        joinedload(ArchivedExpense.payer),
+        selectinload(ArchivedExpense.splits),
+    ),
+    # Member names (1 statement)
+    "member_list": (
+        joinedload(ChatMember.user),
+    ),
+    # Balances with user names, no chat (1 statement)
+    "balance_summary": (
+        joinedload(Balance.user),
+    ),
+    # Both sides of each payment (1 statement)
+    "payment_list": (
+        joinedload(Payment.from_user),
+        joinedload(Payment.to_user),
+    ),
+    # /recurring: payer name only (1 statement)
+    "recurring_list": (
+        joinedload(RecurringExpense.payer),
+    ),
+}
+
+
+def loader_profile(name: str) -> tuple[LoaderOption, ...]:
+    return LOADER_PROFILES[name]
@@ -0,0 +1,80 @@
+from dataclasses import dataclass, field
+from typing import Iterable
+
+from app.features.expenses.events import ChatUpdated, chat_events
+
+
+@dataclass
+class _ChatMentions:
+    # telegram_user_id -> user_id, and lowercased username -> telegram_user_id
+    members: dict[int, int] = field(default_factory=dict)
+    usernames: dict[str, int] = field(default_factory=dict)
+
+
+class MentionIndex:
+    """
+    Per-chat cache of which members @mentions and text mentions refer to.
+
+    Filled from resolver misses. A chat's map is dropped when its membership
+    changes (stale ChatUpdated); rename() moves a user's entries when their
+    username changes, so an old @name stops resolving to them.
+    """
+    def __init__(self):
+        self._chats: dict[int, _ChatMentions] = {}
+        # Last known username per Telegram user, and the chats they are cached in
+        self._usernames: dict[int, str | None] = {}
+        self._seen_in: dict[int, set[int]] = {}
+        chat_events.subscribe(self.on_chat_updated, self.clear)
+
+    def lookup(
+        self, tg_chat_id: int, usernames: Iterable[str], tg_user_ids: Iterable[int]
+    ) -> tuple[dict[str, int], dict[int, int]]:
+        """Cached user_id per lowercased username and per Telegram user id."""
+        chat = self._chats.get(tg_chat_id)
+        if chat is None:
+            return {}, {}
+        by_name = {
+            name: chat.members[chat.usernames[name]]
+            for name in usernames if name in chat.usernames
+        }
+        by_id = {tg_id: chat.members[tg_id] for tg_id in tg_user_ids if tg_id in chat.members}
+        return by_name, by_id
+
+    def remember(self, tg_chat_id: int, rows: Iterable[tuple[int, int, str | None]]) -> None:
+        chat = self._chats.setdefault(tg_chat_id, _ChatMentions())
+        for user_id, tg_user_id, username in rows:
+            chat.members[tg_user_id] = user_id
+            if username:
+                chat.usernames[username.lower()] = tg_user_id
+            self._usernames[tg_user_id] = username
+            self._seen_in.setdefault(tg_user_id, set()).add(tg_chat_id)
+
+    def username_of(self, tg_user_id: int) -> tuple[bool, str | None]:
+        """(known, username): whether the user is cached anywhere, and under which name."""
+        if tg_user_id not in self._usernames:
+            return False, None
+        return True, self._usernames[tg_user_id]
+
+    def rename(self, tg_user_id: int, username: str | None) -> None:
+        old = self._usernames.get(tg_user_id)
+        self._usernames[tg_user_id] = username
+        for tg_chat_id in self._seen_in.get(tg_user_id, ()):
+            chat = self._chats.get(tg_chat_id)
+            if chat is None:
+                continue
+            if old and chat.usernames.get(old.lower()) == tg_user_id:
+                del chat.usernames[old.lower()]
+            if username:
+                chat.usernames[username.lower()] = tg_user_id
+
+    def on_chat_updated(self, event: ChatUpdated) -> None:
+        if event.stale:
+            self._chats.pop(event.tg_chat_id, None)
+
+    def clear(self) -> None:
+        self._chats.clear()
+        self._usernames.clear()
+        self._seen_in.clear()
+
+
+mention_index = MentionIndex()
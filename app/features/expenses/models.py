@@ -1,6 +1,6 @@
-from datetime import datetime, timezone
+from datetime import date, datetime, timezone
 from decimal import Decimal
-from sqlalchemy import BigInteger, CheckConstraint, DateTime, ForeignKey, Integer, Numeric, String, UniqueConstraint
+from sqlalchemy import BigInteger, Boolean, CheckConstraint, Date, DateTime, ForeignKey, Index, Integer, Numeric, String, UniqueConstraint, func
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 def utcnow() -> datetime:
@@ -9,23 +9,43 @@ def utcnow() -> datetime:
 class Base(DeclarativeBase):
     pass
 
+# Every relationship is lazy="raise": nothing loads implicitly under AsyncSession.
+# Queries state what they fetch through the profiles in loaders.py.
+
+# Money columns are BIGINT minor units of their currency (see money.py).
+
+DEFAULT_CURRENCY = "USD"
+
 class Chat(Base):
     __tablename__ = "chats"
+    __table_args__ = (
+        # Keyset scan of chats subscribed to a digest kind
+        Index("ix_chats_digest_id", "digest", "id"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     telegram_chat_id: Mapped[int] = mapped_column(BigInteger, unique=True, index=True)
+    # Group title as last seen on an update (written behind, see profiles.py)
+    title: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    # Hosted bot that last received an update from this chat and sends to it (written behind)
+    bot: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    base_currency: Mapped[str] = mapped_column(String(3), default=DEFAULT_CURRENCY, server_default=DEFAULT_CURRENCY)
+    # Pinned live dashboard, if enabled for this chat
+    dashboard_message_id: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
+    # Opt-in balance digest: "d" daily, "w" weekly
+    digest: Mapped[str | None] = mapped_column(String(1), nullable=True)
 
     members: Mapped[list["ChatMember"]] = relationship(
-        back_populates="chat", cascade="all, delete-orphan"
+        back_populates="chat", cascade="all, delete-orphan", lazy="raise"
     )
     expenses: Mapped[list["Expense"]] = relationship(
-        back_populates="chat", cascade="all, delete-orphan"
+        back_populates="chat", cascade="all, delete-orphan", lazy="raise"
     )
     payments: Mapped[list["Payment"]] = relationship(
-        back_populates="chat", cascade="all, delete-orphan"
+        back_populates="chat", cascade="all, delete-orphan", lazy="raise"
     )
     balances: Mapped[list["Balance"]] = relationship(
-        back_populates="chat", cascade="all, delete-orphan"
+        back_populates="chat", cascade="all, delete-orphan", lazy="raise"
     )
 
 class User(Base):
@@ -38,19 +58,22 @@ class User(Base):
     first_name: Mapped[str] = mapped_column(String(255))
     last_name: Mapped[str | None] = mapped_column(String(255), nullable=True)
 
-    chats: Mapped[list["ChatMember"]] = relationship(back_populates="user")
-    paid_expenses: Mapped[list["Expense"]] = relationship(back_populates="payer")
-    owed_splits: Mapped[list["ExpenseSplit"]] = relationship(back_populates="user")
+    chats: Mapped[list["ChatMember"]] = relationship(back_populates="user", lazy="raise")
+    paid_expenses: Mapped[list["Expense"]] = relationship(back_populates="payer", lazy="raise")
+    owed_splits: Mapped[list["ExpenseSplit"]] = relationship(back_populates="user", lazy="raise")
     sent_payments: Mapped[list["Payment"]] = relationship(
-        back_populates="from_user", foreign_keys="Payment.from_user_id"
+        back_populates="from_user", foreign_keys="Payment.from_user_id", lazy="raise"
     )
     received_payments: Mapped[list["Payment"]] = relationship(
-        back_populates="to_user", foreign_keys="Payment.to_user_id"
+        back_populates="to_user", foreign_keys="Payment.to_user_id", lazy="raise"
     )
     balances: Mapped[list["Balance"]] = relationship(
-        back_populates="user", cascade="all, delete-orphan"
+        back_populates="user", cascade="all, delete-orphan", lazy="raise"
     )
 
+# @mention lookups are case-insensitive; joined to chat_members on (chat_id, user_id)
+Index("ix_users_username_lower", func.lower(User.username))
+
 class ChatMember(Base):
     """
     Join table: which users are part of which Telegram chat
@@ -64,31 +87,51 @@ class ChatMember(Base):
     chat_id: Mapped[int] = mapped_column(ForeignKey("chats.id", ondelete="CASCADE"), index=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), index=True)
 
-    chat: Mapped["Chat"] = relationship(back_populates="members")
-    user: Mapped["User"] = relationship(back_populates="chats")
+    chat: Mapped["Chat"] = relationship(back_populates="members", lazy="raise")
+    user: Mapped["User"] = relationship(back_populates="chats", lazy="raise")
 
 
 class Expense(Base):
     __tablename__ = "expenses"
-    
+    __table_args__ = (
+        # /expense_search on Postgres: trigram match on description within one chat
+        # (needs the pg_trgm and btree_gin extensions, created by init_db)
+        Index(
+            "ix_expenses_chat_description_trgm",
+            "chat_id",
+            "description",
+            postgresql_using="gin",
+            postgresql_ops={"description": "gin_trgm_ops"},
+        ),
+        # A chat's expenses newest first (/expense_view, dashboard, search pages)
+        Index("ix_expenses_chat_created", "chat_id", "created_at"),
+    )
+
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     chat_id: Mapped[int] = mapped_column(ForeignKey("chats.id"), index=True)
     payer_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
 
-    amount: Mapped[Decimal] = mapped_column(Numeric(10, 2))
+    amount: Mapped[int] = mapped_column(BigInteger)
+    currency: Mapped[str] = mapped_column(String(3), default=DEFAULT_CURRENCY)
+    # Expense currency -> chat base currency, as applied to balances at write time
+    fx_rate: Mapped[Decimal] = mapped_column(Numeric(18, 8), default=Decimal(1))
     description: Mapped[str] = mapped_column(String(255))
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow)
+    # Soft delete: removed and edited expenses stay for history but no longer count
+    deleted_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
  
-    chat: Mapped["Chat"] = relationship(back_populates="expenses")
-    payer: Mapped["User"] = relationship(back_populates="paid_expenses")
+    chat: Mapped["Chat"] = relationship(back_populates="expenses", lazy="raise")
+    payer: Mapped["User"] = relationship(back_populates="paid_expenses", lazy="raise")
     splits: Mapped[list["ExpenseSplit"]] = relationship(
-        back_populates="expense", cascade="all, delete-orphan"
+        back_populates="expense", cascade="all, delete-orphan", lazy="raise"
     )
 
 class ExpenseSplit(Base):
     """
-    How much a user owes from an expense
+    How much a user owes from an expense, in minor units of the expense's currency
     Sum(splits.amount) should equal Expense.amount
+    base_amount is the same share in the chat's base currency, exactly as debited
+    from the user's balance; the payer was credited Sum(splits.base_amount)
     """
     __tablename__ = "expense_splits"
     __table_args__ = (
@@ -100,10 +143,55 @@ class ExpenseSplit(Base):
     expense_id: Mapped[int] = mapped_column(ForeignKey("expenses.id", ondelete="CASCADE"), index=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
 
-    amount: Mapped[Decimal] = mapped_column(Numeric(10, 2), nullable=False)
+    amount: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    base_amount: Mapped[int] = mapped_column(BigInteger, nullable=False)
+
+    expense: Mapped["Expense"] = relationship(back_populates="splits", lazy="raise")
+    user: Mapped["User"] = relationship(back_populates="owed_splits", lazy="raise")
+
+
+class ArchivedExpense(Base):
+    """
+    Cold copy of an Expense older than settings.ARCHIVE_AFTER_DAYS, same id and columns
+    Moved by ExpenseArchiver together with its splits; balances already include it,
+    and history, search and summaries read through both tables. Archived expenses
+    are settled history: they can no longer be edited or removed.
+    """
+    __tablename__ = "expenses_archive"
+    __table_args__ = (
+        Index("ix_expenses_archive_chat_created", "chat_id", "created_at"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    chat_id: Mapped[int] = mapped_column(ForeignKey("chats.id"))
+    payer_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+
+    amount: Mapped[int] = mapped_column(BigInteger)
+    currency: Mapped[str] = mapped_column(String(3))
+    fx_rate: Mapped[Decimal] = mapped_column(Numeric(18, 8))
+    description: Mapped[str] = mapped_column(String(255))
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    deleted_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    payer: Mapped["User"] = relationship(lazy="raise")
+    splits: Mapped[list["ArchivedExpenseSplit"]] = relationship(
+        back_populates="expense", cascade="all, delete-orphan", lazy="raise"
+    )
+
+class ArchivedExpenseSplit(Base):
+    """
+    Cold copy of an ExpenseSplit, moved with its expense
+    """
+    __tablename__ = "expense_splits_archive"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    expense_id: Mapped[int] = mapped_column(ForeignKey("expenses_archive.id", ondelete="CASCADE"), index=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
 
-    expense: Mapped["Expense"] = relationship(back_populates="splits")
-    user: Mapped["User"] = relationship(back_populates="owed_splits")
+    amount: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    base_amount: Mapped[int] = mapped_column(BigInteger, nullable=False)
+
+    expense: Mapped["ArchivedExpense"] = relationship(back_populates="splits", lazy="raise")
 
 
 class Payment(Base):
@@ -122,20 +210,21 @@ class Payment(Base):
     from_user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
     to_user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
 
-    amount: Mapped[Decimal] = mapped_column(Numeric(10, 2), nullable=False)
+    amount: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    currency: Mapped[str] = mapped_column(String(3), default=DEFAULT_CURRENCY)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow)
 
-    chat: Mapped["Chat"] = relationship(back_populates="payments")
+    chat: Mapped["Chat"] = relationship(back_populates="payments", lazy="raise")
     from_user: Mapped["User"] = relationship(
-        back_populates="sent_payments", foreign_keys=[from_user_id]
+        back_populates="sent_payments", foreign_keys=[from_user_id], lazy="raise"
     )
     to_user: Mapped["User"] = relationship(
-        back_populates="received_payments", foreign_keys=[to_user_id]
+        back_populates="received_payments", foreign_keys=[to_user_id], lazy="raise"
     )
 
 class Balance(Base):
     """
-    Net balance per user per chat
+    Net balance per user per chat, in minor units of the chat's base currency
     """
     __tablename__ = "balances"
     __table_args__ = (
@@ -146,8 +235,130 @@ class Balance(Base):
     chat_id: Mapped[int] = mapped_column(ForeignKey("chats.id", ondelete="CASCADE"), index=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), index=True)
 
-    balance: Mapped[Decimal] = mapped_column(Numeric(10, 2), nullable=False)
+    balance: Mapped[int] = mapped_column(BigInteger, nullable=False)
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow, onupdate=utcnow)
 
-    chat: Mapped["Chat"] = relationship(back_populates="balances")
-    user: Mapped["User"] = relationship(back_populates="balances")
+    chat: Mapped["Chat"] = relationship(back_populates="balances", lazy="raise")
+    user: Mapped["User"] = relationship(back_populates="balances", lazy="raise")
+
+class LedgerEntry(Base):
+    """
+    Append-only record of every change to a Balance, in minor units of the chat's base currency
+    Written in the same transaction as the Balance update and never changed afterwards,
+    so a balance at any point in time is the sum of the entries up to it
+    """
+    __tablename__ = "balance_ledger"
+    __table_args__ = (
+        # Replay of one chat's entries after a checkpoint
+        Index("ix_balance_ledger_chat_id", "chat_id", "id"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    chat_id: Mapped[int] = mapped_column(ForeignKey("chats.id", ondelete="CASCADE"))
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
+
+    delta: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow)
+
+class BalanceCheckpoint(Base):
+    """
+    A user's balance after ledger entry `ledger_id` of their chat (0: before any entry)
+    as_of is when that entry was written. Checkpoints are only taken once the ledger
+    matched the balances table; as-of reads replay the entries after the latest one.
+    An opening checkpoint carries a chat's balances from before the ledger existed
+    """
+    __tablename__ = "balance_checkpoints"
+    __table_args__ = (
+        UniqueConstraint("chat_id", "ledger_id", "user_id", name="uq_balance_checkpoint"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    chat_id: Mapped[int] = mapped_column(ForeignKey("chats.id", ondelete="CASCADE"))
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
+    ledger_id: Mapped[int] = mapped_column(Integer)
+
+    balance: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    as_of: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    opening: Mapped[bool] = mapped_column(Boolean, default=False)
+
+class RecurringExpense(Base):
+    """
+    An expense added automatically every `every` `unit`s (d/w/m) from `starts_at`
+    next_run_at is occurrence number `runs`; the scheduler polls it through its index
+    """
+    __tablename__ = "recurring_expenses"
+    __table_args__ = (
+        CheckConstraint("amount > 0", name="ck_recurring_amount_positive"),
+        CheckConstraint("every > 0", name="ck_recurring_every_positive"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    chat_id: Mapped[int] = mapped_column(ForeignKey("chats.id", ondelete="CASCADE"), index=True)
+    payer_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+
+    amount: Mapped[int] = mapped_column(BigInteger)
+    currency: Mapped[str] = mapped_column(String(3), default=DEFAULT_CURRENCY)
+    description: Mapped[str] = mapped_column(String(255))
+
+    every: Mapped[int] = mapped_column(Integer)
+    unit: Mapped[str] = mapped_column(String(1))
+    starts_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    runs: Mapped[int] = mapped_column(Integer, default=0)
+    next_run_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), index=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow)
+
+    payer: Mapped["User"] = relationship(lazy="raise")
+
+class DigestRun(Base):
+    """
+    Progress of one day's digest fan-out
+    Chats are visited in id order; a restarted run resumes after last_chat_id.
+    lease_until keeps a second process from running the same day concurrently
+    """
+    __tablename__ = "digest_runs"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    run_date: Mapped[date] = mapped_column(Date, unique=True)
+
+    last_chat_id: Mapped[int] = mapped_column(Integer, default=0)
+    sent: Mapped[int] = mapped_column(Integer, default=0)
+    lease_until: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+class FxRate(Base):
+    """
+    Value of 1 unit of `currency` in the pivot currency (settings.FX_PIVOT_CURRENCY)
+    The rate for a given day is the latest one on or before that day
+    """
+    __tablename__ = "fx_rates"
+    __table_args__ = (
+        UniqueConstraint("currency", "rate_date", name="uq_fx_rate_currency_date"),
+        CheckConstraint("rate > 0", name="ck_fx_rate_positive"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    currency: Mapped[str] = mapped_column(String(3))
+    rate_date: Mapped[date] = mapped_column(Date)
+
+    rate: Mapped[Decimal] = mapped_column(Numeric(18, 8), nullable=False)
+
+
+class ChatFxRate(Base):
+    """
+    A chat's own rate from /rate: 1 unit of `currency` is worth `rate` of `base`, the
+    chat's base currency when it was set. Used by that chat before the global
+    FxRate series; the rate for a given day is the latest one on or before that day.
+    """
+    __tablename__ = "chat_fx_rates"
+    __table_args__ = (
+        UniqueConstraint("chat_id", "base", "currency", "rate_date", name="uq_chat_fx_rate"),
+        CheckConstraint("rate > 0", name="ck_chat_fx_rate_positive"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    chat_id: Mapped[int] = mapped_column(ForeignKey("chats.id", ondelete="CASCADE"))
+    base: Mapped[str] = mapped_column(String(3))
+    currency: Mapped[str] = mapped_column(String(3))
+    rate_date: Mapped[date] = mapped_column(Date)
+
+    rate: Mapped[Decimal] = mapped_column(Numeric(18, 8), nullable=False)
@@ -0,0 +1,42 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+# Money is stored and computed as integer minor units (cents, yen, fils...).
+# Decimal only appears at the edges: parsing user input, FX rates and rendering.
+
+# ISO 4217 currencies whose minor unit isn't 1/100
+_EXPONENTS = {
+    "BIF": 0, "CLP": 0, "DJF": 0, "GNF": 0, "ISK": 0, "JPY": 0, "KMF": 0, "KRW": 0, "PYG": 0,
+    "RWF": 0, "UGX": 0, "UYI": 0, "VND": 0, "VUV": 0, "XAF": 0, "XOF": 0, "XPF": 0,
+    "BHD": 3, "IQD": 3, "JOD": 3, "KWD": 3, "LYD": 3, "OMR": 3, "TND": 3,
+}
+
+
+# Largest amount accepted from users, well inside BIGINT even after conversion
+MAX_MINOR = 10**15
+
+
+def exponent(currency: str) -> int:
+    return _EXPONENTS.get(currency, 2)
+
+
+def exponents() -> dict[str, int]:
+    """The currencies whose exponent isn't the default 2, by code."""
+    return dict(_EXPONENTS)
+
+
+def to_minor(amount: Decimal, currency: str) -> int:
+    """Decimal amount -> minor units of `currency`, rounded half up."""
+    return int(amount.scaleb(exponent(currency)).to_integral_value(ROUND_HALF_UP))
+
+
+def from_minor(minor: int, currency: str) -> Decimal:
+    """Minor units -> Decimal with the currency's number of places, for display."""
+    return Decimal(minor).scaleb(-exponent(currency))
+
+
+def convert_minor(minor: int, rate: Decimal, currency: str, to: str) -> int:
+    """Minor units of `currency` -> minor units of `to`, where 1 `currency` is worth `rate` `to`."""
+    if currency == to and rate == 1:
+        return minor
+    scaled = (minor * rate).scaleb(exponent(to) - exponent(currency))
+    return int(scaled.to_integral_value(ROUND_HALF_UP))
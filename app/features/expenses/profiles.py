@@ -0,0 +1,148 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Callable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.features.expenses.repo import ExpensesRepository, Profile
+
+logger = logging.getLogger(__name__)
+
+
+class ProfileWriteBehind:
+    """
+    Keeps users' username / first / last name, group titles and the bot serving
+    each chat fresh without a write per message.
+
+    observe() compares the profile on each incoming update against a fingerprint
+    of the last one seen for that user; only new or changed profiles are buffered.
+    observe_chat() does the same for a group's title, observe_bot() for the hosted
+    bot a chat talks to. A background task writes the buffers every `interval`
+    seconds as bulk UPDATEs that skip rows already up to date, so a user or chat
+    seen for the first time in this process costs nothing in the database unless
+    it changed.
+    """
+    def __init__(self, max_users: int = 100_000, max_chats: int = 100_000):
+        self.max_users = max_users
+        self.max_chats = max_chats
+        self._fingerprints: OrderedDict[int, int] = OrderedDict()
+        self._dirty: dict[int, Profile] = {}
+        self._flushing: dict[int, Profile] = {}
+        self._titles: OrderedDict[int, str] = OrderedDict()
+        self._dirty_titles: dict[int, str] = {}
+        self._bots: OrderedDict[int, str] = OrderedDict()
+        self._dirty_bots: dict[int, str] = {}
+        self._task: asyncio.Task | None = None
+
+    def observe(self, tg_user_id: int, username: str | None, first_name: str | None, last_name: str | None) -> bool:
+        """Buffer the profile if it differs from the last one seen; returns whether it did."""
+        fingerprint = hash((username, first_name, last_name))
+        if self._fingerprints.get(tg_user_id) == fingerprint:
+            self._fingerprints.move_to_end(tg_user_id)
+            return False
+
+        self._fingerprints[tg_user_id] = fingerprint
+        self._fingerprints.move_to_end(tg_user_id)
+        if len(self._fingerprints) > self.max_users:
+            self._fingerprints.popitem(last=False)
+        self._dirty[tg_user_id] = (tg_user_id, username, first_name, last_name)
+        return True
+
+    def observe_chat(self, tg_chat_id: int, title: str) -> bool:
+        """Buffer a group's title if it differs from the last one seen; returns whether it did."""
+        if self._titles.get(tg_chat_id) == title:
+            self._titles.move_to_end(tg_chat_id)
+            return False
+
+        self._titles[tg_chat_id] = title
+        self._titles.move_to_end(tg_chat_id)
+        if len(self._titles) > self.max_chats:
+            self._titles.popitem(last=False)
+        self._dirty_titles[tg_chat_id] = title
+        return True
+
+    def observe_bot(self, tg_chat_id: int, bot: str) -> bool:
+        """Buffer the bot serving a chat if it differs from the last one seen; returns whether it did."""
+        if self._bots.get(tg_chat_id) == bot:
+            self._bots.move_to_end(tg_chat_id)
+            return False
+
+        self._bots[tg_chat_id] = bot
+        self._bots.move_to_end(tg_chat_id)
+        if len(self._bots) > self.max_chats:
+            self._bots.popitem(last=False)
+        self._dirty_bots[tg_chat_id] = bot
+        return True
+
+    @property
+    def pending(self) -> int:
+        return len(self._dirty) + len(self._dirty_titles) + len(self._dirty_bots)
+
+    def username(self, tg_user_id: int, stored: str | None) -> str | None:
+        """The user's username, preferring one not written to the database yet over `stored`."""
+        profile = self._dirty.get(tg_user_id) or self._flushing.get(tg_user_id)
+        return profile[1] if profile else stored
+
+    def title(self, tg_chat_id: int, stored: str | None) -> str | None:
+        """The group's title as last seen on an update, else `stored`."""
+        return self._titles.get(tg_chat_id, stored)
+
+    def renamed(self) -> dict[str, int]:
+        """Lowercased username -> Telegram user id, for usernames not written yet."""
+        return {
+            u.lower(): tg_user_id
+            for tg_user_id, u, _, _ in (self._flushing | self._dirty).values() if u
+        }
+
+    def start(self, session_factory: Callable[[], AsyncSession], interval: float) -> None:
+        self._task = asyncio.create_task(self._run(session_factory, interval))
+
+    async def aclose(self, session_factory: Callable[[], AsyncSession]) -> None:
+        """Stop the flush loop and write whatever is still buffered."""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush(session_factory)
+
+    async def _run(self, session_factory: Callable[[], AsyncSession], interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.flush(session_factory)
+            except Exception:
+                logger.exception("Profile flush failed")
+
+    async def flush(self, session_factory: Callable[[], AsyncSession]) -> int:
+        """Write buffered profiles, titles and chat bots; returns how many rows actually changed."""
+        if not self._dirty and not self._dirty_titles and not self._dirty_bots:
+            return 0
+        batch, self._dirty = self._dirty, {}
+        titles, self._dirty_titles = self._dirty_titles, {}
+        bots, self._dirty_bots = self._dirty_bots, {}
+        self._flushing = batch
+        try:
+            async with session_factory() as session:
+                repo = ExpensesRepository(session)
+                changed = await repo.update_profiles(list(batch.values())) if batch else 0
+                if titles:
+                    changed += await repo.update_chat_titles(list(titles.items()))
+                if bots:
+                    changed += await repo.update_chat_bots(list(bots.items()))
+                await session.commit()
+        except Exception:
+            # Put them back unless a newer one was buffered meanwhile
+            self._dirty = batch | self._dirty
+            self._dirty_titles = titles | self._dirty_titles
+            self._dirty_bots = bots | self._dirty_bots
+            raise
+        finally:
+            self._flushing = {}
+        logger.debug(
+            "Flushed %d profiles, %d titles and %d chat bots, %d changed", len(batch), len(titles), len(bots), changed
+        )
+        return changed
+
+
+profile_writes = ProfileWriteBehind()
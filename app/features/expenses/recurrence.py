@@ -0,0 +1,39 @@
+import calendar
+import re
+from datetime import datetime, timedelta
+
+UNITS = {"d": "day", "w": "week", "m": "month"}
+_ALIASES = {"daily": (1, "d"), "weekly": (1, "w"), "monthly": (1, "m"), "yearly": (12, "m")}
+_EVERY_RE = re.compile(r"^([0-9]+)([dwm])$")
+
+
+def parse_every(token: str) -> tuple[int, str]:
+    """Parse `daily`/`weekly`/`monthly`/`yearly` or `<n>d`/`<n>w`/`<n>m` into (every, unit)."""
+    token = token.lower()
+    if token in _ALIASES:
+        return _ALIASES[token]
+    m = _EVERY_RE.match(token)
+    if not m or int(m.group(1)) <= 0:
+        raise ValueError("Invalid interval")
+    return int(m.group(1)), m.group(2)
+
+
+def describe_every(every: int, unit: str) -> str:
+    name = UNITS[unit]
+    return f"every {name}" if every == 1 else f"every {every} {name}s"
+
+
+def nth_run(starts_at: datetime, every: int, unit: str, n: int) -> datetime:
+    """
+    Occurrence `n` (0-based) of a schedule. Computed from the start rather than the
+    previous run, so month-end dates don't drift (Jan 31 -> Feb 28 -> Mar 31).
+    """
+    if unit == "d":
+        return starts_at + timedelta(days=every * n)
+    if unit == "w":
+        return starts_at + timedelta(weeks=every * n)
+
+    month_index = starts_at.month - 1 + every * n
+    year, month = starts_at.year + month_index // 12, month_index % 12 + 1
+    day = min(starts_at.day, calendar.monthrange(year, month)[1])
+    return starts_at.replace(year=year, month=month, day=day)
@@ -1,13 +1,32 @@
+from datetime import date, datetime
 from decimal import Decimal
-from typing import Iterable
-from sqlalchemy import select
+from typing import Callable, Iterable
+from sqlalchemy import Exists, Select, bindparam, case, delete, exists, func, insert, or_, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
 from sqlalchemy.exc import IntegrityError
 from fastapi import Depends
 
 from app.db.database import get_session
-from app.features.expenses.models import Balance, Chat, ChatMember, Expense, ExpenseSplit, Payment, User
+from app.features.expenses.balances import CurrencyDayTotal
+from app.features.expenses.loaders import loader_profile
+from app.features.expenses.models import (
+    ArchivedExpense, ArchivedExpenseSplit, Balance, BalanceCheckpoint, Chat, ChatMember, DigestRun, Expense,
+    ChatFxRate, ExpenseSplit, FxRate, LedgerEntry, Payment, RecurringExpense, User, utcnow,
+)
+
+
+# (telegram_user_id, username, first_name, last_name) as seen on an incoming update
+Profile = tuple[int, str | None, str | None, str | None]
+
+# (ledger_id, balance per user) of a BalanceCheckpoint
+Checkpoint = tuple[int, dict[int, int]]
+
+# (shard, number of shards) of a dispatch worker; see telegram/shards.py
+Shard = tuple[int, int]
+
+AnyExpense = Expense | ArchivedExpense
+# Hot and cold tables; reads that cover a chat's whole history run against both
+_EXPENSE_TABLES = ((Expense, ExpenseSplit), (ArchivedExpense, ArchivedExpenseSplit))
 
 
 def get_repo(session: AsyncSession = Depends(get_session)) -> "ExpensesRepository":
@@ -17,6 +36,10 @@ def get_repo(session: AsyncSession = Depends(get_session)) -> "ExpensesRepositor
 class ExpensesRepository:
     def __init__(self, db: AsyncSession):
         self.db = db
+
+    @property
+    def dialect(self) -> str:
+        return self.db.get_bind().dialect.name
     
     # ------------------------------------------------------------------
     # CHATS
@@ -43,6 +66,55 @@ class ExpensesRepository:
             if not chat:
                 raise
             return chat
+
+    async def update_chat_titles(self, titles: list[tuple[int, str]]) -> int:
+        """Bulk-refresh (telegram_chat_id, title) pairs like update_profiles; returns rows changed."""
+        chats = Chat.__table__
+        title = bindparam("title")
+        stmt = (
+            update(chats)
+            .where(chats.c.telegram_chat_id == bindparam("tg"), chats.c.title.is_distinct_from(title))
+            .values(title=title)
+        )
+        result = await self.db.execute(stmt, [{"tg": tg, "title": t} for tg, t in titles])
+        return max(result.rowcount, 0)  # type: ignore[attr-defined]
+
+    async def update_chat_bots(self, bots: list[tuple[int, str]]) -> int:
+        """Bulk-set (telegram_chat_id, bot) pairs, skipping rows already up to date; returns rows changed."""
+        chats = Chat.__table__
+        bot = bindparam("bot")
+        stmt = (
+            update(chats)
+            .where(chats.c.telegram_chat_id == bindparam("tg"), chats.c.bot.is_distinct_from(bot))
+            .values(bot=bot)
+        )
+        result = await self.db.execute(stmt, [{"tg": tg, "bot": b} for tg, b in bots])
+        return max(result.rowcount, 0)  # type: ignore[attr-defined]
+
+    async def list_chat_bots(self, exclude: str) -> list[tuple[int, str]]:
+        """(telegram_chat_id, bot) of chats served by a bot other than `exclude`."""
+        stmt = select(Chat.telegram_chat_id, Chat.bot).where(Chat.bot.is_not(None), Chat.bot != exclude)
+        return [(tg_chat_id, bot) for tg_chat_id, bot in await self.db.execute(stmt)]
+
+    async def set_dashboard_message(self, chat_id: int, message_id: int | None) -> None:
+        stmt = update(Chat).where(Chat.id == chat_id).values(dashboard_message_id=message_id)
+        await self.db.execute(stmt)
+
+    async def list_dashboards(self, shard: Shard | None = None) -> list[tuple[int, int]]:
+        """(telegram_chat_id, dashboard_message_id) of chats with a live dashboard, of `shard` if given."""
+        stmt = (
+            select(Chat.telegram_chat_id, Chat.dashboard_message_id)
+            .where(Chat.dashboard_message_id.is_not(None), *_in_shard(Chat.telegram_chat_id, shard))
+        )
+        return [(tg_chat_id, message_id) for tg_chat_id, message_id in await self.db.execute(stmt)]
+
+    async def set_base_currency(self, chat_id: int, currency: str) -> None:
+        stmt = update(Chat).where(Chat.id == chat_id).values(base_currency=currency)
+        await self.db.execute(stmt)
+
+    async def list_tg_chat_ids(self) -> list[int]:
+        stmt = select(Chat.telegram_chat_id).order_by(Chat.id)
+        return list((await self.db.scalars(stmt)).all())
         
     # ------------------------------------------------------------------
     # USERS
@@ -52,6 +124,31 @@ class ExpensesRepository:
         stmt = select(User).where(User.telegram_user_id == tg_user_id)
         return await self.db.scalar(stmt)
 
+    async def get_users_by_tg_ids(self, tg_user_ids: Iterable[int]) -> dict[int, User]:
+        stmt = select(User).where(User.telegram_user_id.in_(set(tg_user_ids)))
+        return {user.telegram_user_id: user for user in await self.db.scalars(stmt)}
+
+    async def update_profiles(self, profiles: list[Profile]) -> int:
+        """
+        Bulk-refresh names by Telegram user id in one executemany UPDATE. Rows already
+        matching are filtered out, so unchanged users aren't rewritten; returns rows changed.
+        """
+        users = User.__table__
+        username, first_name, last_name = bindparam("u"), bindparam("f"), bindparam("l")
+        stmt = (
+            update(users)
+            .where(users.c.telegram_user_id == bindparam("tg"))
+            .where(or_(
+                users.c.username.is_distinct_from(username),
+                users.c.first_name.is_distinct_from(first_name),
+                users.c.last_name.is_distinct_from(last_name),
+            ))
+            .values(username=username, first_name=first_name, last_name=last_name)
+        )
+        params = [{"tg": tg, "u": u, "f": f, "l": l} for tg, u, f, l in profiles]
+        result = await self.db.execute(stmt, params)
+        return max(result.rowcount, 0)  # type: ignore[attr-defined]
+
     async def get_or_create_user(
         self,
         tg_user_id: int,
@@ -119,16 +216,46 @@ class ExpensesRepository:
 
         return True
 
+    async def list_member_ids(self, chat_id: int) -> list[int]:
+        stmt = (
+            select(ChatMember.user_id)
+            .where(ChatMember.chat_id == chat_id)
+            .order_by(ChatMember.id.asc())
+        )
+        return list((await self.db.scalars(stmt)).all())
+
     async def list_members(self, chat_id: int) -> list[ChatMember]:
         stmt = (
             select(ChatMember)
             .where(ChatMember.chat_id == chat_id)
-            .options(selectinload(ChatMember.user))
+            .options(*loader_profile("member_list"))
             .order_by(ChatMember.id.asc())
         )
         members = (await self.db.scalars(stmt)).all()
         return list(members)
 
+    async def find_members_by_mention(
+        self,
+        tg_chat_id: int,
+        usernames: Iterable[str],
+        tg_user_ids: Iterable[int],
+    ) -> list[tuple[int, int, str | None]]:
+        """
+        (user_id, telegram_user_id, username) of the chat's members matching any of the
+        lowercased `usernames` or `tg_user_ids`, in one query.
+        """
+        usernames, tg_user_ids = set(usernames), set(tg_user_ids)
+        stmt = (
+            select(User.id, User.telegram_user_id, User.username)
+            .join(ChatMember, ChatMember.user_id == User.id)
+            .join(Chat, Chat.id == ChatMember.chat_id)
+            .where(
+                Chat.telegram_chat_id == tg_chat_id,
+                func.lower(User.username).in_(usernames) | User.telegram_user_id.in_(tg_user_ids),
+            )
+        )
+        return [(user_id, tg_user_id, username) for user_id, tg_user_id, username in await self.db.execute(stmt)]
+
     async def is_member(self, chat_id: int, user_id: int) -> bool:
         stmt = (
             select(ChatMember.id)
@@ -141,39 +268,254 @@ class ExpensesRepository:
     # EXPENSES
     # ------------------------------------------------------------------
 
-    async def create_expense(
-        self, 
-        chat_id: int, 
-        user_id: int, 
-        amount: Decimal, 
-        description: str
-    ) -> None:
-        self.db.add(Expense(
-            chat_id=chat_id,
-            payer_id=user_id,
-            amount=amount,
-            description=description
-        ))
-        await self.db.flush()  # assigns expense.id
+    async def add_expenses(self, expenses: Iterable[Expense]) -> None:
+        self.db.add_all(expenses)
+        await self.db.flush()  # assigns expense.id, batched into one INSERT where supported
 
     async def add_splits(self, splits: Iterable[ExpenseSplit]) -> None:
         self.db.add_all(splits)
         await self.db.flush()
 
-    async def list_expenses(self, chat_id: int, limit: int = 50) -> list[Expense]:
+    async def list_expenses(
+        self,
+        chat_id: int,
+        limit: int = 50,
+        profile: str = "expense_list",
+    ) -> list[AnyExpense]:
+        """A chat's live expenses newest first, continuing into the archive past the hot ones."""
+        def build(model: type[AnyExpense]) -> Select:
+            return (
+                select(model)
+                .where(model.chat_id == chat_id, model.deleted_at.is_(None))
+                .order_by(model.created_at.desc())
+            )
+        return await self._hot_then_archived(build, profile, limit)
+
+    async def search_expenses(
+        self,
+        chat_id: int,
+        terms: list[str],
+        limit: int,
+        offset: int = 0,
+    ) -> list[AnyExpense]:
+        """
+        Expenses whose description contains every term, newest first (trigram-indexed on
+        Postgres), continuing into the archive past the hot ones.
+        """
+        def build(model: type[AnyExpense]) -> Select:
+            return (
+                select(model)
+                .where(
+                    model.chat_id == chat_id,
+                    model.deleted_at.is_(None),
+                    *(model.description.ilike(f"%{_escape_like(t)}%", escape="\\") for t in terms),
+                )
+                .order_by(model.created_at.desc(), model.id.desc())
+            )
+        return await self._hot_then_archived(build, "expense_list", limit, offset)
+
+    async def _hot_then_archived(
+        self,
+        build: Callable[[type[AnyExpense]], Select],
+        profile: str,
+        limit: int,
+        offset: int = 0,
+    ) -> list[AnyExpense]:
+        """
+        One page of build(Expense) followed by build(ArchivedExpense). Archived expenses
+        are older than the hot ones, so the archive is only queried for a page that
+        runs past the end of the hot rows.
+        """
+        stmt = build(Expense).options(*loader_profile(profile)).limit(limit).offset(offset)
+        rows: list[AnyExpense] = list(await self.db.scalars(stmt))
+        if len(rows) == limit:
+            return rows
+
+        if rows or not offset:
+            hot = offset + len(rows)
+        else:
+            hot = await self.db.scalar(select(func.count()).select_from(build(Expense).subquery()))
+        stmt = (
+            build(ArchivedExpense)
+            .options(*loader_profile(f"archived_{profile}"))
+            .limit(limit - len(rows))
+            .offset(max(offset - hot, 0))
+        )
+        rows.extend(await self.db.scalars(stmt))
+        return rows
+
+    async def list_expense_texts(self, chat_id: int) -> list[tuple[int, str, datetime]]:
+        """(id, description, created_at) of a chat's expenses, archived ones included, for the in-memory search index."""
+        texts = []
+        for model, _ in _EXPENSE_TABLES:
+            stmt = (
+                select(model.id, model.description, model.created_at)
+                .where(model.chat_id == chat_id, model.deleted_at.is_(None))
+            )
+            texts.extend((id_, desc, created_at) for id_, desc, created_at in await self.db.execute(stmt))
+        return texts
+
+    async def get_expenses_by_ids(self, ids: list[int]) -> list[AnyExpense]:
+        """Expenses in the order of `ids`, from the archive for those no longer hot."""
+        by_id: dict[int, AnyExpense] = {}
+        for (model, _), profile in zip(_EXPENSE_TABLES, ("expense_list", "archived_expense_list")):
+            missing = [i for i in ids if i not in by_id]
+            if not missing:
+                break
+            stmt = (
+                select(model)
+                .where(model.id.in_(missing), model.deleted_at.is_(None))
+                .options(*loader_profile(profile))
+            )
+            by_id.update((e.id, e) for e in await self.db.scalars(stmt))
+        return [by_id[i] for i in ids if i in by_id]
+
+    async def has_expenses(self, chat_id: int) -> bool:
+        for model, _ in _EXPENSE_TABLES:
+            stmt = select(model.id).where(model.chat_id == chat_id, model.deleted_at.is_(None)).limit(1)
+            if (await self.db.scalar(stmt)) is not None:
+                return True
+        return False
+
+    async def get_live_expense_for_update(self, chat_id: int, expense_id: int) -> Expense | None:
+        """A chat's not-yet-deleted expense with its splits, row-locked against concurrent edits."""
         stmt = (
             select(Expense)
-            .where(Expense.chat_id == chat_id)
-            .options(
-                selectinload(Expense.splits),      # loads splits for balance calc
-                selectinload(Expense.payer),       # optional: payer details
+            .where(
+                Expense.id == expense_id,
+                Expense.chat_id == chat_id,
+                Expense.deleted_at.is_(None),
             )
-            .order_by(Expense.created_at.desc())
+            .options(*loader_profile("expense_detail"))
+            .with_for_update(of=Expense)
+        )
+        return await self.db.scalar(stmt)
+
+    async def soft_delete_expense(self, expense_id: int) -> None:
+        stmt = (
+            update(Expense)
+            .where(Expense.id == expense_id)
+            .values(deleted_at=utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        await self.db.execute(stmt)
+
+    async def sum_spent(self, chat_id: int) -> int:
+        """
+        Base-currency total of a chat's live expenses, archived ones included, at the
+        rates they were recorded with (ExpenseSplit.base_amount). One statement.
+        """
+        totals = [
+            select(func.coalesce(func.sum(split.base_amount), 0))
+            .join(model, model.id == split.expense_id)
+            .where(model.chat_id == chat_id, model.deleted_at.is_(None))
+            .scalar_subquery()
+            for model, split in _EXPENSE_TABLES
+        ]
+        # SUM(bigint) is numeric on Postgres
+        return int(await self.db.scalar(select(totals[0] + totals[1])) or 0)
+
+    async def sum_split_deltas(self, chat_id: int) -> dict[int, int]:
+        """Net base-currency balance per user implied by the live expense splits, archived ones included."""
+        net: dict[int, int] = {}
+        for model, split in _EXPENSE_TABLES:
+            for user_col, sign in ((model.payer_id, 1), (split.user_id, -1)):
+                stmt = (
+                    select(user_col, func.sum(split.base_amount))
+                    .join(model, model.id == split.expense_id)
+                    .where(model.chat_id == chat_id, model.deleted_at.is_(None))
+                    .group_by(user_col)
+                )
+                for user_id, total in await self.db.execute(stmt):
+                    # SUM(bigint) is numeric on Postgres
+                    net[user_id] = net.get(user_id, 0) + sign * int(total)
+        return net
+
+    # ------------------------------------------------------------------
+    # ARCHIVE
+    # ------------------------------------------------------------------
+
+    async def archive_expenses(self, before: datetime, limit: int) -> int:
+        """
+        Move up to `limit` expenses created before `before`, with their splits, to the
+        archive tables; returns how many moved. Rows keep their ids and columns, and
+        balances are left alone: they already account for every archived split.
+        """
+        # Ids roughly follow created_at, so the oldest rows sit at the start of the
+        # primary key; expenses locked by an edit in progress are left for next time
+        stmt = (
+            select(Expense.id)
+            .where(Expense.created_at < before)
+            .order_by(Expense.id)
             .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        ids = list(await self.db.scalars(stmt))
+        if not ids:
+            return 0
+
+        # Copy the expenses before their splits (FK), then delete in the reverse order
+        copies = ((Expense, ArchivedExpense, "id"), (ExpenseSplit, ArchivedExpenseSplit, "expense_id"))
+        for hot, cold, key in copies:
+            columns = [c.name for c in cold.__table__.columns]
+            source = hot.__table__
+            await self.db.execute(
+                insert(cold.__table__).from_select(
+                    columns, select(*(source.c[name] for name in columns)).where(source.c[key].in_(ids))
+                )
+            )
+        for hot, _, key in reversed(copies):
+            await self.db.execute(
+                delete(hot).where(getattr(hot, key).in_(ids)).execution_options(synchronize_session=False)
+            )
+        return len(ids)
+
+    # ------------------------------------------------------------------
+    # RECURRING EXPENSES
+    # ------------------------------------------------------------------
+
+    async def add_recurring(self, recurring: RecurringExpense) -> None:
+        self.db.add(recurring)
+        await self.db.flush()
+
+    async def list_recurring(self, chat_id: int) -> list[RecurringExpense]:
+        stmt = (
+            select(RecurringExpense)
+            .where(RecurringExpense.chat_id == chat_id)
+            .options(*loader_profile("recurring_list"))
+            .order_by(RecurringExpense.next_run_at.asc())
         )
         res = (await self.db.scalars(stmt)).all()
         return list(res)
 
+    async def delete_recurring(self, chat_id: int, recurring_id: int) -> bool:
+        stmt = delete(RecurringExpense).where(
+            RecurringExpense.id == recurring_id,
+            RecurringExpense.chat_id == chat_id,
+        )
+        res = await self.db.execute(stmt)
+        return res.rowcount > 0
+
+    async def claim_due_recurring(
+        self, now: datetime, limit: int, shard: Shard | None = None
+    ) -> list[tuple[RecurringExpense, int, int, str | None]]:
+        """
+        Lock up to `limit` due definitions with (telegram_chat_id, payer telegram_user_id,
+        chat bot), only those of `shard`'s chats if given. Uses the next_run_at index;
+        rows locked by another worker are skipped, not waited on.
+        """
+        stmt = (
+            select(RecurringExpense, Chat.telegram_chat_id, User.telegram_user_id, Chat.bot)
+            .join(Chat, Chat.id == RecurringExpense.chat_id)
+            .join(User, User.id == RecurringExpense.payer_id)
+            .where(RecurringExpense.next_run_at <= now)
+            .where(*_in_shard(Chat.telegram_chat_id, shard))
+            .order_by(RecurringExpense.next_run_at.asc())
+            .limit(limit)
+            .with_for_update(of=RecurringExpense, skip_locked=True)
+        )
+        return [tuple(row) for row in await self.db.execute(stmt)]
+
     # ------------------------------------------------------------------
     # PAYMENTS
     # ------------------------------------------------------------------
@@ -187,16 +529,28 @@ class ExpensesRepository:
         stmt = (
             select(Payment)
             .where(Payment.chat_id == chat_id)
-            .options(
-                selectinload(Payment.from_user),
-                selectinload(Payment.to_user),
-            )
+            .options(*loader_profile("payment_list"))
             .order_by(Payment.created_at.desc())
             .limit(limit)
         )
         res = (await self.db.scalars(stmt)).all()
         return list(res)
 
+    async def sum_payments_by_currency_day(
+        self, chat_id: int
+    ) -> tuple[list[CurrencyDayTotal], list[CurrencyDayTotal]]:
+        """Return (sent, received) totals."""
+        day = func.date(Payment.created_at)
+        totals = []
+        for user_col in (Payment.from_user_id, Payment.to_user_id):
+            stmt = (
+                select(user_col, Payment.currency, day, func.sum(Payment.amount))
+                .where(Payment.chat_id == chat_id)
+                .group_by(user_col, Payment.currency, day)
+            )
+            totals.append(_currency_day_rows(await self.db.execute(stmt)))
+        return totals[0], totals[1]
+
     # ------------------------------------------------------------------
     # BALANCES
     # ------------------------------------------------------------------
@@ -210,22 +564,320 @@ class ExpensesRepository:
         if bal:
             return
         
-        bal = Balance(chat_id=chat_id, user_id=user_id, balance=Decimal("0.00"))
+        bal = Balance(chat_id=chat_id, user_id=user_id, balance=0)
         self.db.add(bal)
         await self.db.flush()
 
         return
 
+    async def apply_balance_deltas(self, chat_id: int, deltas: dict[int, int]) -> None:
+        """Add per-user deltas to a chat's balances in a single UPDATE, and append them to the ledger."""
+        deltas = {user_id: d for user_id, d in deltas.items() if d}
+        if not deltas:
+            return
+
+        now = utcnow()
+        stmt = (
+            update(Balance)
+            .where(Balance.chat_id == chat_id, Balance.user_id.in_(deltas))
+            .values(
+                balance=Balance.balance + case(deltas, value=Balance.user_id, else_=0),
+                updated_at=now,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await self.db.execute(stmt)
+        # After the UPDATE: its row locks keep the verifier from reading the ledger mid-write
+        await self.db.execute(
+            insert(LedgerEntry),
+            [{"chat_id": chat_id, "user_id": u, "delta": d, "created_at": now} for u, d in deltas.items()],
+        )
+
     async def list_balances(self, chat_id: int) -> list[Balance]:
         stmt = (
             select(Balance)
             .where(Balance.chat_id == chat_id)
-            .options(
-                selectinload(Balance.chat),
-                selectinload(Balance.user),
-            )
+            .options(*loader_profile("balance_summary"))
             .order_by(Balance.updated_at.desc())
         )
         res = (await self.db.scalars(stmt)).all()
         return list(res)
-    
\ No newline at end of file
+
+    async def get_balances(self, chat_id: int, lock: bool = False) -> dict[int, int]:
+        """A chat's stored balances; `lock` holds off balance writes until the transaction ends."""
+        stmt = select(Balance.user_id, Balance.balance).where(Balance.chat_id == chat_id)
+        if lock:
+            stmt = stmt.with_for_update(read=True)
+        return {user_id: balance for user_id, balance in await self.db.execute(stmt)}
+
+    async def list_balances_for_chats(
+        self, chat_ids: list[int]
+    ) -> list[tuple[int, int, int, str | None, str]]:
+        """Non-zero (chat_id, user_id, balance, username, first_name) rows for many chats in one query."""
+        stmt = (
+            select(Balance.chat_id, Balance.user_id, Balance.balance, User.username, User.first_name)
+            .join(User, User.id == Balance.user_id)
+            .where(Balance.chat_id.in_(chat_ids), Balance.balance != 0)
+            .order_by(Balance.chat_id, Balance.balance.desc())
+        )
+        return [tuple(row) for row in await self.db.execute(stmt)]
+
+    async def list_user_balances(self, tg_user_id: int) -> list[tuple[int, int, str | None, str, int]]:
+        """
+        Non-zero (user_id, telegram_chat_id, title, base_currency, balance) rows of one user
+        across all their chats, in one query through the users and balances user indexes.
+        """
+        stmt = (
+            select(Balance.user_id, Chat.telegram_chat_id, Chat.title, Chat.base_currency, Balance.balance)
+            .join(User, User.id == Balance.user_id)
+            .join(Chat, Chat.id == Balance.chat_id)
+            .where(User.telegram_user_id == tg_user_id, Balance.balance != 0)
+            .order_by(Balance.balance.desc())
+        )
+        return [tuple(row) for row in await self.db.execute(stmt)]
+
+    # ------------------------------------------------------------------
+    # LEDGER
+    # ------------------------------------------------------------------
+
+    async def list_chat_ids(self, after_id: int, limit: int) -> list[int]:
+        stmt = select(Chat.id).where(Chat.id > after_id).order_by(Chat.id).limit(limit)
+        return list(await self.db.scalars(stmt))
+
+    async def get_checkpoint(self, chat_id: int, at: datetime | None = None) -> Checkpoint | None:
+        """The chat's latest checkpoint, or the latest one as of `at`."""
+        stmt = (
+            select(BalanceCheckpoint.ledger_id)
+            .where(BalanceCheckpoint.chat_id == chat_id)
+            .order_by(BalanceCheckpoint.ledger_id.desc())
+            .limit(1)
+        )
+        if at is not None:
+            stmt = stmt.where(BalanceCheckpoint.as_of <= at)
+        ledger_id = await self.db.scalar(stmt)
+        if ledger_id is None:
+            return None
+
+        stmt = (
+            select(BalanceCheckpoint.user_id, BalanceCheckpoint.balance)
+            .where(BalanceCheckpoint.chat_id == chat_id, BalanceCheckpoint.ledger_id == ledger_id)
+        )
+        return ledger_id, {user_id: balance for user_id, balance in await self.db.execute(stmt)}
+
+    async def get_opening_time(self, chat_id: int) -> datetime | None:
+        """When the chat's opening checkpoint was taken, if it has one."""
+        stmt = (
+            select(BalanceCheckpoint.as_of)
+            .where(BalanceCheckpoint.chat_id == chat_id, BalanceCheckpoint.opening.is_(True))
+            .limit(1)
+        )
+        return await self.db.scalar(stmt)
+
+    async def get_ledger_start(self, chat_id: int) -> datetime | None:
+        """When the chat's first ledger entry was written, if it has any."""
+        stmt = select(func.min(LedgerEntry.created_at)).where(LedgerEntry.chat_id == chat_id)
+        return await self.db.scalar(stmt)
+
+    async def has_history_before(self, chat_id: int, at: datetime | None) -> bool:
+        """
+        Whether the chat has expenses (deleted and archived ones included) or payments
+        from before `at`; any at all when `at` is None. One statement.
+        """
+        def older(model) -> Exists:
+            cond = model.chat_id == chat_id
+            if at is not None:
+                cond = cond & (model.created_at < at)
+            return exists().where(cond)
+        models = [model for model, _ in _EXPENSE_TABLES] + [Payment]
+        return bool(await self.db.scalar(select(or_(*(older(model) for model in models)))))
+
+    async def sum_ledger(
+        self, chat_id: int, after_id: int, until: datetime | None = None
+    ) -> tuple[dict[int, int], int, int, datetime | None]:
+        """
+        Per-user sums of the chat's entries after `after_id` (up to `until`), with how
+        many entries that was and the id and time of the last one.
+        """
+        stmt = (
+            select(
+                LedgerEntry.user_id,
+                func.sum(LedgerEntry.delta),
+                func.count(),
+                func.max(LedgerEntry.id),
+                func.max(LedgerEntry.created_at),
+            )
+            .where(LedgerEntry.chat_id == chat_id, LedgerEntry.id > after_id)
+            .group_by(LedgerEntry.user_id)
+        )
+        if until is not None:
+            stmt = stmt.where(LedgerEntry.created_at <= until)
+
+        sums: dict[int, int] = {}
+        count, last_id, last_at = 0, after_id, None
+        for user_id, total, n, max_id, max_at in await self.db.execute(stmt):
+            # SUM(bigint) is numeric on Postgres
+            sums[user_id] = int(total)
+            count += n
+            if max_id > last_id:
+                last_id, last_at = max_id, max_at
+        return sums, count, last_id, last_at
+
+    async def add_checkpoint(
+        self, chat_id: int, ledger_id: int, as_of: datetime, balances: dict[int, int], opening: bool = False
+    ) -> None:
+        if not balances:
+            return
+        await self.db.execute(
+            insert(BalanceCheckpoint),
+            [
+                {
+                    "chat_id": chat_id, "user_id": user_id, "ledger_id": ledger_id,
+                    "balance": balance, "as_of": as_of, "opening": opening,
+                }
+                for user_id, balance in balances.items()
+            ],
+        )
+
+    # ------------------------------------------------------------------
+    # DIGESTS
+    # ------------------------------------------------------------------
+
+    async def set_digest(self, chat_id: int, kind: str | None) -> None:
+        stmt = update(Chat).where(Chat.id == chat_id).values(digest=kind)
+        await self.db.execute(stmt)
+
+    async def list_digest_chats(
+        self, kinds: list[str], after_id: int, limit: int
+    ) -> list[tuple[int, int, str, str, str | None]]:
+        """Next page of (id, telegram_chat_id, digest, base_currency, bot) after `after_id`, by id."""
+        stmt = (
+            select(Chat.id, Chat.telegram_chat_id, Chat.digest, Chat.base_currency, Chat.bot)
+            .where(Chat.digest.in_(kinds), Chat.id > after_id)
+            .order_by(Chat.id)
+            .limit(limit)
+        )
+        return [tuple(row) for row in await self.db.execute(stmt)]
+
+    async def get_or_create_digest_run(self, run_date: date) -> DigestRun:
+        stmt = select(DigestRun).where(DigestRun.run_date == run_date)
+        run = await self.db.scalar(stmt)
+        if run:
+            return run
+
+        run = DigestRun(run_date=run_date, last_chat_id=0, sent=0)
+        try:
+            # In a savepoint, so losing the race leaves the transaction usable
+            async with self.db.begin_nested():
+                self.db.add(run)
+        except IntegrityError:
+            # another process created today's run first
+            run = await self.db.scalar(stmt)
+            if not run:
+                raise
+        return run
+
+    async def lease_digest_run(self, run_id: int, now: datetime, until: datetime) -> bool:
+        """Take or renew the run's lease unless another process holds a live one."""
+        stmt = (
+            update(DigestRun)
+            .where(
+                DigestRun.id == run_id,
+                DigestRun.finished_at.is_(None),
+                (DigestRun.lease_until.is_(None)) | (DigestRun.lease_until < now),
+            )
+            .values(lease_until=until)
+            .execution_options(synchronize_session=False)
+        )
+        return (await self.db.execute(stmt)).rowcount > 0
+
+    async def checkpoint_digest_run(
+        self,
+        run_id: int,
+        last_chat_id: int,
+        sent: int,
+        lease_until: datetime | None,
+        finished_at: datetime | None = None,
+    ) -> None:
+        stmt = (
+            update(DigestRun)
+            .where(DigestRun.id == run_id)
+            .values(last_chat_id=last_chat_id, sent=sent, lease_until=lease_until, finished_at=finished_at)
+            .execution_options(synchronize_session=False)
+        )
+        await self.db.execute(stmt)
+
+    # ------------------------------------------------------------------
+    # FX RATES
+    # ------------------------------------------------------------------
+
+    async def get_fx_series(
+        self, currencies: Iterable[str], until: date
+    ) -> dict[str, list[tuple[date, Decimal]]]:
+        """All rates for `currencies` up to `until`, per currency in date order."""
+        stmt = (
+            select(FxRate.currency, FxRate.rate_date, FxRate.rate)
+            .where(FxRate.currency.in_(set(currencies)), FxRate.rate_date <= until)
+            .order_by(FxRate.currency, FxRate.rate_date)
+        )
+        series: dict[str, list[tuple[date, Decimal]]] = {}
+        for currency, rate_date, rate in await self.db.execute(stmt):
+            series.setdefault(currency, []).append((rate_date, rate))
+        return series
+
+    async def upsert_fx_rates(self, rows: Iterable[tuple[date, str, Decimal]]) -> None:
+        from sqlalchemy.dialects.postgresql import insert
+        values = [
+            {"rate_date": rate_date, "currency": currency, "rate": rate}
+            for rate_date, currency, rate in rows
+        ]
+        if not values:
+            return
+
+        stmt = insert(FxRate).values(values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[FxRate.currency, FxRate.rate_date],
+            set_={"rate": stmt.excluded.rate},
+        )
+        await self.db.execute(stmt)
+
+    async def get_chat_fx_series(self, chat_id: int, base: str) -> dict[str, list[tuple[date, Decimal]]]:
+        """A chat's own rates into `base`, per currency in date order."""
+        stmt = (
+            select(ChatFxRate.currency, ChatFxRate.rate_date, ChatFxRate.rate)
+            .where(ChatFxRate.chat_id == chat_id, ChatFxRate.base == base)
+            .order_by(ChatFxRate.currency, ChatFxRate.rate_date)
+        )
+        series: dict[str, list[tuple[date, Decimal]]] = {}
+        for currency, rate_date, rate in await self.db.execute(stmt):
+            series.setdefault(currency, []).append((rate_date, rate))
+        return series
+
+    async def upsert_chat_fx_rate(self, chat_id: int, base: str, currency: str, on: date, rate: Decimal) -> None:
+        from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(ChatFxRate).values(chat_id=chat_id, base=base, currency=currency, rate_date=on, rate=rate)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ChatFxRate.chat_id, ChatFxRate.base, ChatFxRate.currency, ChatFxRate.rate_date],
+            set_={"rate": stmt.excluded.rate},
+        )
+        await self.db.execute(stmt)
+
+
+def _in_shard(tg_chat_id, shard: Shard | None) -> tuple:
+    """WHERE clauses for shard_for(tg_chat_id, n) == shard; none without a shard."""
+    if shard is None:
+        return ()
+    index, n = shard
+    # SQL % takes the dividend's sign, Python's is non-negative like shard_for's
+    return (((tg_chat_id % n) + n) % n == index,)
+
+
+def _escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _currency_day_rows(result) -> list[CurrencyDayTotal]:
+    # func.date() comes back as a string on SQLite, SUM(bigint) as numeric on Postgres
+    return [
+        (user_id, currency, day if isinstance(day, date) else date.fromisoformat(day), int(total))
+        for user_id, currency, day, total in result
+    ]
@@ -0,0 +1,82 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.errors import DomainError
+from app.features.expenses.dto import ExpenseDTO
+from app.features.expenses.models import utcnow
+from app.features.expenses.repo import ExpensesRepository, Shard
+from app.features.expenses.service import ExpensesService
+
+logger = logging.getLogger(__name__)
+
+RecurringReport = list[tuple[int, ExpenseDTO | DomainError]]
+# (telegram chat id, report, bot serving the chat)
+Notify = Callable[[int, RecurringReport, str | None], Awaitable[None]]
+
+
+class RecurringScheduler:
+    """
+    Adds due recurring expenses every `interval` seconds.
+
+    Each tick claims due definitions in batches of `batch` through the next_run_at
+    index until fewer than a full batch are due, so an idle tick is one indexed
+    query however many definitions exist. Claims use SKIP LOCKED, so several
+    processes can run a scheduler against the same database. With `shard`, only
+    definitions of that dispatch shard's chats are claimed, so their ChatUpdated
+    events reach the process that owns the chat. `notify` receives each chat's
+    results after commit.
+    """
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        interval: float,
+        batch: int = 100,
+        notify: Notify | None = None,
+        shard: Shard | None = None,
+    ):
+        self.session_factory = session_factory
+        self.interval = interval
+        self.batch = batch
+        self.notify = notify
+        self.shard = shard
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def aclose(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.tick()
+            except Exception:
+                logger.exception("Recurring expense tick failed")
+            await asyncio.sleep(self.interval)
+
+    async def tick(self) -> int:
+        """Materialize everything currently due; returns how many occurrences were processed."""
+        total = 0
+        while True:
+            async with self.session_factory() as session:
+                svc = ExpensesService(ExpensesRepository(session))
+                claimed, reports, bots = await svc.run_due_recurring(utcnow(), self.batch, self.shard)
+            total += claimed
+
+            if self.notify:
+                for tg_chat_id, report in reports.items():
+                    try:
+                        await self.notify(tg_chat_id, report, bots[tg_chat_id])
+                    except Exception:
+                        logger.warning("Could not report recurring expenses to chat %s", tg_chat_id)
+
+            if claimed < self.batch:
+                if total:
+                    logger.info("Added %d recurring expenses", total)
+                return total
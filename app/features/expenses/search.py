@@ -0,0 +1,123 @@
+import heapq
+import re
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Iterable
+
+from app.features.expenses.events import ChatUpdated, chat_events
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _grams(word: str) -> set[str]:
+    """Every substring of `word` up to three characters long."""
+    return {word[i:i + n] for n in (1, 2, 3) for i in range(len(word) - n + 1)}
+
+
+def _utc_naive(dt: datetime) -> datetime:
+    # SQLite hands back naive UTC while freshly written rows are aware
+    return dt.astimezone(timezone.utc).replace(tzinfo=None) if dt.tzinfo else dt
+
+
+class _ChatIndex:
+    def __init__(self):
+        self.postings: dict[str, set[int]] = defaultdict(set)
+        # Each expense's words, so removing it prunes its postings
+        self.words: dict[int, set[str]] = {}
+        self.recency: dict[int, tuple[datetime, int]] = {}
+        # Substrings of up to three characters -> the words containing them, so a
+        # term is only compared against words sharing all of its trigrams
+        self.grams: dict[str, set[str]] = defaultdict(set)
+
+    def add(self, expense_id: int, description: str, created_at: datetime) -> None:
+        self.remove(expense_id)
+        words = set(tokenize(description))
+        self.words[expense_id] = words
+        self.recency[expense_id] = (_utc_naive(created_at), expense_id)
+        for word in words:
+            if word not in self.postings:
+                for gram in _grams(word):
+                    self.grams[gram].add(word)
+            self.postings[word].add(expense_id)
+
+    def remove(self, expense_id: int) -> None:
+        self.recency.pop(expense_id, None)
+        for word in self.words.pop(expense_id, ()):
+            ids = self.postings[word]
+            ids.discard(expense_id)
+            if not ids:
+                del self.postings[word]
+                for gram in _grams(word):
+                    self.grams[gram].discard(word)
+                    if not self.grams[gram]:
+                        del self.grams[gram]
+
+    def _words_containing(self, term: str) -> Iterable[str]:
+        if len(term) <= 3:
+            return self.grams.get(term, ())
+        candidates: set[str] | None = None
+        for i in range(len(term) - 2):
+            words = self.grams.get(term[i:i + 3])
+            if not words:
+                return ()
+            candidates = set(words) if candidates is None else candidates & words
+        return [word for word in candidates if term in word]
+
+    def match(self, terms: list[str], limit: int) -> list[int]:
+        """
+        Up to `limit` ids whose description contains every term, newest first. Terms
+        match anywhere in a word, like the ILIKE '%term%' used on Postgres.
+        """
+        matched: set[int] | None = None
+        for term in terms:
+            ids: set[int] = set()
+            for word in self._words_containing(term):
+                ids |= self.postings[word]
+            matched = ids if matched is None else matched & ids
+            if not matched:
+                return []
+        return heapq.nlargest(limit, matched or (), key=self.recency.__getitem__)
+
+
+class ExpenseSearchIndex:
+    """
+    In-memory inverted index over expense descriptions, per chat.
+
+    Fallback for databases without trigram indexes (the SQLite profile). A chat's
+    index is built from one query on first search and then follows ChatUpdated
+    events; stale events drop it so it is rebuilt on the next search.
+    """
+    def __init__(self):
+        self._chats: dict[int, _ChatIndex] = {}
+        chat_events.subscribe(self.on_chat_updated, self._chats.clear)
+
+    def has(self, tg_chat_id: int) -> bool:
+        return tg_chat_id in self._chats
+
+    def build(self, tg_chat_id: int, rows: Iterable[tuple[int, str, datetime]]) -> None:
+        index = _ChatIndex()
+        for expense_id, description, created_at in rows:
+            index.add(expense_id, description, created_at)
+        self._chats[tg_chat_id] = index
+
+    def search(self, tg_chat_id: int, terms: list[str], limit: int) -> list[int]:
+        return self._chats[tg_chat_id].match(terms, limit)
+
+    def on_chat_updated(self, event: ChatUpdated) -> None:
+        index = self._chats.get(event.tg_chat_id)
+        if index is None:
+            return
+        if event.stale:
+            del self._chats[event.tg_chat_id]
+            return
+        for expense_id in event.removed:
+            index.remove(expense_id)
+        for e in event.expenses:
+            index.add(e.id, e.desc, e.created_at)
+
+
+search_index = ExpenseSearchIndex()
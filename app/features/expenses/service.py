@@ -1,18 +1,47 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta
 from decimal import Decimal
+from typing import TYPE_CHECKING, Iterable, Sequence
 
-from fastapi import Depends
+from fastapi import Depends, Request
 from app.core.errors import DomainError
-from app.features.expenses.dto import ExpenseDTO
-from app.features.expenses.errors import ChatNotFound, NotMember, ServerError, UserNotRegistered
-from app.features.expenses.repo import ExpensesRepository, get_repo
+from app.features.expenses.balances import allocate, net_balances, settle, split_debits, split_deltas, split_equally
+from app.features.expenses.dto import (
+    BalanceDTO, BalancesAsOfDTO, ChatBalanceDTO, ChatSummaryDTO, DashboardSnapshotDTO, DigestDTO, ExpenseDTO, ExpenseWrite, MemberBalanceDTO,
+    RecurringDTO, SearchPageDTO, SettlementDTO, UserBalancesDTO,
+)
+from app.features.expenses.events import ChatUpdated, RatesUpdated, chat_events
+from app.features.expenses.errors import (
+    BalanceHistoryUnavailable, BaseCurrencyLocked, BatchRejected, ChatNotFound, ExpenseNotFound, InvalidAmount, NotMember,
+    RateForBaseCurrency, RecurringNotFound, ServerError, UserNotRegistered,
+)
+from app.features.expenses.fx import RateKey, fx_rates
+from app.features.expenses.mentions import mention_index
+from app.features.expenses.money import MAX_MINOR, from_minor, to_minor
+from app.features.expenses.models import Chat, DigestRun, Expense, ExpenseSplit, RecurringExpense, User, utcnow
+from app.features.expenses.profiles import profile_writes
+from app.features.expenses.recurrence import nth_run
+from app.features.expenses.repo import AnyExpense, ExpensesRepository, Shard, get_repo
+from app.features.expenses.search import search_index, tokenize
+from app.features.expenses.user_balances import user_balances
 from sqlalchemy.exc import IntegrityError
 
-def get_service(repo: "ExpensesRepository" = Depends(get_repo)) -> "ExpensesService":
-    return ExpensesService(repo)
+if TYPE_CHECKING:
+    from app.features.expenses.coalescer import ExpenseWriteCoalescer
+
+def get_write_coalescer(request: Request) -> "ExpenseWriteCoalescer | None":
+    return getattr(request.app.state, "expense_writes", None)
+
+def get_service(
+    repo: "ExpensesRepository" = Depends(get_repo),
+    writes: "ExpenseWriteCoalescer | None" = Depends(get_write_coalescer),
+) -> "ExpensesService":
+    return ExpensesService(repo, writes)
 
 class ExpensesService:
-    def __init__(self, repo: ExpensesRepository):
+    def __init__(self, repo: ExpensesRepository, writes: "ExpenseWriteCoalescer | None" = None):
         self.repo = repo
+        self.writes = writes
 
     # ------------------------------------------------------------------
     # MEMBERSHIP/INIT
@@ -34,6 +63,7 @@ class ExpensesService:
             raise ServerError() from e
         else:
             await self.repo.db.commit()
+            chat_events.publish(ChatUpdated(tg_chat_id, stale=True))
 
     async def _ensure_member_and_balance(
         self, 
@@ -55,51 +85,963 @@ class ExpensesService:
         tg_chat_id: int, 
         tg_user_id: int,
         amount: Decimal,
-        desc: str
+        desc: str,
+        currency: str | None = None,
+        split_user_ids: tuple[int, ...] | None = None,
+    ) -> ExpenseDTO:
+        write = ExpenseWrite(tg_chat_id, tg_user_id, amount, desc, currency, split_user_ids)
+
+        # Busy chats: let the coalescer group this with concurrent writes
+        if self.writes:
+            return await self.writes.submit(write)
+
+        [result] = await self.add_expenses(tg_chat_id, [write])
+        if isinstance(result, DomainError):
+            raise result
+        return result
+
+    async def add_expenses(
+        self,
+        tg_chat_id: int,
+        writes: list[ExpenseWrite],
+    ) -> list[ExpenseDTO | DomainError]:
+        """
+        Apply several expenses for one chat in a single transaction with one balance UPDATE.
+        Per-write validation failures are returned in place instead of failing the batch.
+        """
+        await self.repo.db.begin()
+
+        try:
+            results, deltas = await self._apply_expenses(tg_chat_id, writes)
+        except IntegrityError as e:
+            await self.repo.db.rollback()
+            if len(writes) == 1:
+                raise ServerError() from e
+            # Isolate the offending write by retrying one by one
+            return [await self._add_expense_isolated(tg_chat_id, w) for w in writes]
+        except DomainError:
+            await self.repo.db.rollback()
+            raise
+        else:
+            await self.repo.db.commit()
+            chat_events.publish(ChatUpdated(
+                tg_chat_id,
+                deltas=deltas,
+                expenses=[r for r in results if isinstance(r, ExpenseDTO)],
+            ))
+            return results
+
+    async def resolve_mentions(
+        self,
+        tg_chat_id: int,
+        usernames: Sequence[str],
+        tg_user_ids: Sequence[int],
+    ) -> tuple[list[int], list[str]]:
+        """
+        Member user ids for a command's @usernames then text mentions, without duplicates,
+        plus the @usernames that aren't members of the chat. Cached per chat; all
+        misses are looked up together in one query, inside the caller's transaction if
+        one is open, else in a short read transaction of its own.
+        """
+        names = [u.lower() for u in usernames]
+        by_name, by_id = mention_index.lookup(tg_chat_id, names, tg_user_ids)
+
+        missing_names = [n for n in names if n not in by_name]
+        missing_ids = [i for i in tg_user_ids if i not in by_id]
+        if missing_names or missing_ids:
+            # Usernames changed since the last profile flush aren't in the database yet
+            renamed = profile_writes.renamed()
+            lookup_ids = missing_ids + [renamed[n] for n in missing_names if n in renamed]
+            if self.repo.db.in_transaction():
+                rows = await self.repo.find_members_by_mention(tg_chat_id, missing_names, lookup_ids)
+            else:
+                # Closed again before the caller's write opens its transaction
+                async with self.repo.db.begin():
+                    rows = await self.repo.find_members_by_mention(tg_chat_id, missing_names, lookup_ids)
+            mention_index.remember(tg_chat_id, [
+                (user_id, tg_user_id, profile_writes.username(tg_user_id, username))
+                for user_id, tg_user_id, username in rows
+            ])
+            by_name, by_id = mention_index.lookup(tg_chat_id, names, tg_user_ids)
+
+        resolved = [by_name[n] for n in names if n in by_name] + [by_id[i] for i in tg_user_ids if i in by_id]
+        unresolved = [f"@{u}" for u, n in zip(usernames, names) if n not in by_name]
+        return list(dict.fromkeys(resolved)), unresolved
+
+    def refresh_profile(
+        self, tg_user_id: int, username: str | None, first_name: str | None, last_name: str | None
     ) -> None:
+        """
+        Note the sender's profile from an incoming message. Changes are written behind
+        by profile_writes; the mention cache follows a new username right away.
+        """
+        if not profile_writes.observe(tg_user_id, username, first_name, last_name):
+            return
+
+        known, current = mention_index.username_of(tg_user_id)
+        if known and current != username:
+            mention_index.rename(tg_user_id, username)
+
+    def refresh_chat_title(self, tg_chat_id: int, title: str | None) -> None:
+        """Note a group's title from an incoming update; written behind like profiles."""
+        if title and profile_writes.observe_chat(tg_chat_id, title):
+            user_balances.invalidate_chat(tg_chat_id)
+
+    async def add_expense_batch(self, tg_chat_id: int, writes: list[ExpenseWrite]) -> list[ExpenseDTO]:
+        """
+        Add a pasted batch of expenses all or nothing, in one transaction with one INSERT
+        per table and one balance UPDATE. If any write fails validation nothing is
+        stored and BatchRejected lists every failing line.
+        """
+        await self.repo.db.begin()
+
+        try:
+            results, deltas = await self._apply_expenses(tg_chat_id, writes)
+            errors = [(n, r.message) for n, r in enumerate(results, start=1) if isinstance(r, DomainError)]
+            if errors:
+                raise BatchRejected(errors)
+        except IntegrityError as e:
+            await self.repo.db.rollback()
+            raise ServerError() from e
+        except DomainError:
+            await self.repo.db.rollback()
+            raise
+        else:
+            await self.repo.db.commit()
+            expenses = [r for r in results if isinstance(r, ExpenseDTO)]
+            chat_events.publish(ChatUpdated(tg_chat_id, deltas=deltas, expenses=expenses))
+            return expenses
+
+    async def _add_expense_isolated(self, tg_chat_id: int, write: ExpenseWrite) -> ExpenseDTO | DomainError:
+        try:
+            [result] = await self.add_expenses(tg_chat_id, [write])
+        except DomainError as e:
+            return e
+        return result
+
+    async def _apply_expenses(
+        self,
+        tg_chat_id: int,
+        writes: list[ExpenseWrite],
+    ) -> tuple[list[ExpenseDTO | DomainError], dict[int, int]]:
+        chat = await self.repo.get_chat_by_tg_id(tg_chat_id)
+        if not chat:
+            raise ChatNotFound()
+
+        users = await self.repo.get_users_by_tg_ids(w.tg_user_id for w in writes)
+        # Default split: equally among all current members, in the expense currency
+        member_ids = await self.repo.list_member_ids(chat.id)
+        members = set(member_ids)
+
+        base = chat.base_currency
+        now = utcnow()
+        today = now.date()
+        await self._resolve_rates(
+            [(w.currency or base, today) for w in writes] + [(base, today)], chat
+        )
+
+        results: list[ExpenseDTO | DomainError | None] = []
+        accepted: list[tuple[int, Expense, User, list[int]]] = []
+        deltas: dict[int, int] = defaultdict(int)
+        for write in writes:
+            user = users.get(write.tg_user_id)
+            currency = write.currency or base
+            amount = to_minor(write.amount, currency)
+            try:
+                if not 0 < amount <= MAX_MINOR:
+                    raise InvalidAmount(currency)
+                if not user:
+                    raise UserNotRegistered()
+                if user.id not in members:
+                    raise NotMember()
+                # Mentions are resolved to members, but one may have left since
+                participants = list(write.split_user_ids) if write.split_user_ids else member_ids
+                if not members.issuperset(participants):
+                    raise NotMember()
+                fx_rate = fx_rates.conversion_rate(currency, base, today, chat.id)
+            except DomainError as e:
+                results.append(e)
+                continue
+
+            expense = Expense(
+                chat_id=chat.id,
+                payer_id=user.id,
+                amount=amount,
+                currency=currency,
+                fx_rate=fx_rate,
+                description=write.desc,
+                created_at=now,
+            )
+            accepted.append((len(results), expense, user, participants))
+            results.append(None)
+
+        if accepted:
+            await self.repo.add_expenses(e for _, e, _, _ in accepted)
+
+            splits: list[ExpenseSplit] = []
+            for _, expense, _, participants in accepted:
+                shares = list(zip(participants, split_equally(expense.amount, len(participants))))
+                expense_splits = _make_splits(expense, shares, base)
+                splits += expense_splits
+                for user_id, delta in _split_deltas(expense, expense_splits).items():
+                    deltas[user_id] += delta
+
+            await self.repo.add_splits(splits)
+            await self.repo.apply_balance_deltas(chat.id, deltas)
+
+        for idx, expense, user, _ in accepted:
+            results[idx] = _expense_dto(expense, user)
+        return [r for r in results if r is not None], dict(deltas)
+
+    async def remove_expense(self, tg_chat_id: int, tg_user_id: int, expense_id: int) -> ExpenseDTO:
+        """
+        Soft-delete an expense and reverse exactly the balance deltas its splits recorded,
+        in one UPDATE. Cost depends only on the size of the expense, not the chat's history.
+        """
+        await self.repo.db.begin()
+
+        try:
+            chat, expense = await self._get_expense_for_change(tg_chat_id, tg_user_id, expense_id)
+            deltas = {user_id: -d for user_id, d in _split_deltas(expense, expense.splits).items()}
+
+            await self.repo.soft_delete_expense(expense.id)
+            await self.repo.apply_balance_deltas(chat.id, deltas)
+            result = _expense_dto(expense, expense.payer)
+        except IntegrityError as e:
+            await self.repo.db.rollback()
+            raise ServerError() from e
+        except DomainError:
+            await self.repo.db.rollback()
+            raise
+        else:
+            await self.repo.db.commit()
+            chat_events.publish(ChatUpdated(tg_chat_id, deltas=deltas, removed=[expense.id]))
+            return result
+
+    async def edit_expense(
+        self,
+        tg_chat_id: int,
+        tg_user_id: int,
+        expense_id: int,
+        amount: Decimal,
+        desc: str | None = None,
+        currency: str | None = None,
+    ) -> ExpenseDTO:
+        """
+        Replace an expense with a corrected copy: the original is soft-deleted and its
+        recorded deltas reversed, the copy keeps the payer, date and split proportions.
+        Both sides go into one balance UPDATE. Returns the replacement.
+        """
         await self.repo.db.begin()
 
         try:
+            chat, old = await self._get_expense_for_change(tg_chat_id, tg_user_id, expense_id)
+
+            currency = currency or old.currency
+            amount_minor = to_minor(amount, currency)
+            if not 0 < amount_minor <= MAX_MINOR:
+                raise InvalidAmount(currency)
+            fx_rate = old.fx_rate
+            if currency != old.currency:
+                # Converted as of the expense's own date, like the original was
+                on = old.created_at.date()
+                await self._resolve_rates([(currency, on), (chat.base_currency, on)], chat)
+                fx_rate = fx_rates.conversion_rate(currency, chat.base_currency, on, chat.id)
+
+            new = Expense(
+                chat_id=chat.id,
+                payer_id=old.payer_id,
+                amount=amount_minor,
+                currency=currency,
+                fx_rate=fx_rate,
+                description=old.description if desc is None else desc,
+                created_at=old.created_at,
+            )
+            await self.repo.soft_delete_expense(old.id)
+            await self.repo.add_expenses([new])
+
+            old_splits = sorted(old.splits, key=lambda s: s.id)
+            parts = allocate(amount_minor, [s.amount for s in old_splits])
+            splits = _make_splits(new, list(zip([s.user_id for s in old_splits], parts)), chat.base_currency)
+            await self.repo.add_splits(splits)
+
+            deltas: dict[int, int] = defaultdict(int)
+            for user_id, d in _split_deltas(old, old_splits).items():
+                deltas[user_id] -= d
+            for user_id, d in _split_deltas(new, splits).items():
+                deltas[user_id] += d
+            deltas = {user_id: d for user_id, d in deltas.items() if d}
+            await self.repo.apply_balance_deltas(chat.id, deltas)
+            result = _expense_dto(new, old.payer)
+        except IntegrityError as e:
+            await self.repo.db.rollback()
+            raise ServerError() from e
+        except DomainError:
+            await self.repo.db.rollback()
+            raise
+        else:
+            await self.repo.db.commit()
+            chat_events.publish(ChatUpdated(tg_chat_id, deltas=deltas, expenses=[result], removed=[old.id]))
+            return result
+
+    async def _get_expense_for_change(
+        self, tg_chat_id: int, tg_user_id: int, expense_id: int
+    ) -> tuple[Chat, Expense]:
+        chat = await self.repo.get_chat_by_tg_id(tg_chat_id)
+        if not chat:
+            raise ChatNotFound()
+
+        user = await self.repo.get_user_by_tg_id(tg_user_id)
+        if not user:
+            raise UserNotRegistered()
+        if not await self.repo.is_member(chat.id, user.id):
+            raise NotMember()
+
+        expense = await self.repo.get_live_expense_for_update(chat.id, expense_id)
+        if not expense:
+            raise ExpenseNotFound(expense_id)
+        return chat, expense
+
+    async def get_expenses(self, tg_chat_id: int) -> list[ExpenseDTO]:
+        chat = await self.repo.get_chat_by_tg_id(tg_chat_id)
+        if not chat:
+            raise ChatNotFound()
+        
+        # Get last 10 expenses
+        expenses_list = await self.repo.list_expenses(chat.id, 10)
+
+        return [_expense_dto(expense, expense.payer) for expense in expenses_list]
+
+    async def search_expenses(
+        self,
+        tg_chat_id: int,
+        query: str,
+        page: int = 1,
+        page_size: int = 10,
+    ) -> SearchPageDTO:
+        chat = await self.repo.get_chat_by_tg_id(tg_chat_id)
+        if not chat:
+            raise ChatNotFound()
+
+        terms = tokenize(query)
+        offset = (page - 1) * page_size
+        if not terms:
+            expenses = []
+        elif self.repo.dialect == "postgresql":
+            # One extra row tells us whether there is a next page
+            expenses = await self.repo.search_expenses(chat.id, terms, page_size + 1, offset)
+        else:
+            if not search_index.has(tg_chat_id):
+                search_index.build(tg_chat_id, await self.repo.list_expense_texts(chat.id))
+            ids = search_index.search(tg_chat_id, terms, offset + page_size + 1)[offset:]
+            expenses = await self.repo.get_expenses_by_ids(ids) if ids else []
+
+        return SearchPageDTO(
+            query=query,
+            page=page,
+            results=[_expense_dto(e, e.payer) for e in expenses[:page_size]],
+            has_more=len(expenses) > page_size,
+        )
+
+    # ------------------------------------------------------------------
+    # RECURRING EXPENSES
+    # ------------------------------------------------------------------
+
+    async def add_recurring(
+        self,
+        tg_chat_id: int,
+        tg_user_id: int,
+        amount: Decimal,
+        desc: str,
+        every: int,
+        unit: str,
+        currency: str | None = None,
+    ) -> RecurringDTO:
+        """Schedule an expense paid by the caller; the first occurrence is due right away."""
+        await self.repo.db.begin()
+
+        try:
+            chat = await self.repo.get_chat_by_tg_id(tg_chat_id)
+            if not chat:
+                raise ChatNotFound()
             user = await self.repo.get_user_by_tg_id(tg_user_id)
             if not user:
                 raise UserNotRegistered()
-            
+            if not await self.repo.is_member(chat.id, user.id):
+                raise NotMember()
+            currency = currency or chat.base_currency
+            amount_minor = to_minor(amount, currency)
+            if not 0 < amount_minor <= MAX_MINOR:
+                raise InvalidAmount(currency)
+
+            now = utcnow()
+            recurring = RecurringExpense(
+                chat_id=chat.id,
+                payer_id=user.id,
+                amount=amount_minor,
+                currency=currency,
+                description=desc,
+                every=every,
+                unit=unit,
+                starts_at=now,
+                runs=0,
+                next_run_at=now,
+            )
+            await self.repo.add_recurring(recurring)
+            result = _recurring_dto(recurring, user)
+        except IntegrityError as e:
+            await self.repo.db.rollback()
+            raise ServerError() from e
+        except DomainError:
+            await self.repo.db.rollback()
+            raise
+        else:
+            await self.repo.db.commit()
+            return result
+
+    async def list_recurring(self, tg_chat_id: int) -> list[RecurringDTO]:
+        chat = await self.repo.get_chat_by_tg_id(tg_chat_id)
+        if not chat:
+            raise ChatNotFound()
+
+        return [_recurring_dto(r, r.payer) for r in await self.repo.list_recurring(chat.id)]
+
+    async def remove_recurring(self, tg_chat_id: int, tg_user_id: int, recurring_id: int) -> None:
+        await self.repo.db.begin()
+
+        try:
             chat = await self.repo.get_chat_by_tg_id(tg_chat_id)
             if not chat:
                 raise ChatNotFound()
-            
-            is_member = await self.repo.is_member(chat.id, user.id)
-            if not is_member:
+            user = await self.repo.get_user_by_tg_id(tg_user_id)
+            if not user:
+                raise UserNotRegistered()
+            if not await self.repo.is_member(chat.id, user.id):
                 raise NotMember()
-            
-            # TODO: Create splits + update balance
-            await self.repo.create_expense(chat.id, user.id, amount, desc)
+            if not await self.repo.delete_recurring(chat.id, recurring_id):
+                raise RecurringNotFound(recurring_id)
+        except DomainError:
+            await self.repo.db.rollback()
+            raise
+        else:
+            await self.repo.db.commit()
+
+    async def run_due_recurring(
+        self, now: datetime, limit: int = 100, shard: Shard | None = None
+    ) -> tuple[int, dict[int, list[tuple[int, ExpenseDTO | DomainError]]], dict[int, str | None]]:
+        """
+        Materialize one occurrence of up to `limit` due recurring expenses and advance
+        their next_run_at, all in one transaction. Expenses go through the same path as
+        add_expenses, one batch per chat. Work depends only on how many are due. With
+        `shard`, only definitions of that dispatch shard's chats are claimed.
+
+        Returns how many were claimed, per chat (recurring id, result) pairs, and the
+        bot serving each chat (Chat.bot). A DomainError result (e.g. the payer left)
+        skips that occurrence.
+        """
+        await self.repo.db.begin()
+
+        try:
+            claimed = await self.repo.claim_due_recurring(now, limit, shard)
+
+            by_chat: dict[int, list[tuple[RecurringExpense, int]]] = defaultdict(list)
+            bots: dict[int, str | None] = {}
+            for recurring, tg_chat_id, tg_user_id, bot in claimed:
+                by_chat[tg_chat_id].append((recurring, tg_user_id))
+                bots[tg_chat_id] = bot
+
+            reports: dict[int, list[tuple[int, ExpenseDTO | DomainError]]] = {}
+            events: list[ChatUpdated] = []
+            for tg_chat_id, items in by_chat.items():
+                writes = [
+                    ExpenseWrite(tg_chat_id, tg_user_id, from_minor(r.amount, r.currency), r.description, r.currency)
+                    for r, tg_user_id in items
+                ]
+                results, deltas = await self._apply_expenses(tg_chat_id, writes)
+                reports[tg_chat_id] = [(r.id, result) for (r, _), result in zip(items, results)]
+                events.append(ChatUpdated(
+                    tg_chat_id,
+                    deltas=deltas,
+                    expenses=[r for r in results if isinstance(r, ExpenseDTO)],
+                ))
+
+            # Overdue definitions catch up one occurrence per claim
+            for recurring, *_ in claimed:
+                recurring.runs += 1
+                recurring.next_run_at = nth_run(recurring.starts_at, recurring.every, recurring.unit, recurring.runs)
+            await self.repo.db.flush()
+        except IntegrityError as e:
+            await self.repo.db.rollback()
+            raise ServerError() from e
+        except DomainError:
+            await self.repo.db.rollback()
+            raise
+        else:
+            await self.repo.db.commit()
+            for event in events:
+                chat_events.publish(event)
+            return len(claimed), reports, bots
+
+    # ------------------------------------------------------------------
+    # SUMMARY
+    # ------------------------------------------------------------------
+
+    async def get_summary(self, tg_chat_id: int) -> ChatSummaryDTO:
+        """
+        /home from the stored balances and each expense's write-time conversion, the
+        same numbers the dashboard, digests and /mybalances show.
+        """
+        chat = await self.repo.get_chat_by_tg_id(tg_chat_id)
+        if not chat:
+            raise ChatNotFound()
+
+        base = chat.base_currency
+        rows = await self.repo.list_balances(chat.id)
+        balances = {b.user_id: b.balance for b in rows}
+        names = {b.user_id: display_name(b.user) for b in rows}
+        total_spent = await self.repo.sum_spent(chat.id)
+        return ChatSummaryDTO(
+            currency=base,
+            total_spent=from_minor(total_spent, base),
+            balances=[
+                BalanceDTO(name=names.get(user_id, "?"), balance=from_minor(balance, base))
+                for user_id, balance in sorted(balances.items(), key=lambda b: b[1], reverse=True)
+            ],
+            settlements=[
+                SettlementDTO(
+                    from_name=names.get(debtor, "?"),
+                    to_name=names.get(creditor, "?"),
+                    amount=from_minor(amount, base),
+                )
+                for debtor, creditor, amount in settle(balances)
+            ],
+        )
+
+    async def reconcile_balances(self, tg_chat_id: int) -> dict[int, int]:
+        """
+        Stored balance minus the balance implied by live splits and payments, per user,
+        in minor units of the base currency.
+        Empty when the incrementally maintained balances are consistent.
+        """
+        chat = await self.repo.get_chat_by_tg_id(tg_chat_id)
+        if not chat:
+            raise ChatNotFound()
+
+        expected = await self.repo.sum_split_deltas(chat.id)
+        sent, received = await self.repo.sum_payments_by_currency_day(chat.id)
+        base = chat.base_currency
+        rows = sent + received
+        await self._resolve_rates(
+            [(currency, day) for _, currency, day, _ in rows]
+            + [(base, day) for _, _, day, _ in rows]
+        )
+        for user_id, net in net_balances(sent, received, base, fx_rates).items():
+            expected[user_id] = expected.get(user_id, 0) + net
+
+        stored = await self.repo.get_balances(chat.id)
+        drift = {
+            user_id: stored.get(user_id, 0) - expected.get(user_id, 0)
+            for user_id in stored.keys() | expected.keys()
+        }
+        return {user_id: d for user_id, d in drift.items() if d}
+
+    async def get_user_balances(self, tg_user_id: int) -> UserBalancesDTO:
+        """
+        A user's balances in every chat, for /mybalances in private. One query on a
+        miss; cached per user until one of their balances changes.
+        """
+        cached = user_balances.get(tg_user_id)
+        if cached is not None:
+            return cached
+
+        generation = user_balances.generation
+        rows = await self.repo.list_user_balances(tg_user_id)
+        totals: dict[str, int] = defaultdict(int)
+        for _, _, _, currency, balance in rows:
+            totals[currency] += balance
+        view = UserBalancesDTO(
+            balances=[
+                ChatBalanceDTO(
+                    title=profile_writes.title(tg_chat_id, title),
+                    currency=currency,
+                    balance=from_minor(balance, currency),
+                )
+                for _, tg_chat_id, title, currency, balance in rows
+            ],
+            totals={currency: from_minor(total, currency) for currency, total in sorted(totals.items())},
+        )
+        if rows:
+            tg_chat_ids = frozenset(tg_chat_id for _, tg_chat_id, _, _, _ in rows)
+            user_balances.put(generation, tg_user_id, rows[0][0], tg_chat_ids, view)
+        return view
+
+    # ------------------------------------------------------------------
+    # LEDGER
+    # ------------------------------------------------------------------
+
+    async def verify_ledger(self, chat_id: int, checkpoint_every: int) -> dict[int, int]:
+        """
+        Stored balance minus the balance the ledger implies, per user. Reads the latest
+        checkpoint plus the entries since, with the chat's balances locked against writes.
+        When they agree and at least `checkpoint_every` entries were replayed, records a
+        new checkpoint so the next replay starts there.
+        """
+        await self.repo.db.begin()
+
+        try:
+            stored = await self.repo.get_balances(chat_id, lock=True)
+            checkpoint = await self.repo.get_checkpoint(chat_id)
+            after_id, balances = (checkpoint[0], dict(checkpoint[1])) if checkpoint else (0, {})
+            sums, count, last_id, last_at = await self.repo.sum_ledger(chat_id, after_id)
+            for user_id, total in sums.items():
+                balances[user_id] = balances.get(user_id, 0) + total
+
+            drift = {
+                user_id: stored.get(user_id, 0) - balances.get(user_id, 0)
+                for user_id in stored.keys() | balances.keys()
+            }
+            drift = {user_id: d for user_id, d in drift.items() if d}
+            if not drift and last_at is not None and count >= checkpoint_every:
+                await self.repo.add_checkpoint(chat_id, last_id, last_at, balances)
+        except IntegrityError as e:
+            # Another verifier checkpointed the same position first
+            await self.repo.db.rollback()
+            raise ServerError() from e
+        else:
+            await self.repo.db.commit()
+        return drift
+
+    async def open_ledger(self, chat_id: int, only_pre_ledger: bool = False) -> bool:
+        """
+        Record a chat's current balances as its opening checkpoint, for chats with history
+        from before the ledger; returns False if it already has checkpoints, or with
+        `only_pre_ledger` if nothing in the chat predates its first ledger entry.
+        """
+        await self.repo.db.begin()
+
+        try:
+            stored = await self.repo.get_balances(chat_id, lock=True)
+            if await self.repo.get_checkpoint(chat_id) is not None or (
+                only_pre_ledger and await self._ledger_start(chat_id) is None
+            ):
+                await self.repo.db.rollback()
+                return False
+            _, _, last_id, _ = await self.repo.sum_ledger(chat_id, 0)
+            await self.repo.add_checkpoint(chat_id, last_id, utcnow(), stored, opening=True)
         except IntegrityError as e:
             await self.repo.db.rollback()
-            raise ServerError() from e  
+            raise ServerError() from e
+        else:
+            await self.repo.db.commit()
+        return True
+
+    async def get_balances_as_of(self, tg_chat_id: int, at: datetime) -> BalancesAsOfDTO:
+        """Everyone's balance at `at`: the latest checkpoint before it plus the entries up to it."""
+        chat = await self.repo.get_chat_by_tg_id(tg_chat_id)
+        if not chat:
+            raise ChatNotFound()
+
+        checkpoint = await self.repo.get_checkpoint(chat.id, at)
+        if checkpoint is None:
+            opened = await self.repo.get_opening_time(chat.id)
+            if opened is not None:
+                # The ledger starts at the opening checkpoint; earlier balances are unknown
+                raise BalanceHistoryUnavailable(opened)
+            started = await self._ledger_start(chat.id)
+            if started is not None:
+                # Not opened yet, and its first entries don't start from zero balances
+                raise BalanceHistoryUnavailable(started)
+        after_id, balances = (checkpoint[0], dict(checkpoint[1])) if checkpoint else (0, {})
+        sums, _, _, _ = await self.repo.sum_ledger(chat.id, after_id, until=at)
+        for user_id, total in sums.items():
+            balances[user_id] = balances.get(user_id, 0) + total
+
+        base = chat.base_currency
+        names = {
+            member.user_id: display_name(member.user)
+            for member in await self.repo.list_members(chat.id)
+        }
+        return BalancesAsOfDTO(
+            currency=base,
+            at=at,
+            balances=[
+                BalanceDTO(name=names.get(user_id, "?"), balance=from_minor(balance, base))
+                for user_id, balance in sorted(balances.items(), key=lambda b: b[1], reverse=True)
+                if balance
+            ],
+        )
+
+    # ------------------------------------------------------------------
+    # DASHBOARD
+    # ------------------------------------------------------------------
+
+    async def set_dashboard(self, tg_chat_id: int, message_id: int | None) -> None:
+        await self.repo.db.begin()
+
+        try:
+            chat = await self.repo.get_chat_by_tg_id(tg_chat_id)
+            if not chat:
+                raise ChatNotFound()
+            await self.repo.set_dashboard_message(chat.id, message_id)
         except DomainError:
             await self.repo.db.rollback()
             raise
         else:
             await self.repo.db.commit()
-    
-    async def get_expenses(self, tg_chat_id: int) -> list[ExpenseDTO]:
+            # Other processes' dashboard managers look the chat up again
+            chat_events.publish(ChatUpdated(tg_chat_id, stale=True))
+
+    async def list_dashboards(self, shard: Shard | None = None) -> list[tuple[int, int]]:
+        return await self.repo.list_dashboards(shard)
+
+    async def get_dashboard_snapshot(self, tg_chat_id: int, recent: int = 5) -> DashboardSnapshotDTO:
+        """Seed for the live dashboard; afterwards it follows ChatUpdated events."""
         chat = await self.repo.get_chat_by_tg_id(tg_chat_id)
         if not chat:
             raise ChatNotFound()
-        
-        # Get last 10 expenses
-        expenses_list = await self.repo.list_expenses(chat.id, 10)
 
-        return [
-            ExpenseDTO(
-                paid_by=(
-                    expense.payer.username
-                    if expense.payer.username
-                    else expense.payer.first_name
-                ),
-                amount=expense.amount,
-                desc=expense.description,
-                created_at=expense.created_at
-
-        ) for expense in expenses_list]
+        balances = await self.repo.list_balances(chat.id)
+        expenses = await self.repo.list_expenses(chat.id, recent)
+        return DashboardSnapshotDTO(
+            message_id=chat.dashboard_message_id,
+            currency=chat.base_currency,
+            balances=[
+                MemberBalanceDTO(user_id=b.user_id, name=display_name(b.user), balance=b.balance)
+                for b in balances
+            ],
+            recent=[_expense_dto(e, e.payer) for e in expenses],
+        )
+
+    # ------------------------------------------------------------------
+    # DIGESTS
+    # ------------------------------------------------------------------
+
+    async def set_digest(self, tg_chat_id: int, kind: str | None) -> None:
+        await self.repo.db.begin()
+
+        try:
+            chat = await self.repo.get_chat_by_tg_id(tg_chat_id)
+            if not chat:
+                raise ChatNotFound()
+            await self.repo.set_digest(chat.id, kind)
+        except DomainError:
+            await self.repo.db.rollback()
+            raise
+        else:
+            await self.repo.db.commit()
+
+    async def start_digest_run(self, run_date: date, lease: float) -> DigestRun | None:
+        """
+        The day's run with a lease on it, or None if it is finished or another
+        process is running it.
+        """
+        await self.repo.db.begin()
+
+        try:
+            run = await self.repo.get_or_create_digest_run(run_date)
+            now = utcnow()
+            leased = await self.repo.lease_digest_run(run.id, now, now + timedelta(seconds=lease))
+        except IntegrityError as e:
+            await self.repo.db.rollback()
+            raise ServerError() from e
+        else:
+            await self.repo.db.commit()
+            return run if leased else None
+
+    async def checkpoint_digest_run(
+        self, run_id: int, last_chat_id: int, sent: int, lease: float, finished: bool = False
+    ) -> None:
+        await self.repo.db.begin()
+
+        try:
+            now = utcnow()
+            await self.repo.checkpoint_digest_run(
+                run_id,
+                last_chat_id,
+                sent,
+                lease_until=None if finished else now + timedelta(seconds=lease),
+                finished_at=now if finished else None,
+            )
+        except IntegrityError as e:
+            await self.repo.db.rollback()
+            raise ServerError() from e
+        else:
+            await self.repo.db.commit()
+
+    async def get_digest_batch(
+        self, kinds: list[str], after_id: int, limit: int
+    ) -> tuple[int | None, list[DigestDTO]]:
+        """
+        Digests for the next `limit` subscribed chats after `after_id`: one keyset page
+        of chats plus one balance query for the whole page. Chats that are all square
+        get no digest. Returns the last chat id scanned (None when done) and the digests.
+        """
+        chats = await self.repo.list_digest_chats(kinds, after_id, limit)
+        if not chats:
+            return None, []
+
+        rows: dict[int, list[tuple[int, int, str]]] = defaultdict(list)
+        for chat_id, user_id, balance, username, first_name in await self.repo.list_balances_for_chats(
+            [chat_id for chat_id, *_ in chats]
+        ):
+            rows[chat_id].append((user_id, balance, username or first_name))
+
+        digests = []
+        for chat_id, tg_chat_id, kind, currency, bot in chats:
+            if not rows.get(chat_id):
+                continue
+            names = {user_id: name for user_id, _, name in rows[chat_id]}
+            balances = {user_id: balance for user_id, balance, _ in rows[chat_id]}
+            digests.append(DigestDTO(
+                chat_id=chat_id,
+                tg_chat_id=tg_chat_id,
+                kind=kind,
+                currency=currency,
+                balances=[
+                    BalanceDTO(name=name, balance=from_minor(balance, currency))
+                    for _, balance, name in rows[chat_id]
+                ],
+                settlements=[
+                    SettlementDTO(
+                        from_name=names[debtor], to_name=names[creditor], amount=from_minor(amount, currency)
+                    )
+                    for debtor, creditor, amount in settle(balances)
+                ],
+                bot=bot,
+            ))
+        return chats[-1][0], digests
+
+    # ------------------------------------------------------------------
+    # CURRENCIES
+    # ------------------------------------------------------------------
+
+    async def set_base_currency(self, tg_chat_id: int, currency: str) -> None:
+        await self.repo.db.begin()
+
+        try:
+            chat = await self.repo.get_chat_by_tg_id(tg_chat_id)
+            if not chat:
+                raise ChatNotFound()
+            # Balances are kept in the base currency at write-time rates
+            if currency != chat.base_currency and await self.repo.has_expenses(chat.id):
+                raise BaseCurrencyLocked()
+            await self.repo.set_base_currency(chat.id, currency)
+        except DomainError:
+            await self.repo.db.rollback()
+            raise
+        else:
+            await self.repo.db.commit()
+            chat_events.publish(ChatUpdated(tg_chat_id, stale=True))
+
+    async def add_rate(self, tg_chat_id: int, currency: str, rate: Decimal, on: date) -> str:
+        """
+        Record that, in this chat, 1 `currency` is worth `rate` of its base currency from
+        `on`. Only this chat's conversions use it; the global rates come from the rates
+        file. Returns the base currency.
+        """
+        await self.repo.db.begin()
+
+        try:
+            chat = await self.repo.get_chat_by_tg_id(tg_chat_id)
+            if not chat:
+                raise ChatNotFound()
+
+            base = chat.base_currency
+            if currency == base:
+                raise RateForBaseCurrency(base)
+            await self.repo.upsert_chat_fx_rate(chat.id, base, currency, on, rate)
+        except IntegrityError as e:
+            await self.repo.db.rollback()
+            raise ServerError() from e
+        except DomainError:
+            await self.repo.db.rollback()
+            raise
+        else:
+            await self.repo.db.commit()
+            chat_events.publish_rates(RatesUpdated())
+            return base
+
+    async def load_rates(self, rows: list[tuple[date, str, Decimal]]) -> None:
+        await self.repo.db.begin()
+
+        try:
+            await self.repo.upsert_fx_rates(rows)
+        except IntegrityError:
+            await self.repo.db.rollback()
+            raise
+        else:
+            await self.repo.db.commit()
+            chat_events.publish_rates(RatesUpdated())
+
+    async def _ledger_start(self, chat_id: int) -> datetime | None:
+        """
+        When the ledger of a chat never opened starts, if the chat has expenses or
+        payments from before it; None if its ledger covers all of its history.
+        """
+        started = await self.repo.get_ledger_start(chat_id)
+        # A chat's first entries are written in the transaction of the expense or
+        # payment behind them, a moment after its created_at
+        cutoff = started - timedelta(minutes=1) if started else None
+        if not await self.repo.has_history_before(chat_id, cutoff):
+            return None
+        return started or utcnow()
+
+    async def _resolve_rates(self, keys: Iterable[RateKey], chat: Chat | None = None) -> None:
+        """
+        Load every uncached (currency, day) rate with a single query, and `chat`'s own
+        rates with another if it converts from a currency other than its base.
+        """
+        keys = list(keys)
+        if chat and not fx_rates.has_chat(chat.id, chat.base_currency) and any(
+            currency != chat.base_currency for currency, _ in keys
+        ):
+            fx_rates.fill_chat(
+                chat.id, chat.base_currency, await self.repo.get_chat_fx_series(chat.id, chat.base_currency)
+            )
+
+        missing = fx_rates.missing(keys)
+        if not missing:
+            return
+
+        series = await self.repo.get_fx_series(
+            {currency for currency, _ in missing},
+            max(day for _, day in missing),
+        )
+        fx_rates.fill(missing, series)
+
+
+def display_name(user: User) -> str:
+    return user.username if user.username else user.first_name
+
+def _expense_dto(expense: AnyExpense, payer: User) -> ExpenseDTO:
+    return ExpenseDTO(
+        id=expense.id,
+        paid_by=display_name(payer),
+        amount=from_minor(expense.amount, expense.currency),
+        desc=expense.description,
+        created_at=expense.created_at,
+        currency=expense.currency,
+    )
+
+def _make_splits(expense: Expense, shares: list[tuple[int, int]], base: str) -> list[ExpenseSplit]:
+    """Split rows for `shares` (in the expense currency), recording each base-currency debit."""
+    debits = split_debits(expense.amount, shares, expense.fx_rate, expense.currency, base)
+    return [
+        ExpenseSplit(expense_id=expense.id, user_id=user_id, amount=share, base_amount=debit)
+        for (user_id, share), debit in zip(shares, debits)
+    ]
+
+def _split_deltas(expense: Expense, splits: Iterable[ExpenseSplit]) -> dict[int, int]:
+    return split_deltas(expense.payer_id, ((s.user_id, s.base_amount) for s in splits))
+
+def _recurring_dto(recurring: RecurringExpense, payer: User) -> RecurringDTO:
+    return RecurringDTO(
+        id=recurring.id,
+        paid_by=display_name(payer),
+        amount=from_minor(recurring.amount, recurring.currency),
+        currency=recurring.currency,
+        desc=recurring.description,
+        every=recurring.every,
+        unit=recurring.unit,
+        next_run_at=recurring.next_run_at,
+    )
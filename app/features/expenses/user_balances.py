@@ -0,0 +1,74 @@
+from collections import OrderedDict
+
+from app.features.expenses.dto import UserBalancesDTO
+from app.features.expenses.events import ChatUpdated, chat_events
+
+
+class UserBalancesCache:
+    """
+    Per-user cache of /mybalances views, keyed by Telegram user id.
+
+    An entry is dropped when a ChatUpdated carries a balance delta for its user,
+    when one of its chats goes stale (e.g. a base currency change) and when one of
+    its chats is renamed. A fill that raced an invalidation is not stored, so a
+    view read before a commit can't outlive it.
+    """
+    def __init__(self, max_users: int = 10_000):
+        self.max_users = max_users
+        self._views: OrderedDict[int, tuple[int, frozenset[int], UserBalancesDTO]] = OrderedDict()
+        # user_id -> telegram_user_id, for the deltas in ChatUpdated
+        self._tg_ids: dict[int, int] = {}
+        self._generation = 0
+        chat_events.subscribe(self.on_chat_updated, self.clear)
+
+    @property
+    def generation(self) -> int:
+        """Pass to put(): any invalidation in between makes put() a no-op."""
+        return self._generation
+
+    def get(self, tg_user_id: int) -> UserBalancesDTO | None:
+        entry = self._views.get(tg_user_id)
+        if entry is None:
+            return None
+        self._views.move_to_end(tg_user_id)
+        return entry[2]
+
+    def put(
+        self, generation: int, tg_user_id: int, user_id: int, tg_chat_ids: frozenset[int], view: UserBalancesDTO
+    ) -> None:
+        if generation != self._generation:
+            return
+        self._views[tg_user_id] = (user_id, tg_chat_ids, view)
+        self._tg_ids[user_id] = tg_user_id
+        if len(self._views) > self.max_users:
+            old_user_id, _, _ = self._views.popitem(last=False)[1]
+            self._tg_ids.pop(old_user_id, None)
+
+    def invalidate_chat(self, tg_chat_id: int) -> None:
+        self._generation += 1
+        for tg_user_id in [u for u, (_, chats, _) in self._views.items() if tg_chat_id in chats]:
+            self._drop(tg_user_id)
+
+    def on_chat_updated(self, event: ChatUpdated) -> None:
+        if event.stale:
+            self.invalidate_chat(event.tg_chat_id)
+        if not event.deltas:
+            return
+        self._generation += 1
+        for user_id in event.deltas:
+            tg_user_id = self._tg_ids.get(user_id)
+            if tg_user_id is not None:
+                self._drop(tg_user_id)
+
+    def clear(self) -> None:
+        self._generation += 1
+        self._views.clear()
+        self._tg_ids.clear()
+
+    def _drop(self, tg_user_id: int) -> None:
+        entry = self._views.pop(tg_user_id, None)
+        if entry:
+            self._tg_ids.pop(entry[0], None)
+
+
+user_balances = UserBalancesCache()
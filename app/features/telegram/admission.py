@@ -0,0 +1,114 @@
+import asyncio
+import logging
+from collections import Counter
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import AsyncIterator, Callable
+
+from app.features.telegram.commands.command_parser import CommandName, peek_command
+from app.features.telegram.schemas import Update
+
+logger = logging.getLogger("telegram")
+
+BUSY_TEXT = "⏳ Busy right now, please try again in a minute."
+
+
+class Priority(IntEnum):
+    WRITE = 0  # changes money or group state: always admitted
+    READ = 1   # needs the database: deferred, then shed with a short reply
+    LOW = 2    # help, buttons and plain chatter: shed silently
+
+
+_WRITES = {
+    CommandName.JOIN, CommandName.LEAVE,
+    CommandName.EXPENSE_ADD, CommandName.EXPENSE_REMOVE, CommandName.EXPENSE_EDIT,
+    CommandName.RECURRING_ADD, CommandName.RECURRING_REMOVE,
+    CommandName.DASHBOARD, CommandName.DIGEST, CommandName.CURRENCY, CommandName.RATE,
+}
+_READS = {
+    CommandName.EXPENSE_VIEW, CommandName.EXPENSE_SEARCH, CommandName.RECURRING, CommandName.HOME,
+    CommandName.MY_BALANCES,
+}
+
+
+def classify(update: Update) -> Priority:
+    if update.my_chat_member:
+        # The bot being added registers the chat and its first member
+        return Priority.WRITE
+    if update.message:
+        command = peek_command(update.message)
+        if command in _WRITES:
+            return Priority.WRITE
+        if command in _READS:
+            return Priority.READ
+    return Priority.LOW
+
+
+class AdmissionController:
+    """
+    Admission control in front of dispatch.
+
+    Writes are always admitted, so an accepted update is never lost. Reads are
+    admitted while fewer than `max_in_flight` updates are being handled and the
+    DB pool has a free connection; otherwise they wait up to `defer` seconds for
+    room, which stays well inside Telegram's webhook timeout, and are then shed.
+    Low-priority updates only get the first half of that capacity and a pool at
+    most `low_pool_usage` busy, and are shed at once.
+    """
+    def __init__(
+        self,
+        max_in_flight: int,
+        defer: float,
+        pool_usage: Callable[[], float],
+        low_pool_usage: float = 0.75,
+    ):
+        self.max_in_flight = max_in_flight
+        self.defer = defer
+        self.pool_usage = pool_usage
+        self.low_pool_usage = low_pool_usage
+        self.in_flight = 0
+        self.shed: Counter[str] = Counter()
+        self._released = asyncio.Condition()
+
+    def _has_room(self, priority: Priority) -> bool:
+        if priority is Priority.WRITE:
+            return True
+        if priority is Priority.READ:
+            return self.in_flight < self.max_in_flight and self.pool_usage() < 1.0
+        return self.in_flight < self.max_in_flight // 2 and self.pool_usage() < self.low_pool_usage
+
+    @asynccontextmanager
+    async def admit(self, priority: Priority) -> AsyncIterator[bool]:
+        """Yields whether to handle the update; the caller sends any busy reply."""
+        if not self._has_room(priority) and not await self._wait_for_room(priority):
+            self.shed[priority.name.lower()] += 1
+            logger.debug("Shed %s update (%d in flight)", priority.name, self.in_flight)
+            yield False
+            return
+
+        self.in_flight += 1
+        try:
+            yield True
+        finally:
+            self.in_flight -= 1
+            async with self._released:
+                self._released.notify_all()
+
+    async def _wait_for_room(self, priority: Priority) -> bool:
+        if priority is not Priority.READ or self.defer <= 0:
+            return False
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.defer
+        while (remaining := deadline - loop.time()) > 0:
+            # Woken when an update finishes; also re-checks the pool, which frees up separately
+            try:
+                async with self._released:
+                    await asyncio.wait_for(self._released.wait(), min(remaining, 0.05))
+            except asyncio.TimeoutError:
+                pass
+            if self._has_room(priority):
+                return True
+        return False
+
+    def stats(self) -> dict[str, int | dict[str, int]]:
+        return {"in_flight": self.in_flight, "shed": dict(self.shed)}
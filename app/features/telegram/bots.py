@@ -0,0 +1,138 @@
+import logging
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import Settings
+from app.features.expenses.profiles import profile_writes
+from app.features.expenses.repo import ExpensesRepository
+from app.features.telegram.client import ConnectionPool, Messenger, TelegramAPI
+from app.features.telegram.outbox import CoalescingMessenger
+
+logger = logging.getLogger("telegram")
+
+
+@dataclass
+class Bot:
+    name: str
+    api: TelegramAPI
+    # Replies from handlers: `api` itself, or a CoalescingMessenger over it
+    messenger: Messenger
+    secret: str | None = None
+    path: str = "/webhook"
+
+
+class BotRouter:
+    """
+    The bots hosted by this process, and which one serves each chat.
+
+    An update is handled with the bot it arrived for, and observe() records that bot
+    as the chat's: in memory, and (`persist`) written behind to Chat.bot when more
+    than one bot is hosted. Dashboards hold the router in place of a TelegramAPI, so
+    each edit goes out through the bot this process saw serving the chat. Digests and
+    recurring reports, which may run in another process than the chat's updates,
+    read Chat.bot with their claim and pass it to for_chat(). Chats without a bot
+    go through the default one. Chats of the other bots are loaded on load().
+
+    `pool`, shared by all the bots' clients, is closed with the router.
+    """
+    def __init__(self, bots: list[Bot], default: str, pool: ConnectionPool | None = None):
+        self.bots = {bot.name: bot for bot in bots}
+        self.default = self.bots[default]
+        self.pool = pool
+        self._chats: dict[int, str] = {}
+
+    def get(self, name: str) -> Bot | None:
+        return self.bots.get(name)
+
+    async def load(self, session_factory: Callable[[], AsyncSession]) -> None:
+        if len(self.bots) == 1:
+            return
+        async with session_factory() as session:
+            rows = await ExpensesRepository(session).list_chat_bots(exclude=self.default.name)
+        # Chats of a bot that is no longer configured fall back to the default one
+        self._chats = {tg_chat_id: name for tg_chat_id, name in rows if name in self.bots}
+
+    async def register(self, base_url: str) -> None:
+        """Point each bot's webhook at its path under `base_url` and publish its commands."""
+        for bot in self.bots.values():
+            await bot.api.setMyCommands(bot.api.commands)
+            await bot.api.set_webhook(url=f"{base_url}{bot.path}", secret_token=bot.secret)
+        logger.info("Registered %d bot webhooks", len(self.bots))
+
+    def observe(self, tg_chat_id: int | None, bot: Bot, persist: bool = True) -> None:
+        """Note `bot` serving the chat; `persist` only where profile_writes is flushed."""
+        if tg_chat_id is None or len(self.bots) == 1:
+            return
+        if bot is self.default:
+            self._chats.pop(tg_chat_id, None)
+        else:
+            self._chats[tg_chat_id] = bot.name
+        if persist:
+            profile_writes.observe_bot(tg_chat_id, bot.name)
+
+    def for_chat(self, tg_chat_id: int, bot: str | None = None) -> TelegramAPI:
+        """Client for the chat: `bot` as stored in Chat.bot, else the bot seen serving it here."""
+        name = bot if bot in self.bots else self._chats.get(tg_chat_id)
+        return self.bots[name].api if name else self.default.api
+
+    async def send_message(self, chat_id: int, text: str, *args: Any, **kwargs: Any) -> dict[str, Any]:
+        return await self.for_chat(chat_id).send_message(chat_id, text, *args, **kwargs)
+
+    async def edit_message_text(self, chat_id: int, message_id: int, text: str, *args: Any, **kwargs: Any) -> dict[str, Any]:
+        return await self.for_chat(chat_id).edit_message_text(chat_id, message_id, text, *args, **kwargs)
+
+    async def pin_chat_message(self, chat_id: int, message_id: int, *args: Any, **kwargs: Any) -> None:
+        await self.for_chat(chat_id).pin_chat_message(chat_id, message_id, *args, **kwargs)
+
+    async def unpin_chat_message(self, chat_id: int, message_id: int) -> None:
+        await self.for_chat(chat_id).unpin_chat_message(chat_id, message_id)
+
+    @property
+    def in_flight(self) -> int:
+        return self.pool.in_flight if self.pool else sum(bot.api.in_flight for bot in self.bots.values())
+
+    @property
+    def queued(self) -> int:
+        return sum(getattr(bot.messenger, "queued", 0) for bot in self.bots.values())
+
+    def stats(self) -> dict[str, dict[str, dict[str, float | int]]]:
+        return {name: bot.api.stats() for name, bot in self.bots.items()}
+
+    async def aclose(self) -> None:
+        for bot in self.bots.values():
+            if bot.messenger is not bot.api:
+                await bot.messenger.aclose()  # type: ignore[attr-defined]
+            await bot.api.aclose()
+        if self.pool:
+            await self.pool.aclose()
+
+
+def build_bots(settings: Settings) -> BotRouter:
+    """BOT_TOKEN's bot plus settings.BOTS, all on one connection pool."""
+    names = [settings.BOT_NAME] + [config.name for config in settings.BOTS]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Bot names must be unique, got {names}")
+
+    pool = ConnectionPool(max_connections=settings.TELEGRAM_MAX_CONNECTIONS, http2=settings.TELEGRAM_HTTP2)
+
+    def make(name: str, token: str, secret: str | None, rate: float | None, path: str) -> Bot:
+        api = TelegramAPI(
+            token,
+            retries=settings.TELEGRAM_RETRIES,
+            rate=settings.TELEGRAM_RATE if rate is None else rate,
+            pool=pool,
+        )
+        messenger = (
+            CoalescingMessenger(api, settings.REPLY_COALESCE_MS / 1000)
+            if settings.REPLY_COALESCE_MS > 0 else api
+        )
+        return Bot(name, api, messenger, secret, path)
+
+    bots = [make(settings.BOT_NAME, settings.BOT_TOKEN, settings.WEBHOOK_SECRET, None, "/webhook")]
+    bots += [
+        make(config.name, config.token, config.secret, config.rate, f"/webhook/{config.name}")
+        for config in settings.BOTS
+    ]
+    return BotRouter(bots, settings.BOT_NAME, pool)
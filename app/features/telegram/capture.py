@@ -0,0 +1,191 @@
+import asyncio
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import os
+import queue
+import re
+import secrets
+import string
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Iterator
+
+from app.features.telegram.schemas import Update
+
+logger = logging.getLogger("telegram")
+
+# Words the commands themselves parse; kept so an anonymized capture still replays the same paths
+_KEYWORDS = {"daily", "weekly", "monthly", "off", "on", "live"}
+_WORD = re.compile(r"@\w+|[^\W\d_]{4,}")
+
+
+class UpdateRecorder:
+    """
+    Opt-in capture of incoming webhook updates for replay (scripts/replay_updates.py).
+
+    record() only enqueues; a writer thread serializes each update with its arrival
+    time as a JSON line into gzip segments `capture-<start>-<pid>-<n>.jsonl.gz` in
+    `directory`, starting a new segment every `segment_records` updates. Segments are
+    never rewritten. If the writer falls `max_queue` updates behind, new ones are dropped
+    and counted rather than slowing the webhook down.
+
+    With `anonymize`, ids, names and usernames are replaced by keyed pseudonyms and
+    longer words in message text by same-length ones. The key is random per
+    recorder, so pseudonyms are consistent within a capture but can't be reversed.
+    Commands, amounts, currency codes and entity offsets are preserved.
+    """
+    def __init__(
+        self,
+        directory: str,
+        anonymize: bool = True,
+        segment_records: int = 10_000,
+        max_queue: int = 10_000,
+    ):
+        self.directory = directory
+        self.segment_records = segment_records
+        self.dropped = 0
+        self._anonymizer = _Anonymizer() if anonymize else None
+        self._queue: queue.Queue[tuple[float, Update] | None] = queue.Queue(max_queue)
+        self._thread: threading.Thread | None = None
+        self._prefix = f"capture-{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{os.getpid()}"
+
+    def start(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._write, name="update-recorder", daemon=True)
+        self._thread.start()
+        logger.info("Recording updates to %s/%s-*", self.directory, self._prefix)
+
+    async def aclose(self) -> None:
+        if self._thread:
+            self._queue.put(None)
+            await asyncio.get_running_loop().run_in_executor(None, self._thread.join)
+        if self.dropped:
+            logger.warning("Update recorder dropped %d updates", self.dropped)
+
+    def record(self, update: Update) -> None:
+        try:
+            self._queue.put_nowait((time.time(), update))
+        except queue.Full:
+            self.dropped += 1
+
+    def _write(self) -> None:
+        segment, written, out = 0, 0, None
+        try:
+            while True:
+                try:
+                    item = self._queue.get(timeout=1.0)
+                except queue.Empty:
+                    # Idle: make what's written so far readable
+                    if out:
+                        out.flush()
+                    continue
+                if item is None:
+                    return
+
+                if out is None or written >= self.segment_records:
+                    if out:
+                        out.close()
+                    path = os.path.join(self.directory, f"{self._prefix}-{segment:05d}.jsonl.gz")
+                    out = gzip.open(path, "wt", encoding="utf-8")
+                    segment, written = segment + 1, 0
+
+                at, update = item
+                payload = update.model_dump(by_alias=True, exclude_none=True)
+                if self._anonymizer:
+                    payload = self._anonymizer.update(payload)
+                out.write(json.dumps({"t": at, "update": payload}, separators=(",", ":")) + "\n")
+                written += 1
+        except Exception:
+            logger.exception("Update recorder stopped")
+        finally:
+            if out:
+                out.close()
+
+
+def read_capture(paths: list[str]) -> Iterator[tuple[float, dict[str, Any]]]:
+    """(arrival time, update payload) from capture segments, in file order."""
+    for path in paths:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            try:
+                for line in f:
+                    record = json.loads(line)
+                    yield record["t"], record["update"]
+            except (EOFError, json.JSONDecodeError):
+                # Segment cut short by a crash: keep what was readable
+                logger.warning("Capture segment %s is truncated", path)
+
+
+class _Anonymizer:
+    def __init__(self):
+        self._key = secrets.token_bytes(16)
+
+    def _digest(self, value: str) -> bytes:
+        return hmac.new(self._key, value.encode(), hashlib.sha256).digest()
+
+    def id(self, value: int) -> int:
+        # Keeps the sign (groups are negative) and private chat id == user id
+        pseudo = int.from_bytes(self._digest(str(abs(value)))[:5], "big") + 1
+        return -pseudo if value < 0 else pseudo
+
+    def word(self, value: str) -> str:
+        """Same-length pseudonym; same-length keeps message entity offsets valid."""
+        digest = self._digest(value.lower())
+        letters = string.ascii_lowercase
+        return "".join(letters[digest[i % len(digest)] % 26] for i in range(len(value)))
+
+    def text(self, text: str) -> str:
+        def replace(m: re.Match) -> str:
+            token = m.group()
+            if token.startswith("@"):
+                return "@" + self.word(token[1:])
+            if token.lower() in _KEYWORDS or any(ord(c) > 0xFFFF for c in token):
+                return token
+            return self.word(token)
+        # Leave the command itself alone
+        command, sep, rest = text.partition(" ") if text.startswith("/") else ("", "", text)
+        return command + sep + _WORD.sub(replace, rest)
+
+    def user(self, user: dict[str, Any]) -> dict[str, Any]:
+        user = dict(user, id=self.id(user["id"]), first_name=self.word(user["first_name"]))
+        for key in ("last_name", "username"):
+            if user.get(key):
+                user[key] = self.word(user[key])
+        return user
+
+    def chat(self, chat: dict[str, Any]) -> dict[str, Any]:
+        chat = dict(chat, id=self.id(chat["id"]))
+        if chat.get("title"):
+            chat["title"] = self.text(chat["title"])
+        return chat
+
+    def message(self, message: dict[str, Any]) -> dict[str, Any]:
+        message = dict(message, chat=self.chat(message["chat"]))
+        message["from"] = self.user(message["from"])
+        if message.get("text"):
+            message["text"] = self.text(message["text"])
+        if message.get("entities"):
+            message["entities"] = [
+                dict(e, user=self.user(e["user"])) if e.get("user") else e for e in message["entities"]
+            ]
+        return message
+
+    def update(self, payload: dict[str, Any]) -> dict[str, Any]:
+        payload = dict(payload)
+        if payload.get("message"):
+            payload["message"] = self.message(payload["message"])
+        if payload.get("my_chat_member"):
+            mcm = payload["my_chat_member"]
+            payload["my_chat_member"] = dict(
+                mcm, chat=self.chat(mcm["chat"]), **{"from": self.user(mcm["from"])}
+            )
+        if payload.get("callback_query"):
+            cq = payload["callback_query"]
+            cq = dict(cq, **{"from": self.user(cq["from"])})
+            if cq.get("message"):
+                cq["message"] = self.message(cq["message"])
+            payload["callback_query"] = cq
+        return payload
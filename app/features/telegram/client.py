@@ -1,9 +1,15 @@
+import asyncio
 import httpx
 import logging
+import random
+import time
+from dataclasses import dataclass
 from typing import Any, Dict, List, Optional, Protocol
 import collections
 import uuid
 
+from app.features.telegram.ratelimit import TokenBucket
+
 logger = logging.getLogger("telegram")
 
 BASE = "https://api.telegram.org"
@@ -19,16 +25,33 @@ COMMANDS_TEXT = (
     "/members — list members in this chat\n"
     "/add @user — add a member\n"
     "/remove @user — remove a member\n"
-    "/home — view group status and net balances\n\n"
+    "/home — view group status and net balances\n"
+    "/mybalances — your balances in every group (send it to me privately)\n"
+    "/dashboard [off] — pin a live balance dashboard that updates itself\n"
+    "/digest <daily|weekly|off> — get a regular summary of outstanding balances\n\n"
 
     "💰 Expenses\n"
     "/expense_view — view all expenses breakdown\n"
+    "/expense_search <words> [page] — find expenses by description\n"
     "/expense_add <Category> <Amount> [split rule] — add an expense\n"
     "  Example: /expense_add Dinner 48.50\n\n"
-    "/expense_remove <Expense ID> — remove an expense by ID\n\n"
+    "/expense_remove <Expense ID> — remove an expense by ID\n"
+    "/expense_edit <Expense ID> <Amount> [description] — correct an expense\n"
+    "  Example: /expense_edit 12 52.00 Dinner and drinks\n\n"
+    "/recurring_add <Every> <Amount> <Description> — add an expense on a schedule\n"
+    "  Every: daily, weekly, monthly, yearly or e.g. 2w, 3m\n"
+    "  Example: /recurring_add monthly 1200 Rent\n"
+    "/recurring — list recurring expenses\n"
+    "/recurring_remove <Recurring ID> — stop a recurring expense\n\n"
     "/pay @user <amount> — record a payment you made to a user\n"
     "  Example: /pay @John 25\n\n"
 
+    "💱 Currencies\n"
+    "Amounts can carry a currency, e.g. 48.50EUR. Otherwise the group's base currency is used.\n"
+    "/currency <Code> — set the group's base currency\n"
+    "/rate <Code> <Rate> [YYYY-MM-DD] — in this group, 1 <Code> is worth <Rate> of the base currency\n"
+    "  Example: /rate EUR 1.08\n\n"
+
     "🔀 Split Rules (optional)\n"
     "If omitted, expense is split equally among everyone.\n\n"
 
@@ -60,10 +83,165 @@ class Messenger(Protocol):
     ) -> dict[str, Any]:
         ...
 
+class TelegramError(RuntimeError):
+    """A Bot API call that failed: `ok` false, a non-2xx status, or a transport error after retries."""
+    def __init__(
+        self,
+        method: str,
+        description: str,
+        error_code: int | None = None,
+        retry_after: float | None = None,
+    ):
+        super().__init__(f"Telegram API error: {method} failed, {description}")
+        self.method = method
+        self.description = description
+        self.error_code = error_code
+        # Set on 429 flood control: how long Telegram wants callers to back off
+        self.retry_after = retry_after
+
+
+# Safe to repeat if the first attempt may have gone through: a second sendMessage
+# would post the message twice, a second editMessageText is at worst "not modified"
+_IDEMPOTENT = {
+    "editMessageText", "pinChatMessage", "unpinChatMessage", "answerCallbackQuery",
+    "setWebhook", "deleteWebhook", "setMyCommands", "getMe", "getUpdates",
+}
+# The request never reached Telegram: every method can be retried
+_NOT_SENT = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+# Sent, but the response was lost: only idempotent methods are retried
+_MAYBE_SENT = (httpx.ReadError, httpx.ReadTimeout, httpx.WriteError, httpx.WriteTimeout, httpx.RemoteProtocolError)
+_RETRY_STATUS = {500, 502, 503, 504}
+# Count against Telegram's per-bot message limit
+_RATE_LIMITED = {"sendMessage", "editMessageText"}
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _result(method: str, r: httpx.Response) -> Any:
+    """The `result` of a Bot API response, or TelegramError from its error fields."""
+    try:
+        data = r.json()
+    except ValueError:
+        raise TelegramError(method, f"HTTP {r.status_code}, non-JSON response", r.status_code)
+    if r.is_success and data.get("ok"):
+        return data.get("result")
+    retry_after = (data.get("parameters") or {}).get("retry_after")
+    raise TelegramError(
+        method,
+        data.get("description") or f"HTTP {r.status_code}",
+        data.get("error_code", r.status_code),
+        float(retry_after) if retry_after is not None else None,
+    )
+
+
+@dataclass
+class MethodStats:
+    calls: int = 0
+    errors: int = 0
+    retries: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+
+    def as_dict(self) -> dict[str, float | int]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "mean_ms": round(self.total_ms / self.calls, 1) if self.calls else 0.0,
+            "max_ms": round(self.max_ms, 1),
+        }
+
+
+class _CountingTransport(httpx.AsyncBaseTransport):
+    """Tracks Bot API requests in flight, reported by /healthz/ready."""
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+        self.in_flight = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.in_flight += 1
+        try:
+            return await self._transport.handle_async_request(request)
+        finally:
+            self.in_flight -= 1
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+class ConnectionPool:
+    """
+    Keep-alive HTTP/1.1 connections to the Bot API, shared by every bot a process hosts.
+
+    At most `max_connections` are open. With `http2` on they are multiplexed over
+    HTTP/2 instead, but only where the h2 package has been installed separately; it
+    is not a dependency. Waiting for a free connection counts against its own,
+    shorter timeout.
+    """
+    def __init__(self, timeout: float = 10.0, max_connections: int = 100, http2: bool = False):
+        self.http2 = http2 and _http2_available()
+        if http2 and not self.http2:
+            logger.warning("HTTP/2 is on but h2 is not installed, using HTTP/1.1 for the Bot API")
+
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=30.0,
+        )
+        self._transport = _CountingTransport(httpx.AsyncHTTPTransport(http2=self.http2, limits=limits))
+        self.client = httpx.AsyncClient(
+            base_url=BASE,
+            timeout=httpx.Timeout(timeout, pool=min(timeout, 5.0)),
+            transport=self._transport,
+        )
+
+    @property
+    def in_flight(self) -> int:
+        return self._transport.in_flight
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
 class TelegramAPI:
-    def __init__(self, token: str, timeout: float = 10.0):
+    """
+    Bot API client for one bot. Every method goes through _call(), which:
+
+    - sends over `pool`, shared with the process's other bots (a private one if
+      not given);
+    - retries transient failures up to `retries` times with full-jitter exponential
+      backoff: connect failures and pool timeouts for every method, lost responses
+      and 5xx only for idempotent ones, so a message is never posted twice;
+    - spaces sends and edits to at most `rate` per second, Telegram's limit per
+      bot, and holds them all back for a 429's retry_after (0 disables);
+    - checks `ok` uniformly and raises TelegramError (429s carry retry_after);
+    - counts calls, errors, retries and latency per method (stats()).
+    """
+    def __init__(
+        self,
+        token: str,
+        timeout: float = 10.0,
+        max_connections: int = 100,
+        http2: bool = False,
+        retries: int = 3,
+        backoff: float = 0.25,
+        max_backoff: float = 4.0,
+        rate: float = 0.0,
+        pool: ConnectionPool | None = None,
+    ):
         self.base = f"{BASE}/bot{token}"
-        self._client = httpx.AsyncClient(base_url=self.base, timeout=timeout)
+        self._path = f"/bot{token}"
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._owns_pool = pool is None
+        self.pool = pool or ConnectionPool(timeout, max_connections, http2)
+        self._limiter = TokenBucket(rate, burst=max(1, int(rate))) if rate > 0 else None
+        self._stats: dict[str, MethodStats] = collections.defaultdict(MethodStats)
         self.group = collections.defaultdict(set)
         self.expenses = collections.defaultdict(dict)
         self.commands = [
@@ -72,12 +250,76 @@ class TelegramAPI:
             {"command": "leave", "description": "Leave the group"},
             {"command": "expense_add", "description": "Add an expense"},
             {"command": "expense_view", "description": "View all expenses"},
+            {"command": "expense_search", "description": "Search expenses by description"},
+            {"command": "expense_remove", "description": "Remove an expense"},
+            {"command": "expense_edit", "description": "Correct an expense"},
+            {"command": "recurring_add", "description": "Add a recurring expense"},
+            {"command": "recurring", "description": "List recurring expenses"},
+            {"command": "recurring_remove", "description": "Stop a recurring expense"},
+            {"command": "home", "description": "View net balances"},
+            {"command": "mybalances", "description": "Your balances in every group (in private chat)"},
+            {"command": "dashboard", "description": "Pin a live balance dashboard"},
+            {"command": "digest", "description": "Daily or weekly balance digest"},
+            {"command": "currency", "description": "Set the group's base currency"},
+            {"command": "rate", "description": "Record an exchange rate for this group"},
         ]
     
     async def aclose(self) -> None:
-        """Close the underlying HTTP client (e.g. on shutdown)."""
-        await self._client.aclose()
-    
+        """Close the underlying HTTP client (e.g. on shutdown), unless it is shared."""
+        if self._owns_pool:
+            await self.pool.aclose()
+
+    @property
+    def in_flight(self) -> int:
+        return self.pool.in_flight
+
+    def stats(self) -> dict[str, dict[str, float | int]]:
+        return {method: s.as_dict() for method, s in sorted(self._stats.items())}
+
+    async def _call(self, method: str, payload: dict[str, Any] | None = None) -> Any:
+        """POST `method` and return its `result`, retrying what is safe to retry."""
+        stats = self._stats[method]
+        idempotent = method in _IDEMPOTENT
+        if self._limiter and method in _RATE_LIMITED:
+            await self._limiter.acquire()
+        started = time.perf_counter()
+        stats.calls += 1
+        try:
+            for attempt in range(self.retries + 1):
+                last = attempt == self.retries
+                try:
+                    r = await self.pool.client.post(f"{self._path}/{method}", json=payload or {})
+                except _NOT_SENT as e:
+                    if last:
+                        raise TelegramError(method, f"{type(e).__name__}: {e}") from e
+                except _MAYBE_SENT as e:
+                    if last or not idempotent:
+                        raise TelegramError(method, f"{type(e).__name__}: {e}") from e
+                except httpx.HTTPError as e:
+                    # Proxy, protocol or decoding failures: not transient, never retried
+                    raise TelegramError(method, f"{type(e).__name__}: {e}") from e
+                else:
+                    if r.status_code in _RETRY_STATUS and idempotent and not last:
+                        pass
+                    else:
+                        return _result(method, r)
+
+                stats.retries += 1
+                delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+                logger.debug("Retrying %s in %.2fs (attempt %d)", method, delay, attempt + 1)
+                await asyncio.sleep(delay)
+        except TelegramError as e:
+            stats.errors += 1
+            if e.retry_after and self._limiter:
+                # Flood control is per bot: hold back every send of this one
+                self._limiter.pause(e.retry_after)
+            logger.warning("%s", e)
+            raise
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            stats.total_ms += elapsed
+            stats.max_ms = max(stats.max_ms, elapsed)
+
     async def send_message(
         self, 
         chat_id: int, 
@@ -97,45 +339,60 @@ class TelegramAPI:
         if parse_mode: payload["parse_mode"] = parse_mode
         if reply_to_message_id: 
             payload["reply_parameters"] = {"message_id": reply_to_message_id}
-        
-        try:
-            r = await self._client.post(f"/sendMessage", json=payload)
-            r.raise_for_status()
-            
-            data = r.json()
-            if not data.get("ok"):
-                raise RuntimeError(f"Telegram API error: send message failed, {data.get('description')}")
-            
-            return data
-        except Exception as e:
-            logger.exception(f"Failed to send Telegram message: {e}")
-            raise
 
-    # A secret token to be sent in a header “X-Telegram-Bot-Api-Secret-Token” in every webhook request, 1-256 characters. Only characters A-Z, a-z, 0-9, _ and - are allowed. The header is useful to ensure that the request comes from a webhook set by you.
-    async def set_webhook(self, url: str, secret_token: str) -> Dict[str, Any]:
-        payload = {
-            "url": url,
-            "secret_token": secret_token
+        return {"ok": True, "result": await self._call("sendMessage", payload)}
+
+    async def edit_message_text(
+        self,
+        chat_id: int,
+        message_id: int,
+        text: str,
+        reply_markup: dict | None = None,
+        parse_mode: str | None = None
+    ) -> Dict[str, Any]:
+
+        payload: Dict[str, Any] = {
+            "chat_id": chat_id,
+            "message_id": message_id,
+            "text": text,
         }
 
+        if reply_markup:
+            payload["reply_markup"] = reply_markup
+        if parse_mode: payload["parse_mode"] = parse_mode
+
         try:
-            r = await self._client.post(f"/setWebhook", data=payload)
-            data = r.json()
+            return {"ok": True, "result": await self._call("editMessageText", payload)}
+        except TelegramError as e:
+            # A retried edit whose first attempt went through, or a no-op edit
+            if "message is not modified" not in e.description:
+                raise
+            return {"ok": True, "result": {"message_id": message_id, "chat": {"id": chat_id}, "text": text}}
+
+    async def pin_chat_message(self, chat_id: int, message_id: int, disable_notification: bool = True) -> None:
+        payload = {
+            "chat_id": chat_id,
+            "message_id": message_id,
+            "disable_notification": disable_notification,
+        }
+        await self._call("pinChatMessage", payload)
 
-            if not data.get("ok"):
-                raise RuntimeError(f"Telegram API error: set webhook failed, {data.get('description')}")
+    async def unpin_chat_message(self, chat_id: int, message_id: int) -> None:
+        payload = {
+            "chat_id": chat_id,
+            "message_id": message_id,
+        }
+        await self._call("unpinChatMessage", payload)
 
-            return data["result"]
-        except Exception as e:
-            logger.exception(f"Failed to set Telegram webhook: {e}")
-            raise
+    # A secret token to be sent in a header “X-Telegram-Bot-Api-Secret-Token” in every webhook request, 1-256 characters. Only characters A-Z, a-z, 0-9, _ and - are allowed. The header is useful to ensure that the request comes from a webhook set by you.
+    async def set_webhook(self, url: str, secret_token: str | None = None) -> Dict[str, Any]:
+        payload = {"url": url}
+        if secret_token:
+            payload["secret_token"] = secret_token
+        return await self._call("setWebhook", payload)
     
     async def get_updates(self, offset=None):
-        params = {
-            "offset": offset,
-        }
-        r = await self._client.get(f"/getUpdates", params=params)
-        return r.json()
+        return {"ok": True, "result": await self._call("getUpdates", {"offset": offset})}
 
     async def answer_callback_query(self, callback_query_id: str, text: str | None = None, show_alert: bool = False, url: str | None = None, cache_time: int = 0):
         payload: dict[str, Any] = {
@@ -151,7 +408,7 @@ class TelegramAPI:
         if cache_time:
             payload["cache_time"] = cache_time
         
-        await self._client.post(f"/answerCallbackQuery", json=payload)
+        await self._call("answerCallbackQuery", payload)
     
 
     async def setMyCommands(self, commands:List[Dict[str, str]], scope: Optional[Dict[str, Any]] = None, language_code: Optional[str] = None):
@@ -165,7 +422,8 @@ class TelegramAPI:
         if language_code:
             payload["language_code"] = language_code
         
-        await self._client.post(f"/setMyCommands", json=payload)
+        await self._call("setMyCommands", payload)
+
     
     # def add_user_to_group(self, username: str, chat_id: int):
     #     self.group[chat_id].add(username)
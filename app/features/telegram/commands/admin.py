@@ -13,16 +13,33 @@ COMMANDS_TEXT = (
     "/members — list members in this chat\n"
     "/add @user — add a member\n"
     "/remove @user — remove a member\n"
-    "/home — view group status and net balances\n\n"
+    "/home — view group status and net balances\n"
+    "/mybalances — your balances in every group (send it to me privately)\n"
+    "/dashboard [off] — pin a live balance dashboard that updates itself\n"
+    "/digest <daily|weekly|off> — get a regular summary of outstanding balances\n\n"
 
     "💰 Expenses\n"
     "/expense_view — view all expenses breakdown\n"
+    "/expense_search <words> [page] — find expenses by description\n"
     "/expense_add <Category> <Amount> [split rule] — add an expense\n"
     "  Example: /expense_add Dinner 48.50\n\n"
-    "/expense_remove <Expense ID> — remove an expense by ID\n\n"
+    "/expense_remove <Expense ID> — remove an expense by ID\n"
+    "/expense_edit <Expense ID> <Amount> [description] — correct an expense\n"
+    "  Example: /expense_edit 12 52.00 Dinner and drinks\n\n"
+    "/recurring_add <Every> <Amount> <Description> — add an expense on a schedule\n"
+    "  Every: daily, weekly, monthly, yearly or e.g. 2w, 3m\n"
+    "  Example: /recurring_add monthly 1200 Rent\n"
+    "/recurring — list recurring expenses\n"
+    "/recurring_remove <Recurring ID> — stop a recurring expense\n\n"
     "/pay @user <amount> — record a payment you made to a user\n"
     "  Example: /pay @John 25\n\n"
 
+    "💱 Currencies\n"
+    "Amounts can carry a currency, e.g. 48.50EUR. Otherwise the group's base currency is used.\n"
+    "/currency <Code> — set the group's base currency\n"
+    "/rate <Code> <Rate> [YYYY-MM-DD] — in this group, 1 <Code> is worth <Rate> of the base currency\n"
+    "  Example: /rate EUR 1.08\n\n"
+
     "🔀 Split Rules (optional)\n"
     "If omitted, expense is split equally among everyone.\n\n"
 
@@ -0,0 +1,51 @@
+from app.core.errors import DomainError
+from app.features.expenses.dto import ChatSummaryDTO, UserBalancesDTO
+from app.features.expenses.service import ExpensesService
+from app.features.telegram.client import Messenger
+from app.features.telegram.context import TgContext
+
+
+async def handleHome(ctx: TgContext, messenger: Messenger, svc: ExpensesService) -> None:
+    try:
+        summary = await svc.get_summary(ctx.tg_chat_id)
+    except DomainError as e:
+        await messenger.send_message(ctx.tg_chat_id, e.message, ctx.message_id)
+        return
+
+    await messenger.send_message(ctx.tg_chat_id, format_summary(summary))
+
+async def handleMyBalances(ctx: TgContext, messenger: Messenger, svc: ExpensesService) -> None:
+    if ctx.chat_type != "private":
+        await messenger.send_message(
+            ctx.tg_chat_id, "Send /mybalances to me in a private chat to see your balances in every group.", ctx.message_id
+        )
+        return
+
+    balances = await svc.get_user_balances(ctx.tg_user_id)
+    await messenger.send_message(ctx.tg_chat_id, format_user_balances(balances))
+
+def format_user_balances(view: UserBalancesDTO) -> str:
+    if not view.balances:
+        return "✅ You're settled up in every group."
+
+    lines = ["💼 Your balances", ""]
+    lines += [f"• {b.title or 'Untitled group'}: {b.balance:+} {b.currency}" for b in view.balances]
+    lines += ["", "Overall: " + ", ".join(f"{total:+} {cur}" for cur, total in view.totals.items())]
+    lines += ["", "Positive means you are owed money."]
+    return "\n".join(lines)
+
+def format_summary(summary: ChatSummaryDTO) -> str:
+    cur = summary.currency
+    lines = [f"🏠 Group status ({cur})", f"Total spent: {summary.total_spent} {cur}", ""]
+
+    if not summary.balances:
+        lines.append("No balances yet.")
+        return "\n".join(lines)
+
+    lines.append("Net balances:")
+    lines += [f"• {b.name}: {b.balance:+} {cur}" for b in summary.balances]
+
+    if summary.settlements:
+        lines += ["", "To settle up:"]
+        lines += [f"• {s.from_name} → {s.to_name}: {s.amount} {cur}" for s in summary.settlements]
+    return "\n".join(lines)
@@ -10,6 +10,18 @@ class CommandName(StrEnum):
     LEAVE = "/leave"
     EXPENSE_ADD = "/expense_add"
     EXPENSE_VIEW = "/expense_view"
+    EXPENSE_REMOVE = "/expense_remove"
+    EXPENSE_EDIT = "/expense_edit"
+    EXPENSE_SEARCH = "/expense_search"
+    RECURRING = "/recurring"
+    RECURRING_ADD = "/recurring_add"
+    RECURRING_REMOVE = "/recurring_remove"
+    HOME = "/home"
+    MY_BALANCES = "/mybalances"
+    DASHBOARD = "/dashboard"
+    DIGEST = "/digest"
+    CURRENCY = "/currency"
+    RATE = "/rate"
 
 @dataclass(frozen=True) # Immutable
 class Command:
@@ -35,23 +47,68 @@ def _slice_entity_text(text: str, entity: MessageEntity) -> str:
     end = (entity.offset + entity.length) * 2
     return utf16[start:end].decode("utf-16-le")
 
-def _slice_from_utf16_offset(text: str, utf16_offset: int) -> str:
-    """Return the substring of `text` starting at a UTF-16 code unit offset."""
+def _slice_from_utf16_offset(text: str, utf16_offset: int, utf16_end: int | None = None) -> str:
+    """Return the substring of `text` between UTF-16 code unit offsets (to the end by default)."""
     utf16 = text.encode("utf-16-le")
     start = utf16_offset * 2
-    return utf16[start:].decode("utf-16-le")
+    end = utf16_end * 2 if utf16_end is not None else None
+    return utf16[start:end].decode("utf-16-le")
+
+def peek_command(message: Message) -> CommandName | None:
+    """Just the command name, for routing decisions made before full parsing."""
+    cmd_entity = _find_command_entity(message) if message.text else None
+    if not cmd_entity:
+        return None
+    try:
+        return CommandName(_slice_entity_text(message.text or "", cmd_entity))
+    except ValueError:
+        return None
 
 def parse_command(message: Message) -> Command | None:
     if not message.text:
         return None
 
-    text = message.text
-    entities = message.entities or []
-
     cmd_entity = _find_command_entity(message)
     if not cmd_entity:
         return None
 
+    return _build_command(message.text, message.entities or [], cmd_entity)
+
+def parse_batch(message: Message) -> List[Command]:
+    """
+    One command per line, for messages pasting several (e.g. a trip's /expense_add
+    lines). Empty unless there are at least two lines and every non-blank line
+    starts with a known command; each command only sees its own line.
+    """
+    if not message.text or "\n" not in message.text:
+        return []
+
+    text = message.text
+    entities = message.entities or []
+    commands_at = {e.offset: e for e in entities if e.type == "bot_command"}
+
+    commands: List[Command] = []
+    line_start = 0
+    for line in text.split("\n"):
+        line_end = line_start + len(line.encode("utf-16-le")) // 2
+        if line.strip():
+            # Leading whitespace is spaces/tabs: one UTF-16 unit per character
+            cmd_entity = commands_at.get(line_start + len(line) - len(line.lstrip()))
+            command = _build_command(text, entities, cmd_entity, line_end) if cmd_entity else None
+            if command is None:
+                return []
+            commands.append(command)
+        line_start = line_end + 1
+
+    return commands if len(commands) > 1 else []
+
+def _build_command(
+    text: str,
+    entities: List[MessageEntity],
+    cmd_entity: MessageEntity,
+    end: int | None = None,
+) -> Command | None:
+    """The command starting at `cmd_entity`, with args and mentions up to UTF-16 offset `end`."""
     raw_cmd = _slice_entity_text(text, cmd_entity)
     try:
         cmd_name = CommandName(raw_cmd)
@@ -59,14 +116,14 @@ def parse_command(message: Message) -> Command | None:
         return None
 
     args_utf16_offset = cmd_entity.offset + cmd_entity.length
-    raw_args = _slice_from_utf16_offset(text, args_utf16_offset).lstrip()
+    raw_args = _slice_from_utf16_offset(text, args_utf16_offset, end).strip()
     args = raw_args.split() if raw_args else []
 
     mentioned_user_ids: List[int] = []
     mentioned_usernames: List[str] = []
 
     for e in entities:
-        if e is cmd_entity:
+        if e is cmd_entity or e.offset < cmd_entity.offset or (end is not None and e.offset >= end):
             continue
 
         if e.type == "text_mention" and e.user:
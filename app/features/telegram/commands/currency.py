@@ -0,0 +1,65 @@
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from app.core.errors import DomainError
+from app.features.expenses.errors import ServerError
+from app.features.expenses.fx import parse_currency
+from app.features.expenses.service import ExpensesService
+from app.features.telegram.client import Messenger
+from app.features.telegram.context import TgContext
+
+
+async def handleSetCurrency(
+    ctx: TgContext,
+    messenger: Messenger,
+    svc: ExpensesService,
+    args: list[str]
+) -> None:
+    try:
+        currency = parse_currency(args[0]) if len(args) == 1 else None
+    except ValueError:
+        currency = None
+
+    if not currency:
+        await messenger.send_message(ctx.tg_chat_id, "Usage: /currency <Code>", reply_to_message_id=ctx.message_id)
+        return
+
+    try:
+        await svc.set_base_currency(ctx.tg_chat_id, currency)
+    except DomainError as e:
+        await messenger.send_message(ctx.tg_chat_id, e.message, ctx.message_id)
+        return
+
+    await messenger.send_message(ctx.tg_chat_id, f"Base currency set to {currency}.")
+
+async def handleAddRate(
+    ctx: TgContext,
+    messenger: Messenger,
+    svc: ExpensesService,
+    args: list[str]
+) -> None:
+    try:
+        if len(args) not in (2, 3):
+            raise ValueError("Wrong number of arguments")
+        currency = parse_currency(args[0])
+        rate = Decimal(args[1])
+        if not rate.is_finite() or rate <= 0:
+            raise ValueError("Rate must be positive")
+        on = date.fromisoformat(args[2]) if len(args) == 3 else datetime.now(timezone.utc).date()
+    except (ValueError, ArithmeticError):
+        await messenger.send_message(
+            ctx.tg_chat_id,
+            "Usage: /rate <Code> <Rate> [YYYY-MM-DD]",
+            reply_to_message_id=ctx.message_id
+        )
+        return
+
+    try:
+        base = await svc.add_rate(ctx.tg_chat_id, currency, rate, on)
+    # Let telegram api retry
+    except ServerError:
+        raise
+    except DomainError as e:
+        await messenger.send_message(ctx.tg_chat_id, e.message, ctx.message_id)
+        return
+
+    await messenger.send_message(ctx.tg_chat_id, f"Rate saved for this group: 1 {currency} = {rate} {base} from {on.isoformat()}.")
@@ -0,0 +1,29 @@
+from app.core.errors import DomainError
+from app.features.expenses.service import ExpensesService
+from app.features.telegram.client import Messenger
+from app.features.telegram.context import TgContext
+from app.features.telegram.dashboard import DashboardManager
+
+
+async def handleDashboard(
+    ctx: TgContext,
+    messenger: Messenger,
+    svc: ExpensesService,
+    dashboards: DashboardManager | None,
+    args: list[str]
+) -> None:
+    if dashboards is None:
+        await messenger.send_message(ctx.tg_chat_id, "Dashboards are not available right now.", ctx.message_id)
+        return
+
+    try:
+        if args and args[0].lower() == "off":
+            if await dashboards.disable(ctx.tg_chat_id, svc):
+                await messenger.send_message(ctx.tg_chat_id, "Dashboard turned off.")
+            else:
+                await messenger.send_message(ctx.tg_chat_id, "No dashboard to turn off.", ctx.message_id)
+            return
+
+        await dashboards.enable(ctx.tg_chat_id, svc)
+    except DomainError as e:
+        await messenger.send_message(ctx.tg_chat_id, e.message, ctx.message_id)
@@ -0,0 +1,28 @@
+from app.core.errors import DomainError
+from app.features.expenses.service import ExpensesService
+from app.features.telegram.client import Messenger
+from app.features.telegram.context import TgContext
+from app.features.telegram.digests import DIGEST_KINDS
+
+
+async def handleDigest(
+    ctx: TgContext,
+    messenger: Messenger,
+    svc: ExpensesService,
+    args: list[str]
+) -> None:
+    choice = args[0].lower() if len(args) == 1 else None
+    if choice not in (*DIGEST_KINDS, "off"):
+        await messenger.send_message(ctx.tg_chat_id, "Usage: /digest <daily|weekly|off>", reply_to_message_id=ctx.message_id)
+        return
+
+    try:
+        await svc.set_digest(ctx.tg_chat_id, DIGEST_KINDS.get(choice))
+    except DomainError as e:
+        await messenger.send_message(ctx.tg_chat_id, e.message, ctx.message_id)
+        return
+
+    if choice == "off":
+        await messenger.send_message(ctx.tg_chat_id, "Balance digest turned off.")
+    else:
+        await messenger.send_message(ctx.tg_chat_id, f"You'll get a {choice} digest of outstanding balances.")
@@ -1,30 +1,58 @@
-from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+import re
+from collections import defaultdict
+from decimal import Decimal
+from typing import Sequence
 from app.core.errors import DomainError
-from app.features.expenses.errors import ServerError
+from app.features.expenses.dto import ExpenseWrite
+from app.features.expenses.errors import BatchRejected, ServerError
+from app.features.expenses.fx import parse_currency
 from app.features.expenses.service import ExpensesService
 from app.features.telegram.client import Messenger
+from app.features.telegram.commands.command_parser import Command, CommandName
 from app.features.telegram.context import TgContext
 
+# Most /expense_add lines accepted in one message
+MAX_BATCH = 50
+
 
 async def handleAddExpense(
     ctx: TgContext, 
     messenger: Messenger, 
     svc: ExpensesService,
-    args: list[str]
+    args: list[str],
+    mentioned_usernames: Sequence[str] = (),
+    mentioned_user_ids: Sequence[int] = (),
 ) -> None:
     if not args:
-        await messenger.send_message(ctx.tg_chat_id, "Usage: /expense_add <amount> <desc>", reply_to_message_id=ctx.message_id)
+        await messenger.send_message(ctx.tg_chat_id, "Usage: /expense_add <amount> <desc> [@user ...]", reply_to_message_id=ctx.message_id)
         return
     
     try:
-        amount = parse_amount(args[0])
-        desc = " ".join(args[1:])  # rest becomes description
+        amount, currency = parse_money(args[0])
+        # rest becomes description, minus the @mentions choosing who splits it
+        desc = " ".join(a for a in args[1:] if not a.startswith("@"))
+
+        split_user_ids = None
+        if mentioned_usernames or mentioned_user_ids:
+            user_ids, unresolved = await svc.resolve_mentions(
+                ctx.tg_chat_id, mentioned_usernames, mentioned_user_ids
+            )
+            if unresolved:
+                await messenger.send_message(
+                    ctx.tg_chat_id,
+                    f"Not members of this chat: {', '.join(unresolved)}. They need to /join first.",
+                    ctx.message_id
+                )
+                return
+            split_user_ids = tuple(user_ids)
 
-        await svc.add_expense(
+        expense = await svc.add_expense(
             ctx.tg_chat_id,
             ctx.tg_user_id,
             amount,
-            desc
+            desc,
+            currency,
+            split_user_ids
         )
     except ValueError:
         await messenger.send_message(
@@ -41,13 +69,145 @@ async def handleAddExpense(
             e.message,
             ctx.message_id
         )
+    else:
+        await messenger.send_message(
+            ctx.tg_chat_id,
+            f"{expense.paid_by} added #{expense.id}: {expense.amount} {expense.currency} {expense.desc}".rstrip()
+        )
+
+async def handleAddExpenseBatch(
+    ctx: TgContext,
+    messenger: Messenger,
+    svc: ExpensesService,
+    commands: list[Command],
+) -> None:
+    """Several /expense_add lines in one message: validated together, added in one transaction."""
+    if len(commands) > MAX_BATCH:
+        await messenger.send_message(ctx.tg_chat_id, f"Please send at most {MAX_BATCH} expenses at once.", ctx.message_id)
+        return
 
-def parse_amount(amount: str) -> Decimal:
     try:
-        return Decimal(amount).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-    except InvalidOperation:
+        # One lookup for every line's mentions; the per-line calls below hit the cache
+        usernames = [u for c in commands for u in c.mentioned_usernames]
+        user_ids = [i for c in commands for i in c.mentioned_user_ids]
+        if usernames or user_ids:
+            await svc.resolve_mentions(ctx.tg_chat_id, usernames, user_ids)
+
+        writes: list[ExpenseWrite] = []
+        errors: list[tuple[int, str]] = []
+        for n, command in enumerate(commands, start=1):
+            if command.name is not CommandName.EXPENSE_ADD:
+                errors.append((n, "Only /expense_add lines can be sent together."))
+                continue
+            try:
+                amount, currency = parse_money(command.args[0]) if command.args else (None, None)
+            except ValueError:
+                amount = None
+            if amount is None:
+                errors.append((n, "Please input a valid amount."))
+                continue
+
+            split_user_ids = None
+            if command.mentioned_usernames or command.mentioned_user_ids:
+                ids, unresolved = await svc.resolve_mentions(
+                    ctx.tg_chat_id, command.mentioned_usernames, command.mentioned_user_ids
+                )
+                if unresolved:
+                    errors.append((n, f"Not members of this chat: {', '.join(unresolved)}."))
+                    continue
+                split_user_ids = tuple(ids)
+
+            desc = " ".join(a for a in command.args[1:] if not a.startswith("@"))
+            writes.append(ExpenseWrite(ctx.tg_chat_id, ctx.tg_user_id, amount, desc, currency, split_user_ids))
+
+        if errors:
+            raise BatchRejected(errors)
+        expenses = await svc.add_expense_batch(ctx.tg_chat_id, writes)
+    except ServerError:
+        raise
+    except DomainError as e:
+        await messenger.send_message(ctx.tg_chat_id, e.message, ctx.message_id)
+        return
+
+    totals: dict[str, Decimal] = defaultdict(Decimal)
+    for e in expenses:
+        totals[e.currency] += e.amount
+    lines = [f"🧾 {expenses[0].paid_by} added {len(expenses)} expenses:"]
+    lines += [f"• #{e.id}: {e.amount} {e.currency} {e.desc}".rstrip() for e in expenses]
+    lines.append("Total: " + ", ".join(f"{total} {cur}" for cur, total in totals.items()))
+    await messenger.send_message(ctx.tg_chat_id, "\n".join(lines), ctx.message_id)
+
+async def handleRemoveExpense(
+    ctx: TgContext,
+    messenger: Messenger,
+    svc: ExpensesService,
+    args: list[str]
+) -> None:
+    expense_id = parse_expense_id(args[0]) if args else None
+    if expense_id is None:
+        await messenger.send_message(ctx.tg_chat_id, "Usage: /expense_remove <Expense ID>", reply_to_message_id=ctx.message_id)
+        return
+
+    try:
+        expense = await svc.remove_expense(ctx.tg_chat_id, ctx.tg_user_id, expense_id)
+    except ServerError:
+        raise
+    except DomainError as e:
+        await messenger.send_message(ctx.tg_chat_id, e.message, ctx.message_id)
+    else:
+        await messenger.send_message(
+            ctx.tg_chat_id,
+            f"Removed #{expense.id}: {expense.amount} {expense.currency} {expense.desc}".rstrip()
+        )
+
+async def handleEditExpense(
+    ctx: TgContext,
+    messenger: Messenger,
+    svc: ExpensesService,
+    args: list[str]
+) -> None:
+    expense_id = parse_expense_id(args[0]) if args else None
+    if expense_id is None or len(args) < 2:
+        await messenger.send_message(ctx.tg_chat_id, "Usage: /expense_edit <Expense ID> <amount> [desc]", reply_to_message_id=ctx.message_id)
+        return
+
+    try:
+        amount, currency = parse_money(args[1])
+        desc = " ".join(args[2:]) or None  # keep the old description if omitted
+
+        expense = await svc.edit_expense(ctx.tg_chat_id, ctx.tg_user_id, expense_id, amount, desc, currency)
+    except ValueError:
+        await messenger.send_message(ctx.tg_chat_id, "Please input a valid amount.", ctx.message_id)
+    except ServerError:
+        raise
+    except DomainError as e:
+        await messenger.send_message(ctx.tg_chat_id, e.message, ctx.message_id)
+    else:
+        await messenger.send_message(
+            ctx.tg_chat_id,
+            f"Updated #{expense_id} → #{expense.id}: {expense.amount} {expense.currency} {expense.desc}".rstrip()
+        )
+
+def parse_expense_id(token: str) -> int | None:
+    token = token.lstrip("#")
+    return int(token) if token.isdigit() else None
+
+_MONEY_RE = re.compile(r"^([A-Za-z]{3})?([0-9]+(?:\.[0-9]+)?)([A-Za-z]{3})?$")
+
+def parse_money(token: str) -> tuple[Decimal, str | None]:
+    """Parse `12.50`, `12.50EUR` or `EUR12.50` into (amount, currency or None)."""
+    m = _MONEY_RE.match(token)
+    if not m or (m.group(1) and m.group(3)):
         raise ValueError("Invalid amount format")
 
+    # Rounded to the currency's minor unit by the service, once the currency is known
+    amount = Decimal(m.group(2))
+    if amount <= 0:
+        raise ValueError("Amount must be positive")
+
+    code = m.group(1) or m.group(3)
+    return amount, parse_currency(code) if code else None
+
 async def handleListExpenses(
     ctx: TgContext, 
     messenger: Messenger, 
@@ -61,3 +221,38 @@ async def handleListExpenses(
             e.message,
             ctx.message_id
         )
+
+async def handleSearchExpenses(
+    ctx: TgContext,
+    messenger: Messenger,
+    svc: ExpensesService,
+    args: list[str]
+) -> None:
+    page = 1
+    if len(args) > 1 and args[-1].isdigit():
+        page = max(1, int(args[-1]))
+        args = args[:-1]
+
+    if not args:
+        await messenger.send_message(ctx.tg_chat_id, "Usage: /expense_search <words> [page]", reply_to_message_id=ctx.message_id)
+        return
+
+    try:
+        result = await svc.search_expenses(ctx.tg_chat_id, " ".join(args), page)
+    except DomainError as e:
+        await messenger.send_message(ctx.tg_chat_id, e.message, ctx.message_id)
+        return
+
+    if not result.results:
+        text = f"No expenses matching \"{result.query}\"."
+    else:
+        lines = [f"🔎 \"{result.query}\" (page {result.page})"]
+        lines += [
+            f"• #{e.id} {e.created_at:%Y-%m-%d} {e.paid_by}: {e.amount} {e.currency} {e.desc}".rstrip()
+            for e in result.results
+        ]
+        if result.has_more:
+            lines += ["", f"More: /expense_search {result.query} {result.page + 1}"]
+        text = "\n".join(lines)
+
+    await messenger.send_message(ctx.tg_chat_id, text, ctx.message_id)
@@ -0,0 +1,102 @@
+from app.core.errors import DomainError
+from app.features.expenses.dto import ExpenseDTO
+from app.features.expenses.errors import ServerError
+from app.features.expenses.recurrence import describe_every, parse_every
+from app.features.expenses.scheduler import RecurringReport
+from app.features.expenses.service import ExpensesService
+from app.features.telegram.bots import BotRouter
+from app.features.telegram.client import Messenger
+from app.features.telegram.commands.expenses import parse_expense_id, parse_money
+from app.features.telegram.context import TgContext
+
+
+async def handleAddRecurring(
+    ctx: TgContext,
+    messenger: Messenger,
+    svc: ExpensesService,
+    args: list[str]
+) -> None:
+    if len(args) < 2:
+        await messenger.send_message(
+            ctx.tg_chat_id,
+            "Usage: /recurring_add <daily|weekly|monthly|Nd|Nw|Nm> <amount> <desc>",
+            reply_to_message_id=ctx.message_id
+        )
+        return
+
+    try:
+        every, unit = parse_every(args[0])
+        amount, currency = parse_money(args[1])
+        desc = " ".join(args[2:])
+
+        recurring = await svc.add_recurring(
+            ctx.tg_chat_id, ctx.tg_user_id, amount, desc, every, unit, currency
+        )
+    except ValueError:
+        await messenger.send_message(ctx.tg_chat_id, "Please input a valid interval and amount.", ctx.message_id)
+    except ServerError:
+        raise
+    except DomainError as e:
+        await messenger.send_message(ctx.tg_chat_id, e.message, ctx.message_id)
+    else:
+        await messenger.send_message(
+            ctx.tg_chat_id,
+            f"🔁 Recurring #{recurring.id}: {recurring.paid_by} pays {recurring.amount} {recurring.currency} "
+            f"{recurring.desc} {describe_every(recurring.every, recurring.unit)}, starting now."
+        )
+
+async def handleListRecurring(
+    ctx: TgContext,
+    messenger: Messenger,
+    svc: ExpensesService
+) -> None:
+    try:
+        items = await svc.list_recurring(ctx.tg_chat_id)
+    except DomainError as e:
+        await messenger.send_message(ctx.tg_chat_id, e.message, ctx.message_id)
+        return
+
+    if not items:
+        await messenger.send_message(ctx.tg_chat_id, "No recurring expenses. Add one with /recurring_add.")
+        return
+
+    lines = ["🔁 Recurring expenses"]
+    lines += [
+        f"• #{r.id} {r.paid_by}: {r.amount} {r.currency} {r.desc} — "
+        f"{describe_every(r.every, r.unit)}, next {r.next_run_at:%Y-%m-%d}"
+        for r in items
+    ]
+    await messenger.send_message(ctx.tg_chat_id, "\n".join(lines))
+
+async def handleRemoveRecurring(
+    ctx: TgContext,
+    messenger: Messenger,
+    svc: ExpensesService,
+    args: list[str]
+) -> None:
+    recurring_id = parse_expense_id(args[0]) if args else None
+    if recurring_id is None:
+        await messenger.send_message(ctx.tg_chat_id, "Usage: /recurring_remove <Recurring ID>", reply_to_message_id=ctx.message_id)
+        return
+
+    try:
+        await svc.remove_recurring(ctx.tg_chat_id, ctx.tg_user_id, recurring_id)
+    except DomainError as e:
+        await messenger.send_message(ctx.tg_chat_id, e.message, ctx.message_id)
+    else:
+        await messenger.send_message(ctx.tg_chat_id, f"Recurring #{recurring_id} stopped.")
+
+async def sendRecurringReport(messenger: Messenger, tg_chat_id: int, report: RecurringReport) -> None:
+    """Tell a chat which recurring expenses the scheduler just added (or had to skip)."""
+    lines = ["🔁 Recurring expenses added:"]
+    for recurring_id, result in report:
+        if isinstance(result, ExpenseDTO):
+            lines.append(f"• #{result.id} {result.paid_by}: {result.amount} {result.currency} {result.desc}".rstrip())
+        else:
+            lines.append(f"• Recurring #{recurring_id} skipped: {result.message}")
+    await messenger.send_message(tg_chat_id, "\n".join(lines))
+
+
+async def notifyRecurring(bots: BotRouter, tg_chat_id: int, report: RecurringReport, bot: str | None) -> None:
+    """RecurringScheduler notify: report through the bot serving the chat."""
+    await sendRecurringReport(bots.for_chat(tg_chat_id, bot), tg_chat_id, report)
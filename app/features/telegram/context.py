@@ -5,6 +5,8 @@ from app.features.telegram.schemas import Update
 @dataclass(frozen=True)
 class TgContext:
     tg_chat_id: int
+    chat_type: str
+    chat_title: str | None
     tg_user_id: int
     username: str | None
     first_name: str | None
@@ -38,6 +40,8 @@ def build_context_from_update(u: Update) -> TgContext:
 
     return TgContext(
         tg_chat_id=chat.id,
+        chat_type=chat.type,
+        chat_title=chat.title,
         tg_user_id=user.id,
         username=user.username,
         first_name=user.first_name,
@@ -0,0 +1,243 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Callable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.features.expenses.dto import DashboardSnapshotDTO, ExpenseDTO
+from app.features.expenses.events import ChatUpdated, chat_events
+from app.features.expenses.money import from_minor
+from app.features.expenses.repo import ExpensesRepository, Shard
+from app.features.expenses.service import ExpensesService
+from app.features.telegram.bots import BotRouter
+from app.features.telegram.client import TelegramAPI
+
+logger = logging.getLogger("telegram")
+
+RECENT_EXPENSES = 5
+
+
+@dataclass
+class _Dashboard:
+    # None until loaded when only another process is known to have turned it on
+    message_id: int | None
+    loaded: bool = False
+    loaded_at: float = 0.0
+    currency: str = ""
+    names: dict[int, str] = field(default_factory=dict)
+    # Minor units of the base currency, as stored and as ChatUpdated deltas
+    balances: dict[int, int] = field(default_factory=dict)
+    recent: deque[ExpenseDTO] = field(default_factory=lambda: deque(maxlen=RECENT_EXPENSES))
+
+    last_text: str | None = None
+    last_edit: float = 0.0
+    task: asyncio.Task | None = None
+
+
+class DashboardManager:
+    """
+    Pinned per-chat dashboard of balances and recent expenses, edited in place.
+
+    State is seeded from the database once and then kept current from ChatUpdated
+    events, so a burst of expenses costs no extra reads. Edits are debounced to at
+    most one per chat every `interval` seconds. In a shard worker, `shard` limits
+    the dashboards loaded on start to the chats that worker owns.
+
+    Each process edits the dashboard after its own writes, so every process has to
+    know which chats have one, including those turned on or off elsewhere. Reloads
+    re-read the message id and drop the board once it is gone; a remote event, or
+    `recheck` seconds without one (there is no bus on SQLite), makes the next write
+    reload, and a write to a chat without a known board looks it up, remembering a
+    miss for `recheck` seconds.
+    """
+    def __init__(
+        self,
+        tg: TelegramAPI | BotRouter,
+        session_factory: Callable[[], AsyncSession],
+        interval: float = 5.0,
+        shard: Shard | None = None,
+        recheck: float = 60.0,
+    ):
+        self.tg = tg
+        self.session_factory = session_factory
+        self.interval = interval
+        self.shard = shard
+        self.recheck = recheck
+        self._boards: dict[int, _Dashboard] = {}
+        # Chats found without a dashboard, by when
+        self._absent: dict[int, float] = {}
+
+    async def start(self) -> None:
+        async with self.session_factory() as session:
+            svc = ExpensesService(ExpensesRepository(session))
+            for tg_chat_id, message_id in await svc.list_dashboards(self.shard):
+                self._boards[tg_chat_id] = _Dashboard(message_id=message_id)
+        chat_events.subscribe(self.on_chat_updated, self.on_reset)
+
+    async def aclose(self) -> None:
+        chat_events.unsubscribe(self.on_chat_updated, self.on_reset)
+        tasks = [b.task for b in self._boards.values() if b.task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def enable(self, tg_chat_id: int, svc: ExpensesService) -> None:
+        board = self._boards.get(tg_chat_id) or _Dashboard(message_id=None)
+        # Always from the database, another process may have turned it on or off
+        self._load(board, await self._snapshot(tg_chat_id))
+        self._absent.pop(tg_chat_id, None)
+        if board.message_id is not None:
+            self._boards[tg_chat_id] = board
+            self._schedule(tg_chat_id, board)
+            return
+
+        text = render(board)
+        data = await self.tg.send_message(tg_chat_id, text)
+        board.message_id = data["result"]["message_id"]
+        board.last_text = text
+        board.last_edit = time.monotonic()
+
+        # Before the commit, whose ChatUpdated would otherwise look the chat up again
+        self._boards[tg_chat_id] = board
+        try:
+            await svc.set_dashboard(tg_chat_id, board.message_id)
+        except Exception:
+            self._boards.pop(tg_chat_id, None)
+            raise
+        try:
+            await self.tg.pin_chat_message(tg_chat_id, board.message_id)
+        except Exception:
+            # Still usable unpinned, e.g. when the bot isn't allowed to pin
+            logger.warning("Could not pin dashboard in chat %s", tg_chat_id)
+
+    async def disable(self, tg_chat_id: int, svc: ExpensesService) -> bool:
+        board = self._boards.pop(tg_chat_id, None)
+        if board and board.task:
+            board.task.cancel()
+        self._absent[tg_chat_id] = time.monotonic()
+
+        # The board may have been turned on by another process, or off already
+        message_id = (await self._snapshot(tg_chat_id)).message_id
+        if message_id is None:
+            return False
+
+        await svc.set_dashboard(tg_chat_id, None)
+        try:
+            await self.tg.unpin_chat_message(tg_chat_id, message_id)
+        except Exception:
+            logger.warning("Could not unpin dashboard in chat %s", tg_chat_id)
+        return True
+
+    def on_chat_updated(self, event: ChatUpdated) -> None:
+        board = self._boards.get(event.tg_chat_id)
+        if event.remote:
+            # The process that made the change edits the message; just don't build on
+            # stale state, and look again in case it turned the dashboard on or off
+            self._absent.pop(event.tg_chat_id, None)
+            if board:
+                board.loaded = False
+            return
+
+        now = time.monotonic()
+        if not board:
+            missed_at = self._absent.get(event.tg_chat_id)
+            if missed_at is not None and now - missed_at < self.recheck:
+                return
+            # Possibly turned on by another process: the refresh looks it up
+            board = self._boards[event.tg_chat_id] = _Dashboard(message_id=None)
+
+        # Removals and edits can reach back past the recent list, so refill it
+        if (
+            event.stale
+            or event.removed
+            or now - board.loaded_at >= self.recheck
+            or any(user_id not in board.balances for user_id in event.deltas)
+        ):
+            board.loaded = False
+        elif board.loaded:
+            for user_id, delta in event.deltas.items():
+                board.balances[user_id] += delta
+            board.recent.extendleft(event.expenses)
+        self._schedule(event.tg_chat_id, board)
+
+    def on_reset(self) -> None:
+        self._absent.clear()
+        for board in self._boards.values():
+            board.loaded = False
+
+    def _schedule(self, tg_chat_id: int, board: _Dashboard) -> None:
+        if board.task is None:
+            board.task = asyncio.create_task(self._refresh_later(tg_chat_id, board))
+
+    async def _refresh_later(self, tg_chat_id: int, board: _Dashboard) -> None:
+        try:
+            await asyncio.sleep(max(0.0, board.last_edit + self.interval - time.monotonic()))
+            # Changes landing from here on schedule the next edit
+            board.task = None
+
+            if not board.loaded:
+                self._load(board, await self._snapshot(tg_chat_id))
+                if board.message_id is None:
+                    # Turned off, or never on
+                    if self._boards.get(tg_chat_id) is board:
+                        del self._boards[tg_chat_id]
+                    self._absent[tg_chat_id] = time.monotonic()
+                    return
+
+            text = render(board)
+            if text == board.last_text:
+                return
+            board.last_edit = time.monotonic()
+            await self.tg.edit_message_text(tg_chat_id, board.message_id, text)
+            board.last_text = text
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Failed to refresh dashboard in chat %s", tg_chat_id)
+        finally:
+            if board.task is asyncio.current_task():
+                board.task = None
+
+    async def _snapshot(self, tg_chat_id: int) -> DashboardSnapshotDTO:
+        # Separate read session: the caller's service may be about to write
+        async with self.session_factory() as session:
+            svc = ExpensesService(ExpensesRepository(session))
+            return await svc.get_dashboard_snapshot(tg_chat_id, RECENT_EXPENSES)
+
+    def _load(self, board: _Dashboard, snapshot: DashboardSnapshotDTO) -> None:
+        if snapshot.message_id != board.message_id:
+            # Turned on again elsewhere: a new message
+            board.message_id = snapshot.message_id
+            board.last_text = None
+        board.currency = snapshot.currency
+        board.names = {b.user_id: b.name for b in snapshot.balances}
+        board.balances = {b.user_id: b.balance for b in snapshot.balances}
+        board.recent.clear()
+        board.recent.extend(snapshot.recent)
+        board.loaded = True
+        board.loaded_at = time.monotonic()
+
+
+def render(board: _Dashboard) -> str:
+    cur = board.currency
+    lines = [f"📌 Centpai dashboard ({cur})", "", "Balances:"]
+    if board.balances:
+        lines += [
+            f"• {board.names.get(user_id, '?')}: {from_minor(balance, cur):+} {cur}"
+            for user_id, balance in sorted(board.balances.items(), key=lambda b: b[1], reverse=True)
+        ]
+    else:
+        lines.append("No members yet.")
+
+    lines += ["", "Recent expenses:"]
+    if board.recent:
+        lines += [f"• #{e.id} {e.paid_by}: {e.amount} {e.currency} {e.desc}".rstrip() for e in board.recent]
+    else:
+        lines.append("No expenses yet.")
+
+    lines += ["", f"Updated {datetime.now(timezone.utc):%Y-%m-%d %H:%M} UTC"]
+    return "\n".join(lines)
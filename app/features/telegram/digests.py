@@ -0,0 +1,136 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Callable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.features.expenses.dto import DigestDTO
+from app.features.expenses.models import DigestRun, utcnow
+from app.features.expenses.repo import ExpensesRepository
+from app.features.expenses.service import ExpensesService
+from app.features.telegram.bots import BotRouter
+from app.features.telegram.client import TelegramError
+from app.features.telegram.ratelimit import PerChatLimiter, TokenBucket
+
+logger = logging.getLogger("telegram")
+
+DIGEST_KINDS = {"daily": "d", "weekly": "w"}
+MAX_ATTEMPTS = 3
+
+
+class DigestScheduler:
+    """
+    Posts opt-in balance digests once a day at `hour` UTC; weekly ones on `weekday`.
+
+    Chats are streamed by keyset in pages of `batch`, each page costing two queries.
+    Sends run at most `concurrency` at a time, under a global rate limit and a
+    per-chat spacing. After each page the position is checkpointed in DigestRun, so
+    a restart resumes there and re-sends at most one page.
+    """
+    def __init__(
+        self,
+        tg: BotRouter,
+        session_factory: Callable[[], AsyncSession],
+        hour: int = 9,
+        weekday: int = 0,
+        concurrency: int = 8,
+        rate: float = 25.0,
+        batch: int = 500,
+        poll: float = 60.0,
+    ):
+        self.tg = tg
+        self.session_factory = session_factory
+        self.hour = hour
+        self.weekday = weekday
+        self.batch = batch
+        self.poll = poll
+        self.lease = poll * 5
+        self._slots = asyncio.Semaphore(concurrency)
+        self._global = TokenBucket(rate, burst=concurrency)
+        self._per_chat = PerChatLimiter()
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def aclose(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_if_due(utcnow())
+            except Exception:
+                logger.exception("Digest run failed")
+            await asyncio.sleep(self.poll)
+
+    async def run_if_due(self, now: datetime) -> int:
+        """Run (or resume) today's digests once `hour` has passed; returns messages sent."""
+        if now.hour < self.hour:
+            return 0
+
+        kinds = ["d"] + (["w"] if now.weekday() == self.weekday else [])
+        async with self.session_factory() as session:
+            run = await ExpensesService(ExpensesRepository(session)).start_digest_run(now.date(), self.lease)
+        if run is None:
+            return 0
+        return await self._fan_out(run, kinds)
+
+    async def _fan_out(self, run: DigestRun, kinds: list[str]) -> int:
+        cursor, sent = run.last_chat_id, run.sent
+        if cursor:
+            logger.info("Resuming digests for %s after chat %s", run.run_date, cursor)
+
+        while True:
+            async with self.session_factory() as session:
+                last_id, digests = await ExpensesService(ExpensesRepository(session)).get_digest_batch(
+                    kinds, cursor, self.batch
+                )
+            if last_id is not None:
+                results = await asyncio.gather(*(self._send(d) for d in digests))
+                sent += sum(results)
+                cursor = last_id
+
+            async with self.session_factory() as session:
+                await ExpensesService(ExpensesRepository(session)).checkpoint_digest_run(
+                    run.id, cursor, sent, self.lease, finished=last_id is None
+                )
+            if last_id is None:
+                logger.info("Sent %d digests for %s", sent, run.run_date)
+                return sent
+
+    async def _send(self, digest: DigestDTO) -> bool:
+        async with self._slots:
+            await self._per_chat.acquire(digest.tg_chat_id)
+            for attempt in range(MAX_ATTEMPTS):
+                await self._global.acquire()
+                try:
+                    await self.tg.for_chat(digest.tg_chat_id, digest.bot).send_message(
+                        digest.tg_chat_id, render_digest(digest)
+                    )
+                    return True
+                except TelegramError as e:
+                    if e.error_code != 429 or attempt == MAX_ATTEMPTS - 1:
+                        break
+                    # Flood control applies to the whole bot: hold every sender back
+                    self._global.pause(e.retry_after or 1)
+                except Exception:
+                    break
+            # Bot removed from the chat, chat gone, ...: skip it, the run goes on
+            logger.warning("Could not send digest to chat %s", digest.tg_chat_id)
+            return False
+
+
+def render_digest(digest: DigestDTO) -> str:
+    cur = digest.currency
+    title = "Daily" if digest.kind == "d" else "Weekly"
+    lines = [f"🗓 {title} digest ({cur})", "", "Outstanding balances:"]
+    lines += [f"• {b.name}: {b.balance:+} {cur}" for b in digest.balances]
+    if digest.settlements:
+        lines += ["", "To settle up:"]
+        lines += [f"• {s.from_name} → {s.to_name}: {s.amount} {cur}" for s in digest.settlements]
+    lines += ["", "Turn off with /digest off"]
+    return "\n".join(lines)
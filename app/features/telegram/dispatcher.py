@@ -0,0 +1,127 @@
+from app.core.profiler import profiler
+from app.features.expenses.service import ExpensesService
+from app.features.telegram.client import Messenger
+from app.features.telegram.commands.admin import handleHelp, handleInit
+from app.features.telegram.commands.balances import handleHome, handleMyBalances
+from app.features.telegram.commands.command_parser import CommandName, parse_batch, parse_command
+from app.features.telegram.commands.currency import handleAddRate, handleSetCurrency
+from app.features.telegram.commands.dashboard import handleDashboard
+from app.features.telegram.commands.digest import handleDigest
+from app.features.telegram.commands.expenses import (
+    handleAddExpense, handleAddExpenseBatch, handleEditExpense, handleListExpenses, handleRemoveExpense,
+    handleSearchExpenses,
+)
+from app.features.telegram.commands.members import handleJoin
+from app.features.telegram.commands.recurring import handleAddRecurring, handleListRecurring, handleRemoveRecurring
+from app.features.telegram.context import build_context_from_update
+from app.features.telegram.dashboard import DashboardManager
+from app.features.telegram.schemas import Update
+
+
+def update_chat_id(update: Update) -> int | None:
+    """Telegram chat an update belongs to, if any."""
+    if update.message:
+        return update.message.chat.id
+    if update.my_chat_member:
+        return update.my_chat_member.chat.id
+    if update.callback_query and update.callback_query.message:
+        return update.callback_query.message.chat.id
+    return None
+
+async def dispatch_update(
+    update: Update,
+    tg: Messenger,
+    svc: ExpensesService,
+    dashboards: DashboardManager | None = None,
+) -> None:
+    ctx = build_context_from_update(update)
+    svc.refresh_chat_title(ctx.tg_chat_id, ctx.chat_title)
+
+    # For initial welcome message
+    if update.my_chat_member:
+        bot_status_change = update.my_chat_member
+
+        old_status = bot_status_change.old_chat_member.status
+        new_status = bot_status_change.new_chat_member.status
+
+        if old_status in ("kicked", "left") and new_status in ("member", "administrator"):
+            # bot just added to the group, send welcome message
+            await handleInit(ctx, tg, svc)
+
+    if update.message:
+        # Keeps display names and @mention lookups current; no write unless they changed
+        svc.refresh_profile(ctx.tg_user_id, ctx.username, ctx.first_name, ctx.last_name)
+
+        command = parse_command(update.message)
+        if profiler.active:
+            profiler.tag(ctx.tg_chat_id, command.name if command else None)
+
+        if command:
+            match command.name:
+                case CommandName.HELP:
+                    await handleHelp(ctx, tg)
+                case CommandName.JOIN:
+                    await handleJoin(ctx, tg, svc)
+                case CommandName.EXPENSE_ADD:
+                    # Several pasted /expense_add lines go through as one batch
+                    batch = parse_batch(update.message)
+                    if batch:
+                        await handleAddExpenseBatch(ctx, tg, svc, batch)
+                    else:
+                        await handleAddExpense(
+                            ctx, tg, svc, command.args, command.mentioned_usernames, command.mentioned_user_ids
+                        )
+                case CommandName.EXPENSE_VIEW:
+                    await handleListExpenses(ctx, tg, svc)
+                case CommandName.EXPENSE_REMOVE:
+                    await handleRemoveExpense(ctx, tg, svc, command.args)
+                case CommandName.EXPENSE_EDIT:
+                    await handleEditExpense(ctx, tg, svc, command.args)
+                case CommandName.EXPENSE_SEARCH:
+                    await handleSearchExpenses(ctx, tg, svc, command.args)
+                case CommandName.RECURRING_ADD:
+                    await handleAddRecurring(ctx, tg, svc, command.args)
+                case CommandName.RECURRING:
+                    await handleListRecurring(ctx, tg, svc)
+                case CommandName.RECURRING_REMOVE:
+                    await handleRemoveRecurring(ctx, tg, svc, command.args)
+                case CommandName.HOME:
+                    await handleHome(ctx, tg, svc)
+                case CommandName.MY_BALANCES:
+                    await handleMyBalances(ctx, tg, svc)
+                case CommandName.DASHBOARD:
+                    await handleDashboard(ctx, tg, svc, dashboards, command.args)
+                case CommandName.DIGEST:
+                    await handleDigest(ctx, tg, svc, command.args)
+                case CommandName.CURRENCY:
+                    await handleSetCurrency(ctx, tg, svc, command.args)
+                case CommandName.RATE:
+                    await handleAddRate(ctx, tg, svc, command.args)
+
+    # For button clicks
+    # if update.callback_query:
+    #     cq = update.callback_query
+    #     callback_id = cq.id
+    #     data = cq.data
+
+    #     # message can be None in some callback scenarios
+    #     if cq.message is None:
+    #         await tg.answer_callback_query(callback_query_id=callback_id, text="Unsupported action.")
+    #         return
+
+    #     chat_id = cq.message.chat.id
+    #     username = cq.from_.username
+
+    #     if data == "join_group":
+    #         tg.add_user_to_group(username=username, chat_id=chat_id)
+    #         await tg.send_message(chat_id=chat_id, text=f"{username} joined the group.")
+    #         await tg.send_home_message(chat_id=chat_id)
+    #     elif data == "leave_group":
+    #         tg.remove_user_from_group(username=username, chat_id=chat_id)
+    #         await tg.send_message(chat_id=chat_id, text=f"{username} left the group.")
+    #         await tg.send_home_message(chat_id=chat_id)
+    #     elif data == "help":
+    #         await tg.send_message(chat_id=chat_id, text="Centpai works like this: ...")
+
+
+    #     await tg.answer_callback_query(callback_query_id=callback_id)
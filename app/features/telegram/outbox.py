@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict
+
+from app.features.telegram.client import TelegramAPI
+
+logger = logging.getLogger("telegram")
+
+# Bot API limit for message text
+MAX_TEXT = 4096
+
+
+@dataclass
+class _ChatOutbox:
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    pending: list[str] = field(default_factory=list)
+    waiters: list["asyncio.Future[Dict[str, Any]]"] = field(default_factory=list)
+    timer: asyncio.Task | None = None
+
+    # The open coalesced message that later confirmations are edited into
+    message_id: int | None = None
+    lines: list[str] = field(default_factory=list)
+    opened_at: float = 0.0
+
+
+class CoalescingMessenger:
+    """
+    Messenger that merges bursts of plain confirmations per chat.
+
+    Plain messages (no reply, keyboard or parse mode) sent to a chat within
+    `window` seconds of each other go out as one message. Confirmations arriving
+    while that message is younger than `keep_open` are appended to it with
+    editMessageText instead of posting a new one. Any other message flushes the
+    buffer first and closes the open message, so the chat order is preserved.
+    """
+    def __init__(self, tg: TelegramAPI, window: float, keep_open: float = 30.0):
+        self.tg = tg
+        self.window = window
+        self.keep_open = keep_open
+        self._boxes: dict[int, _ChatOutbox] = {}
+
+    async def send_message(
+        self,
+        chat_id: int,
+        text: str,
+        reply_to_message_id: int | None = None,
+        reply_markup: dict | None = None,
+        parse_mode: str | None = None,
+    ) -> Dict[str, Any]:
+        if reply_to_message_id or reply_markup or parse_mode:
+            box = self._boxes.pop(chat_id, None)
+            if box:
+                await self._flush(box, chat_id)
+            return await self.tg.send_message(chat_id, text, reply_to_message_id, reply_markup, parse_mode)
+
+        box = self._boxes.setdefault(chat_id, _ChatOutbox())
+        fut: asyncio.Future[Dict[str, Any]] = asyncio.get_running_loop().create_future()
+        box.pending.append(text)
+        box.waiters.append(fut)
+        if box.timer is None:
+            box.timer = asyncio.create_task(self._flush_later(box, chat_id))
+        return await fut
+
+    @property
+    def queued(self) -> int:
+        """Confirmations buffered and not yet sent."""
+        return sum(len(box.pending) for box in self._boxes.values())
+
+    async def aclose(self) -> None:
+        """Flush everything still buffered (e.g. on shutdown)."""
+        boxes, self._boxes = self._boxes, {}
+        await asyncio.gather(*(self._flush(box, chat_id) for chat_id, box in boxes.items()))
+
+    async def _flush_later(self, box: _ChatOutbox, chat_id: int) -> None:
+        await asyncio.sleep(self.window)
+        box.timer = None
+        await self._flush(box, chat_id)
+
+        # Forget the chat once its message can no longer be extended
+        asyncio.get_running_loop().call_later(self.keep_open, self._expire, box, chat_id)
+
+    def _expire(self, box: _ChatOutbox, chat_id: int) -> None:
+        if self._boxes.get(chat_id) is box and not box.pending and not self._is_open(box):
+            del self._boxes[chat_id]
+
+    def _is_open(self, box: _ChatOutbox) -> bool:
+        return box.message_id is not None and time.monotonic() - box.opened_at < self.keep_open
+
+    async def _flush(self, box: _ChatOutbox, chat_id: int) -> None:
+        if box.timer and box.timer is not asyncio.current_task():
+            box.timer.cancel()
+            box.timer = None
+
+        async with box.lock:
+            texts, waiters = box.pending, box.waiters
+            box.pending, box.waiters = [], []
+            if not texts:
+                return
+
+            try:
+                data = await self._deliver(box, chat_id, texts)
+            except Exception as e:
+                box.message_id = None
+                for fut in waiters:
+                    if not fut.done():
+                        fut.set_exception(e)
+                return
+
+            logger.debug("Coalesced %d messages for chat %s", len(texts), chat_id)
+            for fut in waiters:
+                if not fut.done():
+                    fut.set_result(data)
+
+    async def _deliver(self, box: _ChatOutbox, chat_id: int, texts: list[str]) -> Dict[str, Any]:
+        lines = box.lines + texts
+        if self._is_open(box) and len("\n".join(lines)) <= MAX_TEXT:
+            assert box.message_id is not None
+            data = await self.tg.edit_message_text(chat_id, box.message_id, "\n".join(lines))
+            box.lines = lines
+            return data
+
+        data: Dict[str, Any] = {}
+        for chunk in _chunks(texts):
+            data = await self.tg.send_message(chat_id, "\n".join(chunk))
+            box.message_id = data["result"]["message_id"]
+            box.lines = chunk
+            box.opened_at = time.monotonic()
+        return data
+
+
+def _chunks(texts: list[str]) -> list[list[str]]:
+    """Group lines into messages that fit the Bot API text limit."""
+    chunks: list[list[str]] = [[]]
+    size = 0
+    for text in texts:
+        if chunks[-1] and size + 1 + len(text) > MAX_TEXT:
+            chunks.append([])
+            size = 0
+        size += len(text) + (1 if chunks[-1] else 0)
+        chunks[-1].append(text)
+    return chunks
@@ -0,0 +1,56 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    Async token bucket: on average `rate` acquisitions per second, bursts up to `burst`.
+    pause() holds every caller back, e.g. for a 429's retry_after.
+    """
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        # One waiter at a time keeps callers in FIFO order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class PerChatLimiter:
+    """
+    Minimum spacing between sends to the same chat. Telegram allows about one
+    message per second in a private chat and 20 per minute in a group.
+    """
+    def __init__(self, private_interval: float = 1.0, group_interval: float = 3.0):
+        self.private_interval = private_interval
+        self.group_interval = group_interval
+        self._next: dict[int, float] = {}
+
+    async def acquire(self, chat_id: int) -> None:
+        interval = self.group_interval if chat_id < 0 else self.private_interval
+        now = time.monotonic()
+        if len(self._next) > 10_000:
+            self._next = {c: t for c, t in self._next.items() if t > now}
+        at = max(now, self._next.get(chat_id, 0.0))
+        self._next[chat_id] = at + interval
+        if at > now:
+            await asyncio.sleep(at - now)
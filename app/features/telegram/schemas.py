@@ -11,6 +11,7 @@ class User(BaseModel):
 class Chat(BaseModel):
     id: int
     type: str
+    title: str | None = None
 
 class MessageEntity(BaseModel):
     type: str
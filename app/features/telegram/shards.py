@@ -0,0 +1,300 @@
+import asyncio
+import logging
+import multiprocessing as mp
+import queue as queues
+from functools import partial
+from multiprocessing.process import BaseProcess
+from multiprocessing.queues import Queue
+
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+
+from app.features.telegram.dispatcher import update_chat_id
+from app.features.telegram.schemas import Update
+
+logger = logging.getLogger(__name__)
+
+# Spawned workers import the app fresh: their own engine pool, HTTP client and caches
+_mp = mp.get_context("spawn")
+
+# An update whose worker died this many times while it was unhandled is dropped
+MAX_DELIVERIES = 3
+RETRY_BACKOFF = 0.5
+RETRY_MAX_BACKOFF = 5.0
+
+
+def shard_for(tg_chat_id: int | None, n_shards: int) -> int:
+    """Stable chat -> shard mapping (Python's % is non-negative for negative chat ids)."""
+    if tg_chat_id is None:
+        return 0
+    return tg_chat_id % n_shards
+
+
+class ShardPool:
+    """
+    Chat-partitioned dispatch across worker processes.
+
+    The web process only validates and forwards updates; each worker owns a fixed
+    shard of chats, so per-chat ordering and in-process caches stay single-owner.
+    Workers also run the recurring scheduler for their own chats.
+    Run uvicorn with a single worker when this is enabled, otherwise chats are
+    split across front processes again.
+
+    Updates are acked to Telegram once queued, so the pool keeps each one until its
+    worker reports it handled. A supervisor checks the workers every
+    `check_interval` seconds and respawns dead ones on a fresh queue, refilled with
+    the dead worker's unhandled updates in order; one that was mid-flight may run
+    twice. Each shard holds at most `queue_size` unhandled updates (0 for no
+    bound). submit() refuses updates for a dead or full shard, so the webhook can
+    answer 503 and Telegram delivers them again later.
+    """
+    def __init__(self, n_workers: int, queue_size: int = 0, check_interval: float = 1.0):
+        self.n_workers = n_workers
+        self.queue_size = queue_size
+        self.check_interval = check_interval
+        self.respawns = 0
+        self.redelivered = 0
+        self._queues: list[Queue] = []
+        self._procs: list[BaseProcess] = []
+        # Per shard, by sequence number: the queued item and how often it was delivered
+        self._pending: list[dict[int, tuple[tuple, int]]] = []
+        self._acks: Queue = _mp.Queue()
+        self._seq = 0
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        for shard in range(self.n_workers):
+            queue, proc = self._spawn(shard)
+            self._queues.append(queue)
+            self._procs.append(proc)
+            self._pending.append({})
+        self._task = asyncio.create_task(self._supervise())
+        logger.info("Started %d shard workers", self.n_workers)
+
+    def _spawn(self, shard: int) -> tuple[Queue, BaseProcess]:
+        # Unbounded: submit() limits the unhandled updates, and a respawn requeues them all
+        queue = _mp.Queue()
+        proc = _mp.Process(
+            target=_worker_main,
+            args=(shard, self.n_workers, queue, self._acks),
+            name=f"centpai-shard-{shard}",
+            daemon=True,
+        )
+        proc.start()
+        return queue, proc
+
+    async def _supervise(self) -> None:
+        while True:
+            await asyncio.sleep(self.check_interval)
+            self._drain_acks()
+            for shard, proc in enumerate(self._procs):
+                if proc.is_alive():
+                    continue
+                logger.error("Shard worker %s died with exit code %s, respawning", proc.name, proc.exitcode)
+                proc.join()
+                # Acks it sent before dying
+                self._drain_acks()
+                self._queues[shard].close()
+                self._queues[shard], self._procs[shard] = self._spawn(shard)
+                self.respawns += 1
+                self._requeue(shard)
+
+    def _requeue(self, shard: int) -> None:
+        pending = self._pending[shard]
+        for seq, (item, deliveries) in list(pending.items()):
+            if deliveries >= MAX_DELIVERIES:
+                logger.error(
+                    "Dropping update %s: shard %d died %d times with it unhandled", item[2].get("update_id"), shard, deliveries
+                )
+                del pending[seq]
+                continue
+            pending[seq] = (item, deliveries + 1)
+            self._queues[shard].put_nowait(item)
+            self.redelivered += 1
+
+    def _drain_acks(self) -> None:
+        while True:
+            try:
+                shard, seq = self._acks.get_nowait()
+            except queues.Empty:
+                return
+            self._pending[shard].pop(seq, None)
+
+    def submit(self, update: Update, bot: str) -> bool:
+        """
+        Queue `update`, received for hosted bot `bot`, to the shard owning its chat.
+        False if that shard's worker is down or has `queue_size` updates unhandled.
+        """
+        shard = shard_for(update_chat_id(update), self.n_workers)
+        if not self._procs[shard].is_alive():
+            return False
+        self._drain_acks()
+        pending = self._pending[shard]
+        if self.queue_size and len(pending) >= self.queue_size:
+            logger.warning("Shard %d queue is full, refusing update %s", shard, update.update_id)
+            return False
+
+        self._seq += 1
+        item = (self._seq, bot, update.model_dump(by_alias=True, exclude_none=True))
+        pending[self._seq] = (item, 1)
+        # Hands off to the queue's feeder thread, so this doesn't block the loop
+        self._queues[shard].put_nowait(item)
+        return True
+
+    def stats(self) -> list[dict[str, bool | int]]:
+        self._drain_acks()
+        return [
+            {"alive": proc.is_alive(), "pid": proc.pid or 0, "pending": len(pending)}
+            for proc, pending in zip(self._procs, self._pending)
+        ]
+
+    async def aclose(self, timeout: float = 10.0) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        loop = asyncio.get_running_loop()
+        for queue in self._queues:
+            try:
+                # Behind whatever is still queued; a full queue may block for a while
+                await loop.run_in_executor(None, partial(queue.put, None, timeout=timeout))
+            except queues.Full:
+                pass
+        for proc in self._procs:
+            await loop.run_in_executor(None, proc.join, timeout)
+            if proc.is_alive():
+                logger.warning("Shard worker %s did not stop in time", proc.name)
+                proc.terminate()
+
+
+def _transient(e: DBAPIError) -> bool:
+    """A lost connection, failover or similar, where the same update may well succeed again."""
+    return isinstance(e, (OperationalError, InterfaceError)) or e.connection_invalidated
+
+
+def _worker_main(shard: int, n_shards: int, queue: Queue, acks: Queue) -> None:
+    from app.core.logging import setup_logging
+
+    setup_logging()
+    asyncio.run(_serve(shard, n_shards, queue, acks))
+
+
+async def _serve(shard: int, n_shards: int, queue: Queue, acks: Queue) -> None:
+
+    from app.core.config import settings
+    from app.core.health import LoopMonitor
+    from app.db.database import ReplicaMonitor, SessionLocal, engine
+    from app.features.expenses.coalescer import ExpenseWriteCoalescer
+    from app.features.expenses.invalidation import InvalidationBus
+    from app.features.expenses.profiles import profile_writes
+    from app.features.expenses.repo import ExpensesRepository
+    from app.features.expenses.scheduler import RecurringScheduler
+    from app.features.expenses.service import ExpensesService
+    from app.features.telegram.admission import Priority, classify
+    from app.features.telegram.bots import Bot, build_bots
+    from app.features.telegram.commands.recurring import notifyRecurring
+    from app.features.telegram.dashboard import DashboardManager
+    from app.features.telegram.dispatcher import dispatch_update
+
+    # Handlers run here, so this is the loop worth watching; stalls are logged
+    loop_monitor = LoopMonitor(slow=settings.LOOP_SLOW_MS / 1000)
+    loop_monitor.start()
+    replicas = ReplicaMonitor()
+    replicas.start()
+    invalidation = (
+        InvalidationBus(engine, settings.INVALIDATION_TTL_S)
+        if settings.INVALIDATION_TTL_S > 0 and engine.dialect.name == "postgresql" else None
+    )
+    if invalidation:
+        invalidation.start()
+    # Webhooks are registered by the web process; this one only sends
+    bots = build_bots(settings)
+    await bots.load(SessionLocal)
+    dashboards = DashboardManager(
+        bots,
+        SessionLocal,
+        settings.DASHBOARD_EDIT_INTERVAL_S,
+        shard=(shard, n_shards),
+        recheck=settings.DASHBOARD_RECHECK_S,
+    )
+    await dashboards.start()
+    profile_writes.start(SessionLocal, settings.PROFILE_FLUSH_S)
+    writes = (
+        ExpenseWriteCoalescer(SessionLocal, settings.EXPENSE_COALESCE_MS / 1000)
+        if settings.EXPENSE_COALESCE_MS > 0 else None
+    )
+    # Here rather than in the web process, so the expenses' ChatUpdated events reach
+    # this shard's dashboards, search index and mention cache
+    recurring = (
+        RecurringScheduler(
+            SessionLocal,
+            settings.RECURRING_POLL_S,
+            notify=partial(notifyRecurring, bots),
+            shard=(shard, n_shards),
+        )
+        if settings.RECURRING_POLL_S > 0 else None
+    )
+    if recurring:
+        recurring.start()
+
+    # Updates of one chat run strictly in order; different chats run concurrently
+    tails: dict[int | None, asyncio.Task] = {}
+
+    async def handle(prev: asyncio.Task | None, seq: int, update: Update, bot: Bot) -> None:
+        if prev:
+            await asyncio.wait([prev])
+        # Already acked to Telegram, which won't deliver it again: a write that hits a
+        # transient database error is retried here instead. Handlers reply after their
+        # commit, so a failed attempt has normally not replied yet.
+        retries = settings.DISPATCH_RETRIES if classify(update) is Priority.WRITE else 0
+        try:
+            for attempt in range(retries + 1):
+                try:
+                    bots.observe(update_chat_id(update), bot)
+                    async with SessionLocal() as session:
+                        svc = ExpensesService(ExpensesRepository(session), writes)
+                        await dispatch_update(update, bot.messenger, svc, dashboards)
+                    break
+                except DBAPIError as e:
+                    if attempt == retries or not _transient(e):
+                        raise
+                    logger.warning(
+                        "Shard %d retrying update %s after a database error", shard, update.update_id, exc_info=True
+                    )
+                    await asyncio.sleep(min(RETRY_MAX_BACKOFF, RETRY_BACKOFF * 2 ** attempt))
+        except Exception:
+            logger.exception("Shard %d failed to handle update %s", shard, update.update_id)
+        finally:
+            acks.put_nowait((shard, seq))
+
+    def forget(chat_id: int | None, task: asyncio.Task) -> None:
+        if tails.get(chat_id) is task:
+            del tails[chat_id]
+
+    loop = asyncio.get_running_loop()
+    logger.info("Shard %d ready", shard)
+    try:
+        while True:
+            item = await loop.run_in_executor(None, queue.get)
+            if item is None:
+                break
+
+            seq, name, payload = item
+            update = Update.model_validate(payload)
+            chat_id = update_chat_id(update)
+            task = asyncio.create_task(handle(tails.get(chat_id), seq, update, bots.get(name) or bots.default))
+            tails[chat_id] = task
+            task.add_done_callback(lambda t, c=chat_id: forget(c, t))
+    finally:
+        if recurring:
+            await recurring.aclose()
+        if tails:
+            await asyncio.wait(list(tails.values()))
+        if writes:
+            await writes.aclose()
+        await dashboards.aclose()
+        await profile_writes.aclose(SessionLocal)
+        await bots.aclose()
+        if invalidation:
+            await invalidation.aclose()
+        await replicas.aclose()
+        await loop_monitor.aclose()
+        logger.info("Shard %d stopped", shard)
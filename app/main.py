@@ -1,37 +1,149 @@
+import secrets
+from dataclasses import asdict
+from datetime import datetime, timedelta, timezone
 from contextlib import asynccontextmanager
+from functools import partial
 from typing import Union
-from fastapi import Depends, FastAPI, Request
+from fastapi import Depends, FastAPI, Header, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from app.features.expenses.repo import ExpensesRepository, get_repo
 from app.features.expenses.service import ExpensesService, get_service
-from app.features.telegram.commands.admin import handleHelp, handleInit
-from app.features.telegram.commands.command_parser import CommandName, parse_command
-from app.features.telegram.commands.expenses import handleAddExpense, handleListExpenses
-from app.features.telegram.commands.members import handleJoin
-from app.features.telegram.context import build_context_from_update
+from app.features.expenses.archive import ExpenseArchiver
+from app.features.expenses.errors import ChatNotFound
+from app.features.expenses.invalidation import InvalidationBus
+from app.features.expenses.ledger import LedgerVerifier
+from app.features.expenses.coalescer import ExpenseWriteCoalescer
+from app.features.expenses.fx import read_rates_file
+from app.features.expenses.profiles import profile_writes
+from app.features.expenses.scheduler import RecurringScheduler
+from app.features.telegram.dashboard import DashboardManager
+from app.features.telegram.digests import DigestScheduler
+from app.features.telegram.commands.recurring import notifyRecurring
+from app.features.telegram.admission import BUSY_TEXT, AdmissionController, Priority, classify
+from app.features.telegram.capture import UpdateRecorder
+from app.features.telegram.bots import BotRouter, build_bots
+from app.features.telegram.dispatcher import dispatch_update, update_chat_id
 from app.features.telegram.schemas import Update
+from app.features.telegram.shards import ShardPool
+from app.core.health import LoopMonitor
+from app.core.profiler import profiler
 from app.core.logging import setup_logging
-from app.features.telegram import client
+from app.features.telegram.client import Messenger
 from app.core.config import settings
-from app.db.database import get_session, init_db, init_reset_db_dev
+from app.core.errors import DomainError
+from app.db.database import ReplicaMonitor, SessionLocal, engine, get_session, init_db, init_reset_db_dev, pool_stats
 from sqlalchemy.ext.asyncio import AsyncSession
 
 setup_logging()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    app.state.loop_monitor = LoopMonitor(slow=settings.LOOP_SLOW_MS / 1000)
+    app.state.loop_monitor.start()
+
+    if settings.CAPTURE_DIR:
+        app.state.recorder = UpdateRecorder(settings.CAPTURE_DIR, settings.CAPTURE_ANONYMIZE)
+        app.state.recorder.start()
+
     # await init_reset_db_dev() #dev purposes
     await init_db()
 
-    tg = client.TelegramAPI(settings.BOT_TOKEN)
-    await tg.setMyCommands(tg.commands)
-    await tg.set_webhook(
-        url=f"{settings.NGROK_URL}/webhook", 
-        secret_token="test_secret")
-    app.state.telegram = tg
+    replicas = ReplicaMonitor()
+    replicas.start()
+
+    # Other processes' writes evict this one's caches, and vice versa
+    invalidation = (
+        InvalidationBus(engine, settings.INVALIDATION_TTL_S)
+        if settings.INVALIDATION_TTL_S > 0 and engine.dialect.name == "postgresql" else None
+    )
+    if invalidation:
+        invalidation.start()
+
+    if settings.FX_RATES_FILE:
+        async with SessionLocal() as session:
+            svc = ExpensesService(ExpensesRepository(session))
+            await svc.load_rates(read_rates_file(settings.FX_RATES_FILE))
+
+    # Every hosted bot; background senders go through the router to each chat's bot
+    bots = build_bots(settings)
+    await bots.load(SessionLocal)
+    await bots.register(settings.NGROK_URL)
+    app.state.bots = bots
+
+    if settings.EXPENSE_COALESCE_MS > 0:
+        app.state.expense_writes = ExpenseWriteCoalescer(
+            SessionLocal, settings.EXPENSE_COALESCE_MS / 1000
+        )
+
+    if settings.DISPATCH_WORKERS > 0:
+        app.state.shards = ShardPool(settings.DISPATCH_WORKERS, settings.DISPATCH_QUEUE_SIZE)
+        app.state.shards.start()
+    else:
+        profile_writes.start(SessionLocal, settings.PROFILE_FLUSH_S)
+        if settings.ADMISSION_MAX_IN_FLIGHT > 0:
+            app.state.admission = AdmissionController(
+                settings.ADMISSION_MAX_IN_FLIGHT,
+                settings.ADMISSION_DEFER_S,
+                pool_usage=lambda: float(pool_stats()["usage"]),
+            )
+        # With shards, each worker runs the dashboards of its own chats
+        app.state.dashboards = DashboardManager(
+            bots, SessionLocal, settings.DASHBOARD_EDIT_INTERVAL_S, recheck=settings.DASHBOARD_RECHECK_S
+        )
+        await app.state.dashboards.start()
+
+    if settings.RECURRING_POLL_S > 0 and settings.DISPATCH_WORKERS == 0:
+        # With shards, each worker runs the recurring expenses of its own chats
+        app.state.recurring = RecurringScheduler(
+            SessionLocal, settings.RECURRING_POLL_S, notify=partial(notifyRecurring, bots)
+        )
+        app.state.recurring.start()
+
+    if settings.ARCHIVE_AFTER_DAYS > 0:
+        app.state.archiver = ExpenseArchiver(
+            SessionLocal, settings.ARCHIVE_POLL_S, timedelta(days=settings.ARCHIVE_AFTER_DAYS)
+        )
+        app.state.archiver.start()
+
+    if settings.LEDGER_VERIFY_S > 0:
+        app.state.ledger = LedgerVerifier(SessionLocal, settings.LEDGER_VERIFY_S, settings.LEDGER_CHECKPOINT_EVERY)
+        app.state.ledger.start()
+
+    if settings.DIGESTS_ENABLED:
+        app.state.digests = DigestScheduler(
+            bots,
+            SessionLocal,
+            hour=settings.DIGEST_HOUR_UTC,
+            weekday=settings.DIGEST_WEEKDAY,
+            concurrency=settings.DIGEST_CONCURRENCY,
+            rate=settings.DIGEST_RATE,
+        )
+        app.state.digests.start()
     yield
 
     # Cleanup
-    await tg.aclose()
+    if settings.DIGESTS_ENABLED:
+        await app.state.digests.aclose()
+    if settings.LEDGER_VERIFY_S > 0:
+        await app.state.ledger.aclose()
+    if settings.ARCHIVE_AFTER_DAYS > 0:
+        await app.state.archiver.aclose()
+    if settings.RECURRING_POLL_S > 0 and settings.DISPATCH_WORKERS == 0:
+        await app.state.recurring.aclose()
+    await replicas.aclose()
+    if invalidation:
+        await invalidation.aclose()
+    if settings.DISPATCH_WORKERS > 0:
+        await app.state.shards.aclose()
+    else:
+        await app.state.dashboards.aclose()
+        await profile_writes.aclose(SessionLocal)
+    if settings.EXPENSE_COALESCE_MS > 0:
+        await app.state.expense_writes.aclose()
+    await bots.aclose()
+    if settings.CAPTURE_DIR:
+        await app.state.recorder.aclose()
+    await app.state.loop_monitor.aclose()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -41,72 +153,148 @@ def read_root():
     return {"Hello": "World"}
 
 
+@app.get("/healthz/ready")
+async def read_ready(request: Request):
+    """
+    Readiness for load balancers: not ready while the loop lags, the DB pool or outbox
+    is full, or a shard worker is down.
+    """
+    state = request.app.state
+    loop = state.loop_monitor.stats()
+    pool = pool_stats()
+    outbound = state.bots.in_flight + state.bots.queued
+
+    ready = (
+        loop["p99_ms"] <= settings.READY_MAX_LOOP_LAG_MS
+        and pool["usage"] < settings.READY_MAX_POOL_USAGE
+        and outbound <= settings.READY_MAX_OUTBOUND
+    )
+    shards: ShardPool | None = getattr(state, "shards", None)
+    if shards:
+        ready = ready and all(shard["alive"] for shard in shards.stats())
+    admission: AdmissionController | None = getattr(state, "admission", None)
+    return JSONResponse(
+        {
+            "ready": ready, "loop": loop, "db_pool": pool, "outbound": outbound,
+            "admission": admission.stats() if admission else None,
+            "telegram": state.bots.stats(),
+            "shards": shards.stats() if shards else None,
+        },
+        status_code=200 if ready else 503,
+    )
+
+
+def require_admin(x_admin_token: str | None = Header(default=None)) -> None:
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404)
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=403)
+
+
+@app.post("/admin/profile", dependencies=[Depends(require_admin)], response_class=PlainTextResponse)
+async def profile_worker(
+    seconds: float = 10.0,
+    updates: int | None = None,
+    chat: int | None = None,
+    command: str | None = None,
+):
+    """
+    Sample this worker's event loop for `seconds`, or over the next `updates` updates
+    of `chat` / `command` (capped at `seconds`). Returns collapsed stacks per command.
+    With DISPATCH_WORKERS handlers run in the shard processes, so only parsing and
+    hand-off are visible here.
+    """
+    if not 0 < seconds <= 300:
+        raise HTTPException(status_code=422, detail="seconds must be in (0, 300]")
+    try:
+        return await profiler.profile(seconds, updates, chat, command)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@app.get("/admin/balances", dependencies=[Depends(require_admin)])
+async def read_balances_as_of(
+    chat: int,
+    at: datetime,
+    svc: ExpensesService = Depends(get_service),
+):
+    """A chat's balances at `at` (ISO 8601, UTC unless it has an offset), from the ledger."""
+    if at.tzinfo is None:
+        at = at.replace(tzinfo=timezone.utc)
+    try:
+        return asdict(await svc.get_balances_as_of(chat, at))
+    except ChatNotFound as e:
+        raise HTTPException(status_code=404, detail=e.message)
+    except DomainError as e:
+        raise HTTPException(status_code=409, detail=e.message)
+
+
 @app.post("/webhook")
 async def read_webhook(
     request: Request,
     update: Update,
     svc: ExpensesService = Depends(get_service),
+    x_telegram_bot_api_secret_token: str | None = Header(default=None),
+):
+    return await handle_webhook(request, settings.BOT_NAME, update, svc, x_telegram_bot_api_secret_token)
+
+
+@app.post("/webhook/{bot_name}")
+async def read_bot_webhook(
+    request: Request,
+    bot_name: str,
+    update: Update,
+    svc: ExpensesService = Depends(get_service),
+    x_telegram_bot_api_secret_token: str | None = Header(default=None),
 ):
-    ctx = build_context_from_update(update)
-    tg: client.TelegramAPI = request.app.state.telegram
-
-    # For initial welcome message
-    if update.my_chat_member:
-        bot_status_change = update.my_chat_member
-
-        old_status = bot_status_change.old_chat_member.status
-        new_status = bot_status_change.new_chat_member.status
-
-        if old_status in ("kicked", "left") and new_status in ("member", "administrator"):
-            # bot just added to the group, send welcome message
-            await handleInit(ctx, tg, svc)
-    
-    if update.message:
-        command = parse_command(update.message)
-
-        if command:
-            match command.name:
-                case CommandName.HELP:
-                    await handleHelp(ctx, tg)
-                case CommandName.JOIN:
-                    await handleJoin(ctx, tg, svc)
-                case CommandName.EXPENSE_ADD:
-                    await handleAddExpense(ctx, tg, svc, command.args)
-                case CommandName.EXPENSE_VIEW:
-                    await handleListExpenses(ctx, tg, svc)
-
-            return {"ok": True}
-
-    # For button clicks
-    # if update.callback_query:
-    #     cq = update.callback_query
-    #     callback_id = cq.id
-    #     data = cq.data
-
-    #     # message can be None in some callback scenarios
-    #     if cq.message is None:
-    #         await tg.answer_callback_query(callback_query_id=callback_id, text="Unsupported action.")
-    #         return {"ok": True}
-
-    #     chat_id = cq.message.chat.id
-    #     username = cq.from_.username
-
-    #     if data == "join_group":
-    #         tg.add_user_to_group(username=username, chat_id=chat_id)
-    #         await tg.send_message(chat_id=chat_id, text=f"{username} joined the group.")
-    #         await tg.send_home_message(chat_id=chat_id)
-    #     elif data == "leave_group":
-    #         tg.remove_user_from_group(username=username, chat_id=chat_id)
-    #         await tg.send_message(chat_id=chat_id, text=f"{username} left the group.")
-    #         await tg.send_home_message(chat_id=chat_id)
-    #     elif data == "help":
-    #         await tg.send_message(chat_id=chat_id, text="Centpai works like this: ...")
-        
-        
-    #     await tg.answer_callback_query(callback_query_id=callback_id)
-    
-
-            
+    """Webhook of one of settings.BOTS."""
+    return await handle_webhook(request, bot_name, update, svc, x_telegram_bot_api_secret_token)
+
+
+async def handle_webhook(
+    request: Request,
+    bot_name: str,
+    update: Update,
+    svc: ExpensesService,
+    secret: str | None,
+) -> dict[str, bool]:
+    bots: BotRouter = request.app.state.bots
+    bot = bots.get(bot_name)
+    if bot is None:
+        raise HTTPException(status_code=404)
+    if bot.secret and not (secret and secrets.compare_digest(secret, bot.secret)):
+        raise HTTPException(status_code=403)
+
+    messenger: Messenger = bot.messenger
+    shards: ShardPool | None = getattr(request.app.state, "shards", None)
+    recorder: UpdateRecorder | None = getattr(request.app.state, "recorder", None)
+
+    if recorder:
+        recorder.record(update)
+
+    admission: AdmissionController | None = getattr(request.app.state, "admission", None)
+
+    if shards:
+        # Hand off to the worker process that owns this chat; it runs the handlers and
+        # writes Chat.bot, this process only keeps its own routing current
+        bots.observe(update_chat_id(update), bot, persist=False)
+        if not shards.submit(update, bot.name):
+            # The owning worker is down or backed up: not acked, so Telegram retries
+            raise HTTPException(status_code=503)
+        return {"ok": True}
+
+    bots.observe(update_chat_id(update), bot)
+    if admission:
+        priority = classify(update)
+        async with admission.admit(priority) as admitted:
+            if admitted:
+                await dispatch_update(update, messenger, svc, request.app.state.dashboards)
+            elif priority is Priority.READ and update.message:
+                # Still acked below, so Telegram doesn't retry into the overload
+                await messenger.send_message(update.message.chat.id, BUSY_TEXT, update.message.message_id)
+    else:
+        await dispatch_update(update, messenger, svc, request.app.state.dashboards)
+
     return {"ok": True}
 
 @app.get("/items/{item_id}")
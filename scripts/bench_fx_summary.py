@@ -0,0 +1,163 @@
+"""
+Benchmark: mixed-currency expenses, converted at write time.
+
+Seeds a throwaway SQLite database with FX rates, writes the same expenses to two
+chats and compares
+  - per-row writes: ExpensesService.add_expense, one transaction and rate lookup each
+  - batched writes: ExpensesService.add_expenses in coalescer-sized batches, with
+    one rate query and one balance UPDATE per batch
+  - naive summary:  load every expense + split and look its rate up per row
+  - summary:        ExpensesService.get_summary over the stored balances
+
+    python -m scripts.bench_fx_summary --expenses 2000
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+_db_path = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ.setdefault("BOT_TOKEN", "bench")
+os.environ.setdefault("NGROK_URL", "http://localhost")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_db_path}"
+
+from sqlalchemy import insert  # noqa: E402
+
+from app.db.database import SessionLocal, init_db  # noqa: E402
+from app.features.expenses.dto import ExpenseWrite  # noqa: E402
+from app.features.expenses.fx import fx_rates  # noqa: E402
+from app.features.expenses.models import Balance, Chat, ChatMember, FxRate, User  # noqa: E402
+from app.features.expenses.money import from_minor, to_minor  # noqa: E402
+from app.features.expenses.repo import ExpensesRepository  # noqa: E402
+from app.features.expenses.service import ExpensesService  # noqa: E402
+
+PER_ROW_CHAT_ID = -1000
+BATCHED_CHAT_ID = -2000
+BATCH = 100  # ExpenseWriteCoalescer's default max_batch
+CURRENCIES = {"USD": Decimal("1"), "EUR": Decimal("1.08"), "GBP": Decimal("1.27"), "JPY": Decimal("0.0067")}
+DAYS = 365
+MEMBERS = 8
+
+
+async def seed() -> None:
+    await init_db()
+    rnd = random.Random(42)
+    # Rates up to today, which is when the service converts
+    start = datetime.now(timezone.utc).date() - timedelta(days=DAYS - 1)
+
+    async with SessionLocal() as session:
+        chat_ids = {1: PER_ROW_CHAT_ID, 2: BATCHED_CHAT_ID}
+        session.add_all(Chat(id=i, telegram_chat_id=tg, base_currency="EUR") for i, tg in chat_ids.items())
+        session.add_all(
+            User(id=i, telegram_user_id=1000 + i, username=f"user{i}", first_name=f"User {i}")
+            for i in range(1, MEMBERS + 1)
+        )
+        await session.flush()
+        for chat_id in chat_ids:
+            session.add_all(ChatMember(chat_id=chat_id, user_id=i) for i in range(1, MEMBERS + 1))
+            session.add_all(Balance(chat_id=chat_id, user_id=i, balance=0) for i in range(1, MEMBERS + 1))
+
+        await session.execute(insert(FxRate), [
+            {"currency": cur, "rate_date": start + timedelta(days=d), "rate": rate * Decimal(1 + rnd.uniform(-0.02, 0.02))}
+            for cur, rate in CURRENCIES.items() if cur != fx_rates.pivot
+            for d in range(DAYS)
+        ])
+        await session.commit()
+
+
+def make_writes(n_expenses: int) -> list[tuple[int, Decimal, str]]:
+    """(payer's telegram id, amount, currency) for each expense."""
+    rnd = random.Random(7)
+    writes = []
+    for _ in range(n_expenses):
+        currency = rnd.choice(list(CURRENCIES))
+        writes.append((1000 + rnd.randint(1, MEMBERS), from_minor(rnd.randint(100, 50000), currency), currency))
+    return writes
+
+
+async def write_per_row(writes: list[tuple[int, Decimal, str]]) -> None:
+    for i, (tg_user_id, amount, currency) in enumerate(writes):
+        async with SessionLocal() as session:
+            await ExpensesService(ExpensesRepository(session)).add_expense(
+                PER_ROW_CHAT_ID, tg_user_id, amount, f"expense {i}", currency
+            )
+
+
+async def write_batched(writes: list[tuple[int, Decimal, str]]) -> None:
+    for start in range(0, len(writes), BATCH):
+        batch = [
+            ExpenseWrite(BATCHED_CHAT_ID, tg_user_id, amount, f"expense {start + i}", currency)
+            for i, (tg_user_id, amount, currency) in enumerate(writes[start:start + BATCH])
+        ]
+        async with SessionLocal() as session:
+            results = await ExpensesService(ExpensesRepository(session)).add_expenses(BATCHED_CHAT_ID, batch)
+        assert not any(isinstance(r, Exception) for r in results), results
+
+
+async def naive_summary() -> dict[str, Decimal]:
+    async with SessionLocal() as session:
+        repo = ExpensesRepository(session)
+        chat = await repo.get_chat_by_tg_id(BATCHED_CHAT_ID)
+        assert chat
+        expenses = await repo.list_expenses(chat.id, limit=10**9, profile="expense_detail")
+
+        async def rate(currency: str, on: date) -> Decimal:
+            if currency == fx_rates.pivot:
+                return Decimal(1)
+            return (await repo.get_fx_series([currency], on))[currency][-1][1]
+
+        net: dict[int, Decimal] = defaultdict(Decimal)
+        for e in expenses:
+            on = e.created_at.date()
+            factor = await rate(e.currency, on) / await rate(chat.base_currency, on)
+            net[e.payer_id] += from_minor(e.amount, e.currency) * factor
+            for s in e.splits:
+                net[s.user_id] -= from_minor(s.amount, e.currency) * factor
+        base = chat.base_currency
+        return {f"user{u}": from_minor(to_minor(v, base), base) for u, v in net.items()}
+
+
+async def summary(tg_chat_id: int):
+    async with SessionLocal() as session:
+        return await ExpensesService(ExpensesRepository(session)).get_summary(tg_chat_id)
+
+
+async def main(n_expenses: int) -> None:
+    await seed()
+    writes = make_writes(n_expenses)
+    print(f"{n_expenses} expenses, {len(CURRENCIES)} currencies, {MEMBERS} members")
+
+    fx_rates.clear()
+    t0 = time.perf_counter()
+    await write_per_row(writes)
+    print(f"per-row writes:             {time.perf_counter() - t0:8.3f}s")
+
+    fx_rates.clear()
+    t0 = time.perf_counter()
+    await write_batched(writes)
+    print(f"batched writes ({BATCH}/batch):   {time.perf_counter() - t0:8.3f}s")
+
+    t0 = time.perf_counter()
+    naive = await naive_summary()
+    print(f"naive per-row conversion:   {time.perf_counter() - t0:8.3f}s")
+
+    t0 = time.perf_counter()
+    batched = await summary(BATCHED_CHAT_ID)
+    print(f"summary (stored balances):  {time.perf_counter() - t0:8.3f}s")
+
+    per_row = await summary(PER_ROW_CHAT_ID)
+    assert per_row.balances == batched.balances, "per-row and batched writes disagree"
+    # Stored balances are whole minor units per split; the naive sums round only once
+    drift = max(abs(naive[b.name] - b.balance) for b in batched.balances)
+    print(f"max per-user difference:    {drift} {batched.currency} over {n_expenses} expenses")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--expenses", type=int, default=2_000)
+    asyncio.run(main(parser.parse_args().expenses))
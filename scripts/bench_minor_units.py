@@ -0,0 +1,120 @@
+"""
+Benchmark: the per-expense money math on Decimal vs integer minor units.
+
+Runs the hot path of adding an expense (convert, allocate the debits, build the
+balance deltas) and a settlement, once with the previous Decimal helpers (inlined
+below) and once with the integer ones in app.features.expenses.balances.
+
+    python -m scripts.bench_minor_units --expenses 100000
+"""
+import argparse
+import os
+import random
+import time
+from collections import defaultdict
+from decimal import ROUND_HALF_UP, Decimal
+
+os.environ.setdefault("BOT_TOKEN", "bench")
+os.environ.setdefault("NGROK_URL", "http://localhost")
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite://")
+
+from app.features.expenses.balances import settle, split_debits, split_deltas  # noqa: E402
+from app.features.expenses.money import from_minor  # noqa: E402
+
+CENT = Decimal("0.01")
+MEMBERS = 8
+
+
+def _quantize(amount: Decimal) -> Decimal:
+    return amount.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def _allocate_decimal(total: Decimal, weights: list[Decimal]) -> list[Decimal]:
+    weight_sum = sum(weights, Decimal(0))
+    cents = int((total / CENT).to_integral_value())
+    exact = [cents * w / weight_sum for w in weights]
+    parts = [int(x) for x in exact]
+    leftover = cents - sum(parts)
+    by_remainder = sorted(range(len(parts)), key=lambda i: (-(exact[i] - parts[i]), i))
+    for i in by_remainder[:leftover]:
+        parts[i] += 1
+    return [p * CENT for p in parts]
+
+
+def _deltas_decimal(payer_id: int, debits) -> dict[int, Decimal]:
+    deltas: dict[int, Decimal] = defaultdict(Decimal)
+    for user_id, base_amount in debits:
+        deltas[payer_id] += base_amount
+        deltas[user_id] -= base_amount
+    return {u: d for u, d in deltas.items() if d}
+
+
+def _settle_decimal(balances: dict[int, Decimal]) -> list[tuple[int, int, Decimal]]:
+    debtors = sorted(((-v, u) for u, v in balances.items() if v < 0), reverse=True)
+    creditors = sorted(((v, u) for u, v in balances.items() if v > 0), reverse=True)
+    transfers = []
+    i = j = 0
+    while i < len(debtors) and j < len(creditors):
+        owe, debtor = debtors[i]
+        due, creditor = creditors[j]
+        amount = min(owe, due)
+        transfers.append((debtor, creditor, amount))
+        debtors[i] = (owe - amount, debtor)
+        creditors[j] = (due - amount, creditor)
+        if debtors[i][0] == 0:
+            i += 1
+        if creditors[j][0] == 0:
+            j += 1
+    return transfers
+
+
+def run_decimal(expenses) -> dict[int, Decimal]:
+    balances: dict[int, Decimal] = defaultdict(Decimal)
+    for payer, amount, rate, shares in expenses:
+        amount, rate = from_minor(amount, "EUR"), Decimal(rate)
+        parts = _allocate_decimal(_quantize(amount * rate), [Decimal(s) for s in shares])
+        for u, d in _deltas_decimal(payer, enumerate(parts, start=1)).items():
+            balances[u] += d
+    _settle_decimal(balances)
+    return balances
+
+
+def run_minor(expenses) -> dict[int, int]:
+    balances: dict[int, int] = defaultdict(int)
+    for payer, amount, rate, shares in expenses:
+        parts = split_debits(amount, list(enumerate(shares, start=1)), Decimal(rate), "EUR", "USD")
+        for u, d in split_deltas(payer, enumerate(parts, start=1)).items():
+            balances[u] += d
+    settle(balances)
+    return balances
+
+
+def main(n_expenses: int) -> None:
+    rnd = random.Random(42)
+    expenses = [
+        (
+            rnd.randint(1, MEMBERS),
+            rnd.randint(100, 50000),
+            f"{rnd.uniform(1.05, 1.11):.8f}",
+            [rnd.randint(1, 3) for _ in range(MEMBERS)],
+        )
+        for _ in range(n_expenses)
+    ]
+    print(f"{n_expenses} expenses, {MEMBERS} members each")
+
+    t0 = time.perf_counter()
+    decimal_balances = run_decimal(expenses)
+    print(f"Decimal amounts:      {time.perf_counter() - t0:8.3f}s")
+
+    t0 = time.perf_counter()
+    minor_balances = run_minor(expenses)
+    print(f"integer minor units:  {time.perf_counter() - t0:8.3f}s")
+
+    drift = max(abs(decimal_balances[u] - from_minor(minor_balances[u], "USD")) for u in minor_balances)
+    print(f"max per-user difference: {drift} USD")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--expenses", type=int, default=100_000)
+    main(parser.parse_args().expenses)
@@ -0,0 +1,39 @@
+"""
+Reconciliation check: stored balances must equal what the live expense splits and
+payments imply. Balances are maintained incrementally (expenses add their recorded
+deltas, removals and edits reverse them), so any drift points at a bug.
+
+Runs against settings.DATABASE_URL and exits non-zero if any chat has drifted.
+
+    python -m scripts.check_balances [--chat <telegram chat id>]
+"""
+import argparse
+import asyncio
+import sys
+
+from app.db.database import SessionLocal
+from app.features.expenses.repo import ExpensesRepository
+from app.features.expenses.service import ExpensesService
+
+
+async def main(tg_chat_id: int | None) -> int:
+    async with SessionLocal() as session:
+        svc = ExpensesService(ExpensesRepository(session))
+        chats = [tg_chat_id] if tg_chat_id is not None else await svc.repo.list_tg_chat_ids()
+
+        drifted = 0
+        for chat in chats:
+            drift = await svc.reconcile_balances(chat)
+            if drift:
+                drifted += 1
+                for user_id, d in sorted(drift.items()):
+                    print(f"chat {chat}: user {user_id} off by {d:+} minor units")
+
+    print(f"{len(chats)} chats checked, {drifted} with drift")
+    return 1 if drifted else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chat", type=int, default=None)
+    sys.exit(asyncio.run(main(parser.parse_args().chat)))
@@ -0,0 +1,80 @@
+"""
+One-off migration: money columns from Numeric(10, 2) to BIGINT minor units.
+
+The currency columns the conversion reads are added first if the database predates
+them (scripts.upgrade_schema). Each column is then widened to unconstrained NUMERIC,
+scaled by its currency's exponent (joined from the owning expense or chat where the
+row has no currency of its own) and cast to BIGINT, all in one transaction. Columns
+already BIGINT are skipped, so the script is safe to re-run. Postgres only.
+
+    python -m scripts.migrate_minor_units [--dry-run]
+"""
+import argparse
+import asyncio
+import sys
+
+from sqlalchemy import text
+
+from app.db.database import engine, init_db
+from app.features.expenses.money import exponent, exponents
+from scripts.upgrade_schema import add_missing_columns
+
+# table, column, UPDATE ... FROM clause, expression giving the currency
+COLUMNS = [
+    ("expenses", "amount", "", "t.currency"),
+    ("payments", "amount", "", "t.currency"),
+    ("recurring_expenses", "amount", "", "t.currency"),
+    ("expense_splits", "amount", "FROM expenses e WHERE e.id = t.expense_id", "e.currency"),
+    ("expense_splits", "base_amount",
+     "FROM expenses e JOIN chats c ON c.id = e.chat_id WHERE e.id = t.expense_id", "c.base_currency"),
+    ("balances", "balance", "FROM chats c WHERE c.id = t.chat_id", "c.base_currency"),
+]
+
+
+def _scale(currency_expr: str) -> str:
+    default = 10 ** exponent("")
+    cases = " ".join(f"WHEN '{cur}' THEN {10 ** exp}" for cur, exp in sorted(exponents().items()))
+    return f"CASE {currency_expr} {cases} ELSE {default} END"
+
+
+async def main(dry_run: bool) -> int:
+    if engine.dialect.name != "postgresql":
+        print("This migration only runs against Postgres")
+        return 1
+
+    await init_db()  # extensions and the new tables
+    async with engine.begin() as conn:
+        for name in await add_missing_columns(conn):
+            print(f"{name}: added")
+
+        for table, column, joins, currency in COLUMNS:
+            data_type = await conn.scalar(
+                text(
+                    "SELECT data_type FROM information_schema.columns "
+                    "WHERE table_name = :table AND column_name = :column"
+                ),
+                {"table": table, "column": column},
+            )
+            if data_type is None or data_type == "bigint":
+                print(f"{table}.{column}: {data_type or 'missing'}, skipped")
+                continue
+
+            await conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {column} TYPE NUMERIC"))
+            result = await conn.execute(text(
+                f"UPDATE {table} t SET {column} = t.{column} * {_scale(currency)} {joins}"
+            ))
+            await conn.execute(text(
+                f"ALTER TABLE {table} ALTER COLUMN {column} TYPE BIGINT USING round({column})::bigint"
+            ))
+            print(f"{table}.{column}: {result.rowcount} rows converted")
+
+        if dry_run:
+            await conn.rollback()
+            print("Dry run, rolled back")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dry-run", action="store_true")
+    sys.exit(asyncio.run(main(parser.parse_args().dry_run)))
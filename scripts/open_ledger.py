@@ -0,0 +1,38 @@
+"""
+One-off: record each chat's current balances as its opening ledger checkpoint.
+
+Balances from before the balance ledger existed have no entries behind them. The
+ledger verifier opens such chats as it reaches them; run this once after deploying
+the ledger to open them all up front. Chats that already have checkpoints are
+skipped, so it is safe to re-run.
+As-of balance queries can't go back past a chat's opening checkpoint.
+
+    python -m scripts.open_ledger
+"""
+import asyncio
+import sys
+
+from app.db.database import SessionLocal, init_db
+from app.features.expenses.repo import ExpensesRepository
+from app.features.expenses.service import ExpensesService
+
+
+async def main() -> int:
+    await init_db()  # creates the ledger tables
+    opened, cursor = 0, 0
+    while True:
+        async with SessionLocal() as session:
+            chat_ids = await ExpensesRepository(session).list_chat_ids(cursor, 500)
+        for chat_id in chat_ids:
+            async with SessionLocal() as session:
+                opened += await ExpensesService(ExpensesRepository(session)).open_ledger(chat_id)
+        if len(chat_ids) < 500:
+            break
+        cursor = chat_ids[-1]
+
+    print(f"Opened the ledger of {opened} chats")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
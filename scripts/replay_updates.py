@@ -0,0 +1,251 @@
+"""
+Replay captured webhook traffic (see CAPTURE_DIR) against the app and compare runs.
+
+`run` feeds the updates of one or more capture segments to app.main:app's /webhook
+in-process, against a scratch database and a stub Telegram client, and records
+per-update latency and SQL query counts (overall and per command) to a JSON file.
+Updates are sent at their original spacing divided by --speed; --speed 0 sends
+them back to back, one at a time. Chats that don't exist in the scratch database
+just get "not found" replies, so replay a capture that starts from an empty group
+or point --database-url at a restored scratch copy.
+
+`compare` diffs two result files, e.g. from the same capture on two commits, and
+exits non-zero if latency or queries per update regressed by more than --tolerance.
+
+    python -m scripts.replay_updates run captures/*.jsonl.gz --speed 10 --out head.json
+    # same capture and speed, from a checkout of the base commit:
+    python -m scripts.replay_updates run captures/*.jsonl.gz --speed 10 --out base.json
+    python -m scripts.replay_updates compare base.json head.json
+"""
+import argparse
+import asyncio
+import contextvars
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Any
+
+
+class StubTelegram:
+    """Answers every Bot API call instantly with a plausible success response."""
+    def __init__(self):
+        self.calls = 0
+        self._message_id = 0
+
+    async def send_message(self, chat_id: int, text: str, *args, **kwargs) -> dict[str, Any]:
+        self.calls += 1
+        self._message_id += 1
+        return {"ok": True, "result": {"message_id": self._message_id, "chat": {"id": chat_id}, "text": text}}
+
+    async def edit_message_text(self, chat_id: int, message_id: int, text: str, *args, **kwargs) -> dict[str, Any]:
+        self.calls += 1
+        return {"ok": True, "result": {"message_id": message_id, "chat": {"id": chat_id}, "text": text}}
+
+    def __getattr__(self, name: str):
+        async def call(*args, **kwargs) -> dict[str, Any]:
+            self.calls += 1
+            return {"ok": True, "result": True}
+        return call
+
+
+def _label(payload: dict[str, Any]) -> str:
+    """Command name (or update kind) used to group results."""
+    text = (payload.get("message") or {}).get("text") or ""
+    if text.startswith("/"):
+        return text.split()[0].split("@")[0]
+    for kind in ("message", "my_chat_member", "callback_query"):
+        if kind in payload:
+            return kind
+    return "other"
+
+
+def _latency(samples: list[float]) -> dict[str, float]:
+    samples = sorted(samples)
+    if not samples:
+        return {}
+    pick = lambda q: samples[min(len(samples) - 1, int(len(samples) * q))]  # noqa: E731
+    return {
+        "mean": round(statistics.fmean(samples), 2),
+        "p50": round(pick(0.5), 2),
+        "p95": round(pick(0.95), 2),
+        "p99": round(pick(0.99), 2),
+        "max": round(samples[-1], 2),
+    }
+
+
+async def replay(paths: list[str], speed: float) -> dict[str, Any]:
+    import httpx
+    from sqlalchemy import event
+
+    from app.core.config import settings
+    from app.db.database import SessionLocal, engine, init_db
+    from app.features.telegram.bots import Bot, BotRouter
+    from app.features.telegram.capture import read_capture
+    from app.features.telegram.dashboard import DashboardManager
+    from app.main import app
+
+    await init_db()
+    tg = StubTelegram()
+    app.state.bots = BotRouter([Bot(settings.BOT_NAME, tg, tg)], settings.BOT_NAME)  # type: ignore[arg-type]
+    app.state.dashboards = DashboardManager(tg, SessionLocal)  # type: ignore[arg-type]
+    await app.state.dashboards.start()
+
+    # Queries are attributed to the update whose request (or spawned task) ran them
+    current: contextvars.ContextVar[list[int] | None] = contextvars.ContextVar("replay_update", default=None)
+
+    def count_query(*_) -> None:
+        counter = current.get()
+        if counter is not None:
+            counter[0] += 1
+    event.listen(engine.sync_engine, "before_cursor_execute", count_query)
+
+    records = list(read_capture(paths))
+    results: list[tuple[str, float, list[int], bool]] = []
+
+    async def send(client: httpx.AsyncClient, payload: dict[str, Any]) -> None:
+        counter = [0]
+        current.set(counter)
+        started = time.perf_counter()
+        try:
+            ok = (await client.post("/webhook", json=payload)).status_code == 200
+        except Exception:
+            ok = False
+        results.append((_label(payload), (time.perf_counter() - started) * 1000, counter, ok))
+
+    transport = httpx.ASGITransport(app=app)
+    started = time.perf_counter()
+    async with httpx.AsyncClient(transport=transport, base_url="http://replay") as client:
+        if speed <= 0:
+            for _, payload in records:
+                await send(client, payload)
+        else:
+            first = records[0][0] if records else 0.0
+            tasks = []
+            for at, payload in records:
+                delay = (at - first) / speed - (time.perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.create_task(send(client, payload)))
+            await asyncio.gather(*tasks)
+    wall = time.perf_counter() - started
+    await app.state.dashboards.aclose()
+
+    by_label: dict[str, list[tuple[float, int]]] = defaultdict(list)
+    for label, ms, counter, _ in results:
+        by_label[label].append((ms, counter[0]))
+
+    queries = sum(counter[0] for _, _, counter, _ in results)
+    return {
+        "commit": _commit(),
+        "captures": paths,
+        "speed": speed,
+        "updates": len(results),
+        "errors": sum(not ok for *_, ok in results),
+        "wall_s": round(wall, 3),
+        "bot_api_calls": tg.calls,
+        "latency_ms": _latency([ms for _, ms, _, _ in results]),
+        "queries": queries,
+        "queries_per_update": round(queries / len(results), 3) if results else 0.0,
+        "by_command": {
+            label: {
+                "count": len(rows),
+                "latency_ms": _latency([ms for ms, _ in rows]),
+                "queries_per_update": round(sum(q for _, q in rows) / len(rows), 3),
+            }
+            for label, rows in sorted(by_label.items())
+        },
+    }
+
+
+def _commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(base: dict[str, Any], head: dict[str, Any], tolerance: float) -> int:
+    """Print base vs head; returns how many metrics regressed beyond `tolerance`."""
+    regressions = 0
+
+    def row(name: str, a: float | None, b: float | None) -> None:
+        nonlocal regressions
+        if a is None or b is None:
+            print(f"  {name:<34} {a!s:>10} {b!s:>10}")
+            return
+        change = (b - a) / a if a else (0.0 if b == a else float("inf"))
+        flag = ""
+        if change > tolerance:
+            regressions += 1
+            flag = "  REGRESSION"
+        print(f"  {name:<34} {a:>10} {b:>10} {change:>+8.1%}{flag}")
+
+    print(f"base {base.get('commit')} vs head {head.get('commit')}")
+    print(f"  {'':<34} {'base':>10} {'head':>10}")
+    row("latency p50 (ms)", base["latency_ms"].get("p50"), head["latency_ms"].get("p50"))
+    row("latency p95 (ms)", base["latency_ms"].get("p95"), head["latency_ms"].get("p95"))
+    row("queries / update", base["queries_per_update"], head["queries_per_update"])
+    row("errors", base["errors"], head["errors"])
+
+    for label in sorted(set(base["by_command"]) | set(head["by_command"])):
+        a, b = base["by_command"].get(label), head["by_command"].get(label)
+        if not a or not b:
+            print(f"  {label}: only in {'head' if b else 'base'}")
+            continue
+        row(f"{label} p95 (ms)", a["latency_ms"].get("p95"), b["latency_ms"].get("p95"))
+        row(f"{label} queries / update", a["queries_per_update"], b["queries_per_update"])
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    run = sub.add_parser("run")
+    run.add_argument("captures", nargs="+")
+    run.add_argument("--speed", type=float, default=1.0)
+    run.add_argument("--out", default=None)
+    run.add_argument("--database-url", default=None, help="scratch database; a temp SQLite file by default")
+
+    cmp_ = sub.add_parser("compare")
+    cmp_.add_argument("base")
+    cmp_.add_argument("head")
+    cmp_.add_argument("--tolerance", type=float, default=0.10)
+
+    args = parser.parse_args()
+    if args.cmd == "compare":
+        with open(args.base) as a, open(args.head) as b:
+            regressions = compare(json.load(a), json.load(b), args.tolerance)
+        print(f"{regressions} regressions")
+        return 1 if regressions else 0
+
+    # The app reads its settings on import: point it at the scratch database first
+    os.environ["DATABASE_URL"] = args.database_url or (
+        f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'replay.db')}"
+    )
+    os.environ.setdefault("BOT_TOKEN", "replay")
+    os.environ.setdefault("NGROK_URL", "http://localhost")
+    os.environ.pop("CAPTURE_DIR", None)
+    # Captured updates carry no webhook secret
+    os.environ.pop("WEBHOOK_SECRET", None)
+
+    result = asyncio.run(replay(args.captures, args.speed))
+    print(
+        f"{result['updates']} updates in {result['wall_s']}s, {result['errors']} errors, "
+        f"latency {result['latency_ms']}, {result['queries_per_update']} queries/update"
+    )
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+"""
+One-off: bring a database created before multi-currency support up to the models.
+
+init_db's create_all only creates missing tables; it never adds columns or indexes
+to tables that already exist. This adds the columns the models gained on the
+original tables, backfilled for data written before them, and creates any missing
+indexes, all in one transaction. Columns and indexes already present are skipped,
+so it is safe to re-run. Postgres only.
+
+Run it once before starting the new version, then scripts.migrate_minor_units
+(which also runs this first) and scripts.open_ledger:
+
+    python -m scripts.upgrade_schema [--dry-run]
+"""
+import argparse
+import asyncio
+import sys
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.db.database import engine, init_db
+from app.features.expenses.models import DEFAULT_CURRENCY, Base
+
+# table, column, type, backfill for existing rows (None: stays NULL)
+COLUMNS = [
+    # Multi-currency: everything written before was in the default currency
+    ("chats", "base_currency", "VARCHAR(3)", f"'{DEFAULT_CURRENCY}'"),
+    ("expenses", "currency", "VARCHAR(3)", "c.base_currency FROM chats c WHERE c.id = t.chat_id"),
+    ("payments", "currency", "VARCHAR(3)", "c.base_currency FROM chats c WHERE c.id = t.chat_id"),
+    ("expenses", "fx_rate", "NUMERIC(18, 8)", "1"),
+    # Same unit as `amount`, which scripts.migrate_minor_units may not have converted yet
+    ("expense_splits", "base_amount", None, "t.amount"),
+    # Soft delete, dashboards, digests, group titles, multi-bot routing
+    ("expenses", "deleted_at", "TIMESTAMP WITH TIME ZONE", None),
+    ("chats", "dashboard_message_id", "BIGINT", None),
+    ("chats", "digest", "VARCHAR(1)", None),
+    ("chats", "title", "VARCHAR(255)", None),
+    ("chats", "bot", "VARCHAR(64)", None),
+]
+
+
+async def _column_type(conn: AsyncConnection, table: str, column: str) -> str | None:
+    return await conn.scalar(
+        text(
+            "SELECT data_type FROM information_schema.columns "
+            "WHERE table_name = :table AND column_name = :column"
+        ),
+        {"table": table, "column": column},
+    )
+
+
+async def add_missing_columns(conn: AsyncConnection) -> list[str]:
+    """Add and backfill the columns missing from the original tables; returns them as table.column."""
+    added = []
+    for table, column, column_type, backfill in COLUMNS:
+        if await _column_type(conn, table, column) is not None:
+            continue
+        if column_type is None:
+            amount_type = await _column_type(conn, table, "amount")
+            column_type = "BIGINT" if amount_type == "bigint" else "NUMERIC"
+
+        await conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}"))
+        if backfill is not None:
+            await conn.execute(text(f"UPDATE {table} t SET {column} = {backfill}"))
+            await conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {column} SET NOT NULL"))
+        added.append(f"{table}.{column}")
+
+    # Only these have a database-side default in the models
+    await conn.execute(text(f"ALTER TABLE chats ALTER COLUMN base_currency SET DEFAULT '{DEFAULT_CURRENCY}'"))
+    return added
+
+
+async def create_missing_indexes(conn: AsyncConnection) -> list[str]:
+    """Create the models' indexes on tables that predate them; returns their names."""
+    def create(sync_conn) -> list[str]:
+        created = []
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                if not sync_conn.dialect.has_index(sync_conn, table.name, index.name):
+                    index.create(sync_conn)
+                    created.append(index.name)
+        return created
+    return await conn.run_sync(create)
+
+
+async def main(dry_run: bool) -> int:
+    if engine.dialect.name != "postgresql":
+        print("This upgrade only runs against Postgres")
+        return 1
+
+    await init_db()  # extensions and the new tables
+    async with engine.begin() as conn:
+        for name in await add_missing_columns(conn):
+            print(f"{name}: added")
+        for name in await create_missing_indexes(conn):
+            print(f"{name}: created")
+
+        if dry_run:
+            await conn.rollback()
+            print("Dry run, rolled back")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dry-run", action="store_true")
+    sys.exit(asyncio.run(main(parser.parse_args().dry_run)))
@@ -0,0 +1,55 @@
+import asyncio
+import os
+import tempfile
+from typing import Any, Awaitable, Callable
+
+import pytest
+
+# Settings are read on import; point them at a throwaway SQLite database first
+_db = os.path.join(tempfile.mkdtemp(), "test.db")
+os.environ.update(
+    BOT_TOKEN="test",
+    NGROK_URL="http://localhost",
+    DATABASE_URL=f"sqlite+aiosqlite:///{_db}",
+)
+
+from app.db.database import SessionLocal, engine  # noqa: E402
+from app.features.expenses.events import chat_events  # noqa: E402
+from app.features.expenses.models import Balance, Base, Chat, ChatMember, User  # noqa: E402
+
+TG_CHAT_ID = -1
+MEMBERS = 3
+
+
+async def _reset() -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    # In-process caches still hold the previous test's chat
+    chat_events.reset()
+    async with SessionLocal() as session:
+        session.add(Chat(id=1, telegram_chat_id=TG_CHAT_ID, base_currency="USD"))
+        for i in range(1, MEMBERS + 1):
+            session.add(User(id=i, telegram_user_id=100 + i, username=f"u{i}", first_name=f"U{i}"))
+        await session.flush()
+        for i in range(1, MEMBERS + 1):
+            session.add(ChatMember(chat_id=1, user_id=i))
+            session.add(Balance(chat_id=1, user_id=i, balance=0))
+        await session.commit()
+
+
+@pytest.fixture
+def run() -> Callable[[Callable[[], Awaitable[Any]]], Any]:
+    """
+    Runs a test body on a fresh database with one chat of MEMBERS members. Each run
+    gets its own event loop, so the engine's connections are disposed before it ends.
+    """
+    def runner(body: Callable[[], Awaitable[Any]]) -> Any:
+        async def main() -> Any:
+            try:
+                await _reset()
+                return await body()
+            finally:
+                await engine.dispose()
+        return asyncio.run(main())
+    return runner
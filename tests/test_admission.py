@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+
+from app.features.telegram.admission import AdmissionController, Priority, classify
+from app.features.telegram.schemas import Update
+
+
+def message(text: str) -> Update:
+    command = text.split()[0]
+    return Update.model_validate({
+        "update_id": 1,
+        "message": {
+            "message_id": 1,
+            "chat": {"id": -1, "type": "group"},
+            "from": {"id": 101, "is_bot": False, "first_name": "U1"},
+            "text": text,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(command)}] if text.startswith("/") else [],
+        },
+    })
+
+
+@pytest.mark.parametrize(
+    "text, priority",
+    [
+        ("/expense_add 10 lunch", Priority.WRITE),
+        ("/expense_remove 3", Priority.WRITE),
+        ("/home", Priority.READ),
+        ("/expense_search taxi", Priority.READ),
+        ("/help", Priority.LOW),
+        ("just chatting", Priority.LOW),
+    ],
+)
+def test_classify(text, priority):
+    assert classify(message(text)) is priority
+
+
+class Holder:
+    """Keeps admitted slots occupied until released."""
+    def __init__(self, admission: AdmissionController):
+        self.admission = admission
+        self._release = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+
+    async def hold(self, priority: Priority, n: int = 1) -> None:
+        for _ in range(n):
+            self._tasks.append(asyncio.create_task(self._hold(priority)))
+        await asyncio.sleep(0)
+
+    async def _hold(self, priority: Priority) -> None:
+        async with self.admission.admit(priority) as admitted:
+            assert admitted
+            await self._release.wait()
+
+    async def release(self) -> None:
+        self._release.set()
+        await asyncio.gather(*self._tasks)
+
+
+async def try_admit(admission: AdmissionController, priority: Priority) -> bool:
+    async with admission.admit(priority) as admitted:
+        return admitted
+
+
+def test_writes_are_always_admitted():
+    async def main():
+        admission = AdmissionController(max_in_flight=1, defer=0, pool_usage=lambda: 1.0)
+        holder = Holder(admission)
+        await holder.hold(Priority.WRITE, 3)
+        assert admission.in_flight == 3
+        assert await try_admit(admission, Priority.WRITE)
+        await holder.release()
+        assert admission.shed == {}
+    asyncio.run(main())
+
+
+def test_read_waits_for_a_slot_then_is_admitted():
+    async def main():
+        admission = AdmissionController(max_in_flight=1, defer=1.0, pool_usage=lambda: 0.0)
+        holder = Holder(admission)
+        await holder.hold(Priority.READ)
+
+        waiting = asyncio.create_task(try_admit(admission, Priority.READ))
+        await asyncio.sleep(0.1)
+        assert not waiting.done()
+        await holder.release()
+        assert await waiting
+    asyncio.run(main())
+
+
+def test_read_is_shed_after_the_deferral():
+    async def main():
+        admission = AdmissionController(max_in_flight=1, defer=0.1, pool_usage=lambda: 0.0)
+        holder = Holder(admission)
+        await holder.hold(Priority.WRITE)
+
+        assert not await try_admit(admission, Priority.READ)
+        assert admission.shed == {"read": 1}
+        await holder.release()
+    asyncio.run(main())
+
+
+def test_read_is_held_back_while_the_pool_is_exhausted():
+    async def main():
+        usage = 1.0
+        admission = AdmissionController(max_in_flight=10, defer=1.0, pool_usage=lambda: usage)
+        waiting = asyncio.create_task(try_admit(admission, Priority.READ))
+        await asyncio.sleep(0.1)
+        assert not waiting.done()
+
+        # A connection coming back is noticed without any update finishing
+        usage = 0.5
+        assert await waiting
+    asyncio.run(main())
+
+
+def test_low_priority_gets_half_the_capacity_and_is_shed_at_once():
+    async def main():
+        usage = 0.0
+        admission = AdmissionController(max_in_flight=4, defer=1.0, pool_usage=lambda: usage)
+        holder = Holder(admission)
+        await holder.hold(Priority.READ, 2)
+        assert not await try_admit(admission, Priority.LOW)
+        # Reads still have room
+        assert await try_admit(admission, Priority.READ)
+        await holder.release()
+
+        usage = 0.8
+        assert not await try_admit(admission, Priority.LOW)
+        assert admission.shed == {"low": 2}
+    asyncio.run(main())
@@ -0,0 +1,86 @@
+import asyncio
+from decimal import Decimal
+
+from sqlalchemy import func, select, text
+
+from app.db.database import SessionLocal, engine
+from app.features.expenses.coalescer import ExpenseWriteCoalescer
+from app.features.expenses.errors import ServerError, UserNotRegistered
+from app.features.expenses.models import Balance, Expense
+from app.features.expenses.repo import ExpensesRepository
+from app.features.expenses.service import ExpensesService
+from tests.test_query_counts import StatementCounter
+
+TG_CHAT_ID = -1
+
+
+async def add(coalescer: ExpenseWriteCoalescer, tg_user_id: int, amount: str, desc: str = "lunch"):
+    async with SessionLocal() as session:
+        service = ExpensesService(ExpensesRepository(session), coalescer)
+        try:
+            return await service.add_expense(TG_CHAT_ID, tg_user_id, Decimal(amount), desc)
+        except Exception as e:
+            return e
+
+
+async def stored() -> tuple[int, int]:
+    """Expenses written, and the sum of all balances (zero when they're consistent)."""
+    async with SessionLocal() as session:
+        expenses = await session.scalar(select(func.count()).select_from(Expense))
+        total = await session.scalar(select(func.sum(Balance.balance)))
+    return expenses, total
+
+
+def test_concurrent_writes_share_one_transaction(run):
+    async def body():
+        coalescer = ExpenseWriteCoalescer(SessionLocal, window=0.05)
+        with StatementCounter() as counter:
+            results = await asyncio.gather(
+                add(coalescer, 101, "10"),
+                add(coalescer, 102, "20.01"),
+                add(coalescer, 199, "5"),
+            )
+        await coalescer.aclose()
+
+        assert [r.paid_by for r in results[:2]] == ["u1", "u2"]
+        # A bad write fails on its own, the rest of the batch still lands
+        assert isinstance(results[2], UserNotRegistered)
+        assert sum(s.startswith("UPDATE balances") for s in counter.statements) == 1
+        assert await stored() == (2, 0)
+    run(body)
+
+
+def test_integrity_error_is_isolated_to_its_write(run):
+    async def body():
+        async with engine.begin() as conn:
+            await conn.execute(text(
+                "CREATE TRIGGER reject_boom BEFORE INSERT ON expenses WHEN NEW.description = 'boom' "
+                "BEGIN SELECT RAISE(ABORT, 'boom'); END"
+            ))
+        coalescer = ExpenseWriteCoalescer(SessionLocal, window=0.05)
+        results = await asyncio.gather(
+            add(coalescer, 101, "10"),
+            add(coalescer, 102, "3", desc="boom"),
+            add(coalescer, 103, "7"),
+        )
+        await coalescer.aclose()
+
+        # The batch failed as a whole, then was retried one write at a time
+        assert [r.paid_by for r in (results[0], results[2])] == ["u1", "u3"]
+        assert isinstance(results[1], ServerError)
+        assert await stored() == (2, 0)
+    run(body)
+
+
+def test_aclose_flushes_pending_writes(run):
+    async def body():
+        coalescer = ExpenseWriteCoalescer(SessionLocal, window=60)
+        writes = [asyncio.create_task(add(coalescer, 101 + i, "4")) for i in range(3)]
+        await asyncio.sleep(0)
+        assert await stored() == (0, 0)
+
+        await coalescer.aclose()
+        results = await asyncio.gather(*writes)
+        assert [r.paid_by for r in results] == ["u1", "u2", "u3"]
+        assert await stored() == (3, 0)
+    run(body)
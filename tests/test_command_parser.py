@@ -0,0 +1,64 @@
+import re
+
+import pytest
+
+from app.features.telegram.commands.command_parser import CommandName, parse_batch
+from app.features.telegram.schemas import Message
+
+
+def utf16_len(text: str) -> int:
+    return len(text.encode("utf-16-le")) // 2
+
+
+def message(text: str) -> Message:
+    """A message with the entities Telegram would send: commands and @mentions."""
+    spans = [("bot_command", m.span(1)) for m in re.finditer(r"(?m)^[ \t]*(/\w+)", text)]
+    spans += [("mention", m.span()) for m in re.finditer(r"@\w+", text)]
+    entities = [
+        {"type": kind, "offset": utf16_len(text[:start]), "length": utf16_len(text[start:end])}
+        for kind, (start, end) in sorted(spans, key=lambda s: s[1])
+    ]
+    return Message.model_validate({
+        "message_id": 1,
+        "chat": {"id": -1, "type": "group"},
+        "from": {"id": 101, "is_bot": False, "first_name": "U1"},
+        "text": text,
+        "entities": entities,
+    })
+
+
+def test_each_line_becomes_its_own_command():
+    batch = parse_batch(message("/expense_add 12 taxi\n/expense_add 30.5 dinner @u2 @u3"))
+
+    assert [(c.name, c.args) for c in batch] == [
+        (CommandName.EXPENSE_ADD, ["12", "taxi"]),
+        (CommandName.EXPENSE_ADD, ["30.5", "dinner", "@u2", "@u3"]),
+    ]
+    # Mentions count only for the line they're on
+    assert [c.mentioned_usernames for c in batch] == [[], ["u2", "u3"]]
+
+
+def test_blank_lines_and_indentation_are_ignored():
+    batch = parse_batch(message("/expense_add 1 a\n\n  /expense_add 2 b\n"))
+    assert [c.args for c in batch] == [["1", "a"], ["2", "b"]]
+
+
+def test_offsets_stay_aligned_after_astral_characters():
+    # 🍕 is two UTF-16 units; the second line's entities must still line up
+    batch = parse_batch(message("/expense_add 9 🍕🍕 night\n/expense_add 4 bus @u2"))
+    assert [c.args for c in batch] == [["9", "🍕🍕", "night"], ["4", "bus", "@u2"]]
+    assert batch[1].mentioned_usernames == ["u2"]
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "/expense_add 12 taxi",
+        "/expense_add 12 taxi\nand a note",
+        "/expense_add 12 taxi\n/not_a_command 3",
+        "/expense_add 12 taxi\n\n",
+        "just\nchatting",
+    ],
+)
+def test_not_a_batch(text):
+    assert parse_batch(message(text)) == []
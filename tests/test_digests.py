@@ -0,0 +1,78 @@
+import asyncio
+from datetime import date
+
+import pytest
+from sqlalchemy import text
+
+from app.db.database import SessionLocal, engine
+from app.features.expenses.errors import ServerError
+from app.features.expenses.models import DigestRun
+from app.features.expenses.repo import ExpensesRepository
+from app.features.expenses.service import ExpensesService
+
+RUN_DATE = date(2026, 1, 5)
+
+
+async def start(lease: float = 60) -> DigestRun | None:
+    async with SessionLocal() as session:
+        return await ExpensesService(ExpensesRepository(session)).start_digest_run(RUN_DATE, lease)
+
+
+async def checkpoint(run_id: int, last_chat_id: int, sent: int, finished: bool = False) -> None:
+    async with SessionLocal() as session:
+        service = ExpensesService(ExpensesRepository(session))
+        await service.checkpoint_digest_run(run_id, last_chat_id, sent, lease=60, finished=finished)
+
+
+def test_one_process_holds_the_lease_at_a_time(run):
+    async def body():
+        first, second = await asyncio.gather(start(), start())
+        assert [r is not None for r in (first, second)].count(True) == 1
+        assert await start() is None
+    run(body)
+
+
+def test_expired_lease_is_taken_over_and_resumes_from_the_checkpoint(run):
+    async def body():
+        crashed = await start(lease=0.01)
+        await checkpoint(crashed.id, last_chat_id=40, sent=12)
+        # The checkpoint renewed the lease for another minute
+        assert await start() is None
+
+        async with engine.begin() as conn:
+            await conn.execute(text("UPDATE digest_runs SET lease_until = '2000-01-01 00:00:00'"))
+        resumed = await start()
+        assert (resumed.id, resumed.last_chat_id, resumed.sent) == (crashed.id, 40, 12)
+    run(body)
+
+
+def test_finished_run_is_not_started_again(run):
+    async def body():
+        run_ = await start()
+        await checkpoint(run_.id, last_chat_id=99, sent=30, finished=True)
+
+        async with engine.begin() as conn:
+            await conn.execute(text("UPDATE digest_runs SET lease_until = NULL"))
+        assert await start() is None
+    run(body)
+
+
+def test_failed_checkpoint_rolls_back_and_leaves_the_session_usable(run):
+    async def body():
+        run_ = await start()
+        async with engine.begin() as conn:
+            await conn.execute(text(
+                "CREATE TRIGGER reject_checkpoint BEFORE UPDATE ON digest_runs "
+                "BEGIN SELECT RAISE(ABORT, 'rejected'); END"
+            ))
+
+        async with SessionLocal() as session:
+            service = ExpensesService(ExpensesRepository(session))
+            with pytest.raises(ServerError):
+                await service.checkpoint_digest_run(run_.id, 10, 3, lease=60)
+            assert not session.in_transaction()
+            # The next write on the same session starts cleanly
+            with pytest.raises(ServerError):
+                await service.checkpoint_digest_run(run_.id, 10, 3, lease=60)
+            assert not session.in_transaction()
+    run(body)
@@ -0,0 +1,131 @@
+import asyncio
+from datetime import timedelta
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import delete, func, select, update
+
+from app.db.database import SessionLocal
+from app.features.expenses.errors import BalanceHistoryUnavailable
+from app.features.expenses.ledger import LedgerVerifier
+from app.features.expenses.models import Balance, BalanceCheckpoint, LedgerEntry, utcnow
+from app.features.expenses.repo import ExpensesRepository
+from app.features.expenses.service import ExpensesService
+
+TG_CHAT_ID = -1
+CHAT_ID = 1
+
+
+async def call(method: str, *args):
+    async with SessionLocal() as session:
+        return await getattr(ExpensesService(ExpensesRepository(session)), method)(*args)
+
+
+async def add_expenses(n: int) -> None:
+    for i in range(n):
+        await call("add_expense", TG_CHAT_ID, 101 + i % 3, Decimal("10.01"), f"#{i}")
+
+
+async def checkpoints() -> list[int]:
+    """The ledger position of each checkpoint of the chat, oldest first."""
+    async with SessionLocal() as session:
+        rows = await session.scalars(
+            select(BalanceCheckpoint.ledger_id)
+            .where(BalanceCheckpoint.chat_id == CHAT_ID)
+            .distinct()
+            .order_by(BalanceCheckpoint.ledger_id)
+        )
+        return list(rows)
+
+
+async def last_entry_id() -> int:
+    async with SessionLocal() as session:
+        return await session.scalar(select(func.max(LedgerEntry.id)))
+
+
+def test_verify_matches_the_balances_and_checkpoints_once_enough_entries_replayed(run):
+    async def body():
+        await add_expenses(2)
+        # Fewer entries than a checkpoint needs
+        assert await call("verify_ledger", CHAT_ID, 100) == {}
+        assert await checkpoints() == []
+
+        assert await call("verify_ledger", CHAT_ID, 1) == {}
+        first = await last_entry_id()
+        assert await checkpoints() == [first]
+        # Nothing new to replay, nothing new to record
+        assert await call("verify_ledger", CHAT_ID, 1) == {}
+        assert await checkpoints() == [first]
+
+        await add_expenses(1)
+        assert await call("verify_ledger", CHAT_ID, 1) == {}
+        assert await checkpoints() == [first, await last_entry_id()]
+    run(body)
+
+
+def test_replay_starts_from_the_latest_checkpoint(run):
+    async def body():
+        await add_expenses(3)
+        await call("verify_ledger", CHAT_ID, 1)
+        # Entries behind a checkpoint are never read again
+        async with SessionLocal() as session:
+            await session.execute(delete(LedgerEntry))
+            await session.commit()
+        assert await call("verify_ledger", CHAT_ID, 1) == {}
+    run(body)
+
+
+def test_drift_is_reported_and_never_checkpointed(run):
+    async def body():
+        await add_expenses(3)
+        async with SessionLocal() as session:
+            await session.execute(update(Balance).where(Balance.user_id == 2).values(balance=Balance.balance - 7))
+            await session.commit()
+
+        assert await call("verify_ledger", CHAT_ID, 1) == {2: -7}
+        assert await checkpoints() == []
+
+        verifier = LedgerVerifier(SessionLocal, interval=60, checkpoint_every=1)
+        assert await verifier.tick() == 1
+        assert verifier.drifted == {CHAT_ID}
+        # Its ledger covers all of its history, so it is not opened over the drift
+        assert await checkpoints() == []
+    run(body)
+
+
+def test_balances_as_of_replay_up_to_that_time(run):
+    async def body():
+        await add_expenses(2)
+        then = await call("get_balances_as_of", TG_CHAT_ID, utcnow())
+        await asyncio.sleep(0.01)
+        # A checkpoint after `then` must not be used for it
+        await add_expenses(2)
+        await call("verify_ledger", CHAT_ID, 1)
+
+        assert (await call("get_balances_as_of", TG_CHAT_ID, then.at)).balances == then.balances
+        now = await call("get_balances_as_of", TG_CHAT_ID, utcnow())
+        assert now.balances != then.balances
+        assert sum(b.balance for b in now.balances) == 0
+    run(body)
+
+
+def test_opening_checkpoint_bounds_the_history(run):
+    async def body():
+        # History from before the ledger existed
+        await add_expenses(2)
+        async with SessionLocal() as session:
+            await session.execute(delete(LedgerEntry))
+            await session.commit()
+        # Not even today's balances can be replayed from an empty ledger
+        with pytest.raises(BalanceHistoryUnavailable):
+            await call("get_balances_as_of", TG_CHAT_ID, utcnow())
+
+        assert await call("open_ledger", CHAT_ID)
+        assert not await call("open_ledger", CHAT_ID)
+        assert await call("verify_ledger", CHAT_ID, 1) == {}
+
+        with pytest.raises(BalanceHistoryUnavailable):
+            await call("get_balances_as_of", TG_CHAT_ID, utcnow() - timedelta(days=1))
+        now = await call("get_balances_as_of", TG_CHAT_ID, utcnow())
+        assert len(now.balances) == 3
+    run(body)
@@ -0,0 +1,97 @@
+import asyncio
+from typing import Any
+
+from app.features.telegram.outbox import MAX_TEXT, CoalescingMessenger
+
+CHAT_ID = -1
+
+
+class FakeTelegram:
+    def __init__(self):
+        self.calls: list[tuple] = []
+        self._next_id = 0
+
+    async def send_message(self, chat_id: int, text: str, *args) -> dict[str, Any]:
+        self._next_id += 1
+        self.calls.append(("send", text, *[a for a in args if a]))
+        return {"ok": True, "result": {"message_id": self._next_id}}
+
+    async def edit_message_text(self, chat_id: int, message_id: int, text: str) -> dict[str, Any]:
+        self.calls.append(("edit", message_id, text))
+        return {"ok": True, "result": {"message_id": message_id}}
+
+
+def test_burst_goes_out_as_one_message():
+    async def main():
+        tg = FakeTelegram()
+        outbox = CoalescingMessenger(tg, window=0.01)
+        results = await asyncio.gather(*(outbox.send_message(CHAT_ID, f"added #{i}") for i in range(3)))
+
+        assert tg.calls == [("send", "added #0\nadded #1\nadded #2")]
+        assert all(r["result"]["message_id"] == 1 for r in results)
+    asyncio.run(main())
+
+
+def test_later_confirmations_are_edited_into_the_open_message():
+    async def main():
+        tg = FakeTelegram()
+        outbox = CoalescingMessenger(tg, window=0.01, keep_open=0.2)
+        await outbox.send_message(CHAT_ID, "added #1")
+        await outbox.send_message(CHAT_ID, "added #2")
+        await asyncio.sleep(0.25)
+        # Too old to extend: a new message
+        await outbox.send_message(CHAT_ID, "added #3")
+
+        assert tg.calls == [
+            ("send", "added #1"),
+            ("edit", 1, "added #1\nadded #2"),
+            ("send", "added #3"),
+        ]
+    asyncio.run(main())
+
+
+def test_other_messages_flush_the_buffer_first():
+    async def main():
+        tg = FakeTelegram()
+        outbox = CoalescingMessenger(tg, window=10)
+        confirmation = asyncio.create_task(outbox.send_message(CHAT_ID, "added #1"))
+        await asyncio.sleep(0)
+        await outbox.send_message(CHAT_ID, "Not a member.", reply_to_message_id=7)
+        await confirmation
+
+        assert tg.calls == [("send", "added #1"), ("send", "Not a member.", 7)]
+        assert outbox.queued == 0
+    asyncio.run(main())
+
+
+def test_messages_over_the_text_limit_are_split():
+    async def main():
+        tg = FakeTelegram()
+        outbox = CoalescingMessenger(tg, window=0.01)
+        line = "x" * (MAX_TEXT // 2 - 1)
+        await asyncio.gather(*(outbox.send_message(CHAT_ID, line) for _ in range(3)))
+        # Wouldn't fit in the open message: a new one, which the next line still fits
+        await outbox.send_message(CHAT_ID, "y" * (MAX_TEXT // 2 + 1))
+        await outbox.send_message(CHAT_ID, "z")
+
+        assert [(c[0], len(c[-1])) for c in tg.calls] == [
+            ("send", 2 * len(line) + 1),
+            ("send", len(line)),
+            ("send", MAX_TEXT // 2 + 1),
+            ("edit", MAX_TEXT // 2 + 3),
+        ]
+    asyncio.run(main())
+
+
+def test_aclose_flushes_buffered_confirmations():
+    async def main():
+        tg = FakeTelegram()
+        outbox = CoalescingMessenger(tg, window=60)
+        pending = asyncio.create_task(outbox.send_message(CHAT_ID, "added #1"))
+        await asyncio.sleep(0)
+        assert outbox.queued == 1
+
+        await outbox.aclose()
+        assert (await pending)["result"]["message_id"] == 1
+        assert tg.calls == [("send", "added #1")]
+    asyncio.run(main())
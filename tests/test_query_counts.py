@@ -0,0 +1,155 @@
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.exc import InvalidRequestError
+
+from app.db.database import SessionLocal, engine
+from app.features.expenses.repo import ExpensesRepository
+from app.features.expenses.service import ExpensesService
+
+# The chat conftest seeds
+TG_CHAT_ID = -1
+
+
+class StatementCounter:
+    """Counts statements sent to the database while attached to the engine."""
+    def __init__(self):
+        self.statements: list[str] = []
+
+    def __enter__(self) -> "StatementCounter":
+        event.listen(engine.sync_engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        event.remove(engine.sync_engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        self.statements.append(statement)
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+
+async def add_expenses(n: int) -> None:
+    for i in range(n):
+        async with SessionLocal() as session:
+            service = ExpensesService(ExpensesRepository(session))
+            await service.add_expense(TG_CHAT_ID, 101 + i % 3, Decimal("9.99"), f"expense {i}")
+
+
+async def count_statements(method: str, *args, **kwargs) -> int:
+    async with SessionLocal() as session:
+        service = ExpensesService(ExpensesRepository(session))
+        with StatementCounter() as counter:
+            await getattr(service, method)(TG_CHAT_ID, *args, **kwargs)
+    return counter.count
+
+
+@pytest.mark.parametrize(
+    "method, expected",
+    [
+        # chat, last 10 expenses with payers (joined)
+        ("get_expenses", 2),
+        # chat, balances with users (joined), recent expenses with payers (joined)
+        ("get_dashboard_snapshot", 3),
+        # chat, balances with users (joined), base-currency total over hot and archive
+        ("get_summary", 3),
+    ],
+)
+def test_read_paths_statement_counts(run, method, expected):
+    async def body():
+        # Enough hot expenses that no read continues into the archive
+        await add_expenses(10)
+        assert await count_statements(method) == expected
+    run(body)
+
+
+@pytest.mark.parametrize(
+    "method, args, expected",
+    [
+        # chat, payer, member ids, expense, one INSERT per split (SQLite can't batch
+        # them with RETURNING), one balance UPDATE, ledger rows
+        ("add_expense", (101, Decimal("5"), "lunch"), 9),
+        ("add_expense", (101, Decimal("5"), "lunch", None, (1, 2)), 8),
+        # chat, caller, membership, expense, its splits, soft delete, then as add_expense
+        ("edit_expense", (101, 10, Decimal("6"), "dinner"), 12),
+        # chat, caller, membership, expense, its splits, soft delete, balance UPDATE, ledger rows
+        ("remove_expense", (101, 10), 8),
+        # chat, payer, membership, schedule
+        ("add_recurring", (101, Decimal("5"), "rent", 1, "month"), 4),
+    ],
+)
+def test_write_paths_statement_counts(run, method, args, expected):
+    async def body():
+        await add_expenses(10)
+        assert await count_statements(method, *args) == expected
+    run(body)
+
+
+def test_join_statement_counts(run):
+    async def body():
+        # chat, user, new user, membership upsert, balance, new balance
+        assert await count_statements("add_member", 104, username="u4", first_name="U4") == 6
+        # chat, user, membership upsert (no-op), balance
+        assert await count_statements("add_member", 101, username="u1", first_name="U1") == 4
+    run(body)
+
+
+@pytest.mark.parametrize(
+    "method, args, cold, warm",
+    [
+        # chat, hot and archive descriptions for the in-memory index, then chat, page
+        ("search_expenses", ("expense",), 4, 2),
+        # chat, schedules with payers (joined); not cached
+        ("list_recurring", (), 2, 2),
+    ],
+)
+def test_indexed_reads_statement_counts(run, method, args, cold, warm):
+    async def body():
+        await add_expenses(10)
+        assert await count_statements(method, *args) == cold
+        assert await count_statements(method, *args) == warm
+    run(body)
+
+
+def test_my_balances_is_one_statement_then_cached(run):
+    async def body():
+        # u1 paid 4 of 10, so has a non-zero balance to cache
+        await add_expenses(10)
+
+        async def my_balances() -> int:
+            async with SessionLocal() as session:
+                service = ExpensesService(ExpensesRepository(session))
+                with StatementCounter() as counter:
+                    view = await service.get_user_balances(101)
+            assert view.balances
+            return counter.count
+
+        assert await my_balances() == 1
+        assert await my_balances() == 0
+        # A balance change of theirs drops the cached view
+        await add_expenses(1)
+        assert await my_balances() == 1
+    run(body)
+
+
+def test_expense_list_continues_into_archive_with_one_statement(run):
+    async def body():
+        await add_expenses(2)
+        assert await count_statements("get_expenses") == 3
+    run(body)
+
+
+def test_relationship_outside_profile_raises(run):
+    async def body():
+        await add_expenses(1)
+        async with SessionLocal() as session:
+            repo = ExpensesRepository(session)
+            [expense] = await repo.list_expenses(1, 10)
+            assert expense.payer.username == "u1"
+            # "expense_list" loads the payer only
+            with pytest.raises(InvalidRequestError):
+                expense.splits
+    run(body)
@@ -0,0 +1,110 @@
+import asyncio
+from datetime import timedelta
+from decimal import Decimal
+
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects import postgresql
+
+from app.db.database import SessionLocal
+from app.features.expenses.models import Balance, Chat, ChatMember, Expense, RecurringExpense, utcnow
+from app.features.expenses.repo import ExpensesRepository
+from app.features.expenses.scheduler import RecurringScheduler
+from app.features.expenses.service import ExpensesService
+
+# Shard 1 of 2 owns chat -1, shard 0 owns chat -2
+CHATS = (-1, -2)
+
+
+async def add_second_chat() -> None:
+    async with SessionLocal() as session:
+        session.add(Chat(id=2, telegram_chat_id=-2, base_currency="USD"))
+        await session.flush()
+        for user_id in (1, 2, 3):
+            session.add(ChatMember(chat_id=2, user_id=user_id))
+            session.add(Balance(chat_id=2, user_id=user_id, balance=0))
+        await session.commit()
+
+
+async def add_recurring(tg_chat_id: int, desc: str, days_ago: int = 0) -> int:
+    async with SessionLocal() as session:
+        service = ExpensesService(ExpensesRepository(session))
+        recurring = await service.add_recurring(tg_chat_id, 101, Decimal("3"), desc, 1, "d")
+    if days_ago:
+        starts_at = utcnow() - timedelta(days=days_ago)
+        async with SessionLocal() as session:
+            await session.execute(
+                update(RecurringExpense)
+                .where(RecurringExpense.id == recurring.id)
+                .values(starts_at=starts_at, next_run_at=starts_at)
+            )
+            await session.commit()
+    return recurring.id
+
+
+async def expenses_by_description() -> dict[str, int]:
+    async with SessionLocal() as session:
+        rows = await session.execute(select(Expense.description, func.count()).group_by(Expense.description))
+        return dict(rows.all())
+
+
+class _CapturingSession:
+    def __init__(self):
+        self.statement = None
+
+    async def execute(self, statement):
+        self.statement = statement
+        return []
+
+
+def test_claims_skip_rows_locked_by_another_worker():
+    async def main():
+        session = _CapturingSession()
+        await ExpensesRepository(session).claim_due_recurring(utcnow(), 10, shard=(1, 2))
+        sql = str(session.statement.compile(dialect=postgresql.dialect()))
+        assert "FOR UPDATE OF recurring_expenses SKIP LOCKED" in sql
+    asyncio.run(main())
+
+
+def test_tick_runs_each_due_definition_once(run):
+    async def body():
+        for desc in ("rent", "netflix", "gym"):
+            await add_recurring(-1, desc)
+        scheduler = RecurringScheduler(SessionLocal, interval=60, batch=2)
+
+        assert await scheduler.tick() == 3
+        # Next runs are a day out
+        assert await scheduler.tick() == 0
+        assert await expenses_by_description() == {"rent": 1, "netflix": 1, "gym": 1}
+    run(body)
+
+
+def test_overdue_definition_catches_up_one_occurrence_per_claim(run):
+    async def body():
+        recurring_id = await add_recurring(-1, "rent", days_ago=3)
+
+        async with SessionLocal() as session:
+            service = ExpensesService(ExpensesRepository(session))
+            claimed, reports, _ = await service.run_due_recurring(utcnow())
+        assert claimed == 1
+        assert [r_id for r_id, _ in reports[-1]] == [recurring_id]
+
+        # Days -2, -1 and today are still due, one per tick
+        scheduler = RecurringScheduler(SessionLocal, interval=60)
+        assert [await scheduler.tick() for _ in range(4)] == [1, 1, 1, 0]
+        assert await expenses_by_description() == {"rent": 4}
+    run(body)
+
+
+def test_shard_schedulers_split_the_chats_between_them(run):
+    async def body():
+        await add_second_chat()
+        for tg_chat_id in CHATS:
+            for i in range(3):
+                await add_recurring(tg_chat_id, f"{tg_chat_id} #{i}")
+
+        schedulers = [RecurringScheduler(SessionLocal, interval=60, shard=(i, 2)) for i in (0, 1)]
+        claimed = await asyncio.gather(*(s.tick() for s in schedulers))
+
+        assert claimed == [3, 3]
+        assert await expenses_by_description() == {f"{c} #{i}": 1 for c in CHATS for i in range(3)}
+    run(body)
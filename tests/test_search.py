@@ -0,0 +1,61 @@
+import random
+from datetime import datetime, timedelta
+
+from app.features.expenses.search import _ChatIndex, tokenize
+
+START = datetime(2026, 1, 1)
+WORDS = ["taxi", "maxi", "taximeter", "dinner", "diner", "inn", "rent", "parent", "a", "ab", "cab"]
+
+
+def brute_force(descriptions: dict[int, str], terms: list[str]) -> set[int]:
+    return {
+        expense_id for expense_id, desc in descriptions.items()
+        if all(any(term in word for word in tokenize(desc)) for term in terms)
+    }
+
+
+def test_terms_match_anywhere_in_a_word_newest_first():
+    index = _ChatIndex()
+    index.add(1, "Taxi to airport", START)
+    index.add(2, "taximeter fix", START + timedelta(days=1))
+    index.add(3, "Dinner with parents", START + timedelta(days=2))
+
+    assert index.match(["axi"], 10) == [2, 1]
+    assert index.match(["xi"], 10) == [2, 1]
+    assert index.match(["ent"], 10) == [3]
+    assert index.match(["din", "par"], 10) == [3]
+    assert index.match(["taxi", "din"], 10) == []
+    assert index.match(["taxis"], 10) == []
+    assert index.match(["a"], 1) == [3]
+
+
+def test_removed_words_stop_matching():
+    index = _ChatIndex()
+    index.add(1, "rent", START)
+    index.add(2, "parent rent", START)
+    index.remove(2)
+    assert index.match(["par"], 10) == []
+    assert index.match(["ren"], 10) == [1]
+
+    index.remove(1)
+    assert index.postings == {} and index.grams == {}
+
+
+def test_matches_a_substring_scan():
+    rng = random.Random(7)
+    index = _ChatIndex()
+    descriptions: dict[int, str] = {}
+    for expense_id in range(200):
+        if descriptions and rng.random() < 0.2:
+            removed = rng.choice(list(descriptions))
+            del descriptions[removed]
+            index.remove(removed)
+            continue
+        desc = " ".join(rng.sample(WORDS, rng.randint(1, 3)))
+        descriptions[expense_id] = desc
+        index.add(expense_id, desc, START + timedelta(minutes=expense_id))
+
+    for word in WORDS:
+        for term in {word, word[1:], word[:-1], word[1:4]} - {""}:
+            for terms in ([term], [term, "a"]):
+                assert set(index.match(terms, 1000)) == brute_force(descriptions, terms), terms
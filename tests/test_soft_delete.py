@@ -0,0 +1,82 @@
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import select, update
+
+from app.db.database import SessionLocal
+from app.features.expenses.errors import ExpenseNotFound
+from app.features.expenses.models import Balance, Expense, FxRate
+from app.features.expenses.repo import ExpensesRepository
+from app.features.expenses.service import ExpensesService
+
+TG_CHAT_ID = -1
+
+
+async def call(method: str, *args):
+    async with SessionLocal() as session:
+        return await getattr(ExpensesService(ExpensesRepository(session)), method)(TG_CHAT_ID, *args)
+
+
+async def balances() -> dict[int, int]:
+    async with SessionLocal() as session:
+        return dict((await session.execute(select(Balance.user_id, Balance.balance))).all())
+
+
+async def seed_expenses() -> None:
+    async with SessionLocal() as session:
+        session.add(FxRate(currency="EUR", rate_date=date(2020, 1, 1), rate=Decimal("1.1")))
+        await session.commit()
+    await call("add_expense", 101, Decimal("10"), "lunch")
+    await call("add_expense", 102, Decimal("7.01"), "taxi", "EUR")
+    await call("add_expense", 103, Decimal("3.33"), "coffee", None, (1, 3))
+
+
+def test_remove_reverses_exactly_what_the_expense_recorded(run):
+    async def body():
+        await seed_expenses()
+        before = await balances()
+        removed = await call("add_expense", 101, Decimal("12.34"), "dinner", "EUR")
+
+        await call("remove_expense", 102, removed.id)
+        assert await balances() == before
+        assert removed.id not in [e.id for e in await call("get_expenses")]
+        assert await call("reconcile_balances") == {}
+        # Kept for history, marked deleted
+        async with SessionLocal() as session:
+            assert (await session.get(Expense, removed.id)).deleted_at is not None
+
+        with pytest.raises(ExpenseNotFound):
+            await call("remove_expense", 102, removed.id)
+    run(body)
+
+
+def test_edit_replaces_the_expense_as_if_added_corrected(run):
+    async def body():
+        await seed_expenses()
+        original = await call("add_expense", 101, Decimal("20"), "groceries", None, (1, 2))
+        edited = await call("edit_expense", 101, original.id, Decimal("9"), "snacks", "EUR")
+        after_edit = await balances()
+
+        await call("remove_expense", 101, edited.id)
+        await call("add_expense", 101, Decimal("9"), "snacks", "EUR", (1, 2))
+        assert await balances() == after_edit
+
+        assert edited.id != original.id
+        assert (edited.amount, edited.currency, edited.desc) == (Decimal("9.00"), "EUR", "snacks")
+        assert await call("reconcile_balances") == {}
+        with pytest.raises(ExpenseNotFound):
+            await call("edit_expense", 101, original.id, Decimal("1"))
+    run(body)
+
+
+def test_reconcile_reports_drift_per_user(run):
+    async def body():
+        await seed_expenses()
+        assert await call("reconcile_balances") == {}
+
+        async with SessionLocal() as session:
+            await session.execute(update(Balance).where(Balance.user_id == 2).values(balance=Balance.balance + 5))
+            await session.commit()
+        assert await call("reconcile_balances") == {2: 5}
+    run(body)
@@ -0,0 +1,136 @@
+import asyncio
+from typing import Callable
+
+import httpx
+import pytest
+
+from app.features.telegram.client import BASE, ConnectionPool, TelegramAPI, TelegramError
+
+Handler = Callable[[httpx.Request], httpx.Response]
+
+
+def ok(result=True) -> httpx.Response:
+    return httpx.Response(200, json={"ok": True, "result": result})
+
+
+def script(*steps) -> tuple[Handler, list[str]]:
+    """A Bot API that answers each request with the next step: a response, or an exception to raise."""
+    steps = list(steps)
+    methods: list[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        methods.append(request.url.path.rsplit("/", 1)[-1])
+        step = steps.pop(0)
+        if isinstance(step, Exception):
+            raise step
+        return step
+    return handler, methods
+
+
+def api(handler: Handler, retries: int = 2) -> TelegramAPI:
+    pool = ConnectionPool()
+    pool.client = httpx.AsyncClient(base_url=BASE, transport=httpx.MockTransport(handler))
+    return TelegramAPI("token", retries=retries, backoff=0, pool=pool)
+
+
+def test_send_is_retried_when_it_never_reached_telegram():
+    async def main():
+        handler, methods = script(httpx.ConnectError("refused"), ok({"message_id": 7}))
+        tg = api(handler)
+        sent = await tg.send_message(-1, "hi")
+
+        assert sent["result"]["message_id"] == 7
+        assert methods == ["sendMessage", "sendMessage"]
+        assert tg.stats()["sendMessage"]["retries"] == 1
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize(
+    "failure",
+    [httpx.ReadTimeout("lost"), httpx.Response(502, text="Bad Gateway")],
+)
+def test_send_that_may_have_gone_through_is_not_repeated(failure):
+    async def main():
+        handler, methods = script(failure, ok({"message_id": 7}))
+        tg = api(handler)
+        with pytest.raises(TelegramError):
+            await tg.send_message(-1, "hi")
+
+        # A second attempt could post the message twice
+        assert methods == ["sendMessage"]
+        assert tg.stats()["sendMessage"]["errors"] == 1
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize(
+    "failure",
+    [httpx.ReadTimeout("lost"), httpx.Response(502, text="Bad Gateway")],
+)
+def test_idempotent_method_is_retried_after_a_lost_response(failure):
+    async def main():
+        handler, methods = script(failure, ok())
+        tg = api(handler)
+        await tg.pin_chat_message(-1, 5)
+        assert methods == ["pinChatMessage", "pinChatMessage"]
+    asyncio.run(main())
+
+
+def test_retries_are_bounded():
+    async def main():
+        handler, methods = script(*[httpx.ConnectError("refused")] * 3)
+        tg = api(handler, retries=2)
+        with pytest.raises(TelegramError) as e:
+            await tg.pin_chat_message(-1, 5)
+
+        assert "ConnectError" in e.value.description
+        assert len(methods) == 3
+    asyncio.run(main())
+
+
+def test_other_transport_errors_are_wrapped_and_not_retried():
+    async def main():
+        handler, methods = script(httpx.ProxyError("proxy refused"), ok())
+        tg = api(handler)
+        with pytest.raises(TelegramError) as e:
+            await tg.pin_chat_message(-1, 5)
+
+        assert e.value.method == "pinChatMessage"
+        assert isinstance(e.value.__cause__, httpx.ProxyError)
+        assert methods == ["pinChatMessage"]
+    asyncio.run(main())
+
+
+def test_api_errors_carry_their_code_and_retry_after():
+    async def main():
+        handler, methods = script(httpx.Response(429, json={
+            "ok": False,
+            "error_code": 429,
+            "description": "Too Many Requests: retry after 3",
+            "parameters": {"retry_after": 3},
+        }))
+        tg = api(handler)
+        with pytest.raises(TelegramError) as e:
+            await tg.send_message(-1, "hi")
+
+        assert (e.value.error_code, e.value.retry_after) == (429, 3.0)
+        # 4xx answers are final
+        assert methods == ["sendMessage"]
+    asyncio.run(main())
+
+
+def test_retried_edit_that_already_applied_counts_as_done():
+    async def main():
+        handler, methods = script(
+            httpx.ReadTimeout("lost"),
+            httpx.Response(400, json={
+                "ok": False,
+                "error_code": 400,
+                "description": "Bad Request: message is not modified",
+            }),
+        )
+        tg = api(handler)
+        edited = await tg.edit_message_text(-1, 5, "total: 10")
+
+        assert edited["result"]["message_id"] == 5
+        assert methods == ["editMessageText", "editMessageText"]
+    asyncio.run(main())